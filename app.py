@@ -1,19 +1,57 @@
-from flask_openapi3 import OpenAPI, Info, Tag
-from flask import redirect, jsonify
+from flask_openapi3 import OpenAPI, APIBlueprint, Info, Tag
+from flask import redirect, jsonify, request, Response, stream_with_context
+from io import TextIOWrapper
+from datetime import date, timedelta
+import hashlib
+import time
+import os
+import json
+from flask.cli import AppGroup, with_appcontext
+import click
 from urllib.parse import unquote
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy import asc
-from sqlalchemy import extract, cast, Integer
-from model import Session
-from logger import logger
+from sqlalchemy import asc, func, tuple_
+import model
+from model import Session, encerra_sessao, engine, engine_replica, usa_replica, no_primario, sincroniza_replica, \
+    inicializa_banco
+from model.busca import busca_lancamentos, reconstroi_busca
+from model.relatorio import calcula_relatorio, versao_periodo
+from model.leitura import leitura_completa, ordem_leitura, vencimento
+from model.pagamento import alterna_pagamento, marca_pagamento
+from model.alteracoes import consulta_alteracoes, cursor_expirado, registra_remocao, limpa_remocoes
+from model.lancamento import intervalo_mes
+from model.categoria import versao_categorias
+from model.arquivo import LancamentoArquivado, arquiva, desarquiva, horizonte_arquivo, ARQUIVO_HORIZONTE_MESES
+from model.lote import insere_lancamentos
+from model.recorrencia import Recorrencia, materializa, materializa_pendentes
+from model.resumo import ResumoMensal, registra_lancamento, versao_mes, verifica_resumos, reconstroi_resumos
+from logger import logger, AMOSTRA, inicia_log
+from exportacao import exporta, FORMATOS
+from importacao import importa, identificador_importacao, le_csv, le_ofx, RegrasCategoria, LinhaInvalida
+from cliente_categoria import ServicoIndisponivel, cliente_categoria
+import metricas
+from categorias import sincroniza_categorias, atualiza_categoria, sincronizador as sincronizador_categorias
+from cache import CacheTTL
 from schemas.error import ErrorSchema
 from schemas.lancamento import *
+from schemas.categoria import CategoriaInvalidacaoSchema, ResultadoSincronizacaoSchema
 from flask_cors import CORS
 from flask_cors import cross_origin
 
 info = Info(title="Lançamentos", version="1.0.0")
-app = OpenAPI(__name__, info=info)
-CORS(app)
+# as rotas ficam no blueprint; o app é montado por create_app
+api = APIBlueprint("lancamentos", __name__)
+
+# consultas que podem ser respondidas pela réplica de leitura (DATABASE_REPLICA_URL)
+ENDPOINTS_LEITURA = {f"{api.name}.{nome}" for nome in (
+    "get_mensal", "get_saldo", "get_lancamentos", "get_lancamento", "get_relatorio",
+    "busca_lancamentos_texto", "exporta_lancamentos")}
+
+
+def escolhe_banco():
+    """ Consultas leem da réplica, exceto logo após uma escrita do mesmo usuário. """
+    if engine_replica is not None and request.endpoint in ENDPOINTS_LEITURA:
+        usa_replica(Session(), request.args.get("login"))
 
 """ Gerando documentação
     são 3 os principais elementos : Tags, Rotas com padrões de respostas bem definidas e Schemas. 
@@ -24,15 +62,72 @@ home_tag = Tag(name="Documentação das APIs",
                description="Seleção de documentação: Swagger, Redoc ou RapiDoc")
 lancamento_tag = Tag(
     name="Lançamento", description="Adição, visualização, edição e remoção de lançamentos da base, vinculadas a categorias.")
+metricas_tag = Tag(name="Métricas", description="Métricas de desempenho no formato do Prometheus")
+categoria_tag = Tag(name="Categoria", description="Cópia local das categorias, sincronizada com o serviço de categorias")
+
+# respostas já serializadas, indexadas pelo ETag (que inclui a versão do mês)
+respostas_cache = CacheTTL(
+    tamanho_maximo=int(os.environ.get("RESPOSTA_CACHE_TAMANHO", 256)),
+    ttl=categorias_cache.ttl)
+
+
+def epoca_categorias(session):
+    """ Identifica o estado das categorias para os ETags: a versão da cópia local, que muda
+        a cada sincronização com alterações (inclusive pelo webhook), e o período de validade
+        do cache, para as categorias ainda buscadas ao vivo no serviço.
+    """
+    return f"{versao_categorias(session)}.{int(time.time() // categorias_cache.ttl)}"
+
+
+def categorias_completas(corpo):
+    """ Indica se todos os lançamentos da resposta têm o nome da categoria resolvido. """
+    if "categorias" in corpo:
+        return SERVICO_INDISPONIVEL not in corpo["categorias"]["nome"]
+    itens = corpo.get("despesas", [corpo])
+    return all(item.get("categoria_nome") != SERVICO_INDISPONIVEL for item in itens)
 
-@app.get('/', tags=[home_tag])
+
+def resposta_condicional(chave: str, gera):
+    """ Responde 304 se o cliente já tiver a versão (If-None-Match) e, senão, usa a resposta
+        guardada para o mesmo ETag ou a gera com a função informada, que retorna (corpo, status).
+    """
+    etag = hashlib.sha1(chave.encode()).hexdigest()
+    if request.if_none_match.contains(etag):
+        resposta = Response(status=304)
+        resposta.set_etag(etag)
+        return resposta
+
+    corpo = respostas_cache.get(etag)
+    if corpo is None:
+        corpo, status = gera()
+        if status != 200:
+            return corpo, status
+        if not categorias_completas(corpo):
+            # respostas sem o nome da categoria não são guardadas nem recebem ETag
+            return corpo, status
+        respostas_cache.set(etag, corpo)
+
+    resposta = jsonify(corpo)
+    resposta.set_etag(etag)
+    return resposta
+
+
+@api.get('/', tags=[home_tag])
 def home():
     """Redireciona para /openapi, tela que permite a escolha do estilo de documentação.
     """
     return redirect('/openapi')
 
 
-@app.post('/lancamento', tags=[lancamento_tag],
+@api.get('/metrics', tags=[metricas_tag])
+def get_metricas():
+    """Histogramas de latência por endpoint, de comandos SQL e de chamadas ao serviço de categorias,
+       no formato de texto do Prometheus. Os valores são do worker que atendeu a requisição.
+    """
+    return Response(metricas.exporta(), mimetype="text/plain; version=0.0.4; charset=utf-8")
+
+
+@api.post('/lancamento', tags=[lancamento_tag],
           responses={"200": LancamentoViewSchema, "409": ErrorSchema, "400": ErrorSchema})
 def add_lancamento(form: LancamentoSchema):
     """ 
@@ -41,7 +136,7 @@ def add_lancamento(form: LancamentoSchema):
     """
 
     categoria_id = form.categoria_id
-    logger.debug(f"Adicionado despesas a categoria com ID #{categoria_id}")
+    logger.debug("Adicionado despesas a categoria com ID #%s", categoria_id)
 
     # criando conexão com a base
     session = Session()
@@ -64,14 +159,17 @@ def add_lancamento(form: LancamentoSchema):
             data_vencimento=form.data_vencimento,
             login = form.login)
 
-        # adicionando lançamento .
+        # adicionando lançamento e atualizando o resumo do mês na mesma transação
         session.add(lancamento)
+        session.flush()
+        registra_lancamento(session, lancamento)
         session.commit()
-        logger.debug(f"Adicionando lançamento: '{lancamento.descricao}'")
+        logger.debug("Adicionando lançamento: '%s'", lancamento.descricao)
 
         return apresenta_lancamento(lancamento), 200
 
     except IntegrityError as e:
+        session.rollback()
         # como a duplicidade do nome é a provável razão do IntegrityError
         error_msg = "Lançamento de mesmo nome, vencimento e login já salvo na base :/"
         logger.warning(
@@ -79,6 +177,7 @@ def add_lancamento(form: LancamentoSchema):
         return {"mesage": error_msg}, 409
 
     except Exception as e:
+        session.rollback()
         # caso um erro fora do previsto
         error_msg = "Não foi possível salvar novo item :/"
         logger.warning(
@@ -86,29 +185,281 @@ def add_lancamento(form: LancamentoSchema):
         return {"mesage": error_msg}, 400
 
 
-@app.get('/lancamentos', tags=[lancamento_tag],
-         responses={"200": ListagemLancamentosSchema, "404": ErrorSchema})
-def get_lancamentos():
+@api.post('/lancamentos/batch', tags=[lancamento_tag],
+          responses={"200": ResultadoLoteSchema, "400": ErrorSchema, "503": ErrorSchema})
+def add_lancamentos_lote(body: LancamentoLoteSchema):
     """
-    Faz a busca por todos as despesas e receitas cadastradas.
-    Retorna uma representação da listagem de despesas e receitas.
+    Adiciona uma lista de lançamentos em uma única transação.
+    Retorna, para cada item, o ID criado ou o motivo da rejeição.
     """
-    logger.debug(f"Coletando lançamentos ")
+    itens = body.__root__
+    logger.debug("Adicionando lote de %s lançamentos", len(itens))
+
+    # verifica o tipo uma única vez por categoria distinta
+    categorias = ResolveCategorias(item.categoria_id for item in itens)
+    if SERVICO_INDISPONIVEL in categorias.values():
+        # sem o tipo da categoria não há como validar os itens: nada é gravado
+        error_msg = "Serviço de categorias indisponível, envie o lote novamente :/"
+        logger.warning(f"Erro ao adicionar lote de {len(itens)} lançamentos, {error_msg}")
+        return {"mesage": error_msg}, 503
+
+    resultados = [None] * len(itens)
+    validos = []
+    indices_validos = []
+    for indice, item in enumerate(itens):
+        categoria = categorias[item.categoria_id]
+        tipo_categoria = categoria if isinstance(categoria, str) else categoria['tipo']
+        if tipo_categoria != item.tipo:
+            resultados[indice] = {"indice": indice, "status": "tipo_divergente", "id": None,
+                                  "mesage": "O Tipo da categoria não é o mesmo do Lançamento :/"}
+        else:
+            validos.append(item.dict())
+            indices_validos.append(indice)
 
-    # criando conexão com a base
     session = Session()
-    lancamentos = session.query(Lancamento).all()
+    try:
+        ids = insere_lancamentos(session, validos)
+        session.commit()
+    except Exception as e:
+        session.rollback()
+        error_msg = "Não foi possível salvar o lote :/"
+        logger.warning(f"Erro ao adicionar lote de {len(itens)} lançamentos, {error_msg} {e}")
+        return {"mesage": error_msg}, 400
+
+    for indice, id in zip(indices_validos, ids):
+        if id is None:
+            resultados[indice] = {"indice": indice, "status": "duplicado", "id": None,
+                                  "mesage": "Lançamento de mesmo nome, vencimento e login já salvo na base :/"}
+        else:
+            resultados[indice] = {"indice": indice, "status": "criado", "id": id, "mesage": None}
+
+    criados = sum(1 for id in ids if id is not None)
+    duplicados = len(ids) - criados
+    logger.debug("Lote gravado: %s criados, %s duplicados", criados, duplicados)
+    return {"criados": criados,
+            "duplicados": duplicados,
+            "rejeitados": len(itens) - len(ids),
+            "resultados": resultados}, 200
+
+
+@api.post('/lancamentos/importacao', tags=[lancamento_tag],
+          responses={"200": ResultadoImportacaoSchema, "400": ErrorSchema, "503": ErrorSchema})
+def importa_extrato(form: ImportacaoSchema):
+    """
+    Importa um extrato bancário CSV ou OFX em blocos, ignorando lançamentos já existentes.
+    Enviar o mesmo arquivo novamente retoma uma importação interrompida.
+    """
+    arquivo = form.arquivo
+    formato = (form.formato or arquivo.filename.rsplit(".", 1)[-1]).lower()
+    logger.debug("Importando extrato '%s' (%s) para o usuário %s", arquivo.filename, formato, form.login)
+
+    if formato not in ("csv", "ofx"):
+        error_msg = "Formato de extrato não suportado, use csv ou ofx :/"
+        logger.warning(f"Erro ao importar '{arquivo.filename}', {error_msg}")
+        return {"mesage": error_msg}, 400
+
+    importacao_id = identificador_importacao(arquivo.stream, form.login)
+    # a leitura é feita em stream, sem carregar o arquivo inteiro na memória
+    texto = TextIOWrapper(arquivo.stream, encoding="utf-8-sig", errors="replace", newline="")
+    registros = le_csv(texto) if formato == "csv" else le_ofx(texto)
+    regras = RegrasCategoria.de_arquivo(categoria_despesa=form.categoria_despesa,
+                                        categoria_receita=form.categoria_receita)
+
+    try:
+        relatorio = importa(Session(), registros, form.login, regras, importacao_id,
+                            arquivo=arquivo.filename, tamanho_bloco=form.tamanho_bloco)
+    except LinhaInvalida as e:
+        error_msg = f"Extrato inválido: {e} :/"
+        logger.warning(f"Erro ao importar '{arquivo.filename}', {error_msg}")
+        return {"mesage": error_msg}, 400
+    except ServicoIndisponivel as e:
+        error_msg = "Serviço de categorias indisponível, envie o arquivo novamente para retomar :/"
+        logger.warning(f"Erro ao importar '{arquivo.filename}', {error_msg} {e}")
+        return {"mesage": error_msg}, 503
+
+    logger.debug("Importação concluída: %s criados, %s rejeitados", relatorio['criados'], relatorio['rejeitados'])
+    return relatorio, 200
+
+
+@api.post('/lancamento/recorrencia', tags=[lancamento_tag],
+          responses={"200": RecorrenciaViewSchema, "400": ErrorSchema, "404": ErrorSchema, "409": ErrorSchema})
+def add_recorrencia(form: RecorrenciaSchema):
+    """
+    Associa uma regra de repetição a um lançamento, que passa a ser a primeira ocorrência.
+    As demais ocorrências são gravadas de uma vez ou, se sob_demanda, quando o mês for consultado.
+    """
+    lancamento_id = form.id
+    logger.debug("Adicionando recorrência ao lançamento #%s", lancamento_id)
+
+    if form.quantidade is None and form.data_fim is None and (form.parcelado or not form.sob_demanda):
+        error_msg = "Informe a quantidade ou a data final da recorrência :/"
+        logger.warning(f"Erro ao adicionar recorrência ao lançamento #{lancamento_id}, {error_msg}")
+        return {"mesage": error_msg}, 400
+
+    session = Session()
+    # um lançamento arquivado volta para lancamentos para servir de modelo
+    desarquiva(session, LancamentoArquivado.id == lancamento_id)
+    lancamento = session.query(Lancamento).filter(
+        Lancamento.id == lancamento_id).first()
+
+    if not lancamento:
+        error_msg = "Lançamento não encontrado na base :/"
+        logger.warning(f"Erro ao adicionar recorrência ao lançamento #{lancamento_id}, {error_msg}")
+        return {"mesage": error_msg}, 404
+
+    if session.query(Recorrencia.id).filter(Recorrencia.lancamento_id == lancamento_id).first():
+        error_msg = "Lançamento já possui uma recorrência :/"
+        logger.warning(f"Erro ao adicionar recorrência ao lançamento #{lancamento_id}, {error_msg}")
+        return {"mesage": error_msg}, 409
+
+    recorrencia = Recorrencia(lancamento, intervalo_meses=form.intervalo_meses, quantidade=form.quantidade,
+                              data_fim=form.data_fim, parcelado=form.parcelado, sob_demanda=form.sob_demanda)
+    if form.parcelado:
+        # o lançamento modelo passa a ser a parcela 1
+        lancamento.descricao = recorrencia.descricao_parcela(1, recorrencia.total())
+        # os totais não mudam, mas o mês muda de versão: /mensal não pode responder 304
+        registra_lancamento(session, lancamento, sinal=0)
+    session.add(recorrencia)
+    try:
+        session.commit()
+    except IntegrityError:
+        session.rollback()
+        error_msg = "Lançamento de mesmo nome, vencimento e login já salvo na base :/"
+        logger.warning(f"Erro ao adicionar recorrência ao lançamento #{lancamento_id}, {error_msg}")
+        return {"mesage": error_msg}, 409
+
+    criados, duplicados = (0, 0) if form.sob_demanda else materializa(session, recorrencia)
+    logger.debug("Recorrência #%s: %s ocorrências criadas, %s já existentes", recorrencia.id, criados, duplicados)
+    return apresenta_recorrencia(recorrencia, criados, duplicados), 200
+
+
+@api.get('/lancamentos', tags=[lancamento_tag],
+         responses={"200": ListagemLancamentosPaginadaSchema, "400": ErrorSchema})
+def get_lancamentos(query: LancamentosBuscaSchema):
+    """
+    Faz a busca paginada das despesas e receitas cadastradas, ordenadas por vencimento.
+    Retorna uma página da listagem e o cursor da próxima página.
+    """
+    logger.debug("Coletando lançamentos do usuário %s", query.login, extra=AMOSTRA)
+
+    try:
+        posicao = decodifica_cursor(query.cursor) if query.cursor else None
+    except ValueError as e:
+        error_msg = "Cursor inválido :/"
+        logger.warning(f"Erro ao listar lançamentos, {e}")
+        return {"mesage": error_msg}, 400
+
+    def filtro(modelo):
+        filtros = []
+        if query.login:
+            filtros.append(modelo.login == query.login)
+        if posicao:
+            # paginação por chave: continua logo após o último (vencimento, id) enviado
+            filtros.append(tuple_(modelo.data_vencimento, modelo.id) > tuple_(*posicao))
+        return filtros
+
+    # criando conexão com a base; os lançamentos arquivados também fazem parte da listagem
+    session = Session()
+    consulta = ordem_leitura(leitura_completa(filtro))
+
+    if query.stream:
+        return Response(stream_with_context(gera_lancamentos(session, consulta)),
+                        mimetype="application/json")
+
+    lancamentos = session.execute(consulta.limit(query.limite + 1)).all()
+    proximo_cursor = None
+    if len(lancamentos) > query.limite:
+        lancamentos = lancamentos[:query.limite]
+        ultimo = lancamentos[-1]
+        proximo_cursor = codifica_cursor(vencimento(ultimo), ultimo.id)
 
     if not lancamentos:
-        # se não há lançamentos cadastrados
-        return {"lancamentos": []}, 200
+        # se não há lançamentos cadastrados: página vazia, no mesmo formato
+        return {"despesas": [], "proximo_cursor": None}, 200
     else:
-        logger.debug(f"%d lançamentos encontrados" % len(lancamentos))
+        logger.debug("%d lançamentos encontrados", len(lancamentos))
         # retorna a representação da despesa
-        return apresenta_lancamentos(lancamentos), 200
+        resultado = apresenta_linhas(lancamentos)
+        resultado["proximo_cursor"] = proximo_cursor
+        return resultado, 200
 
 
-@app.get('/lancamento', tags=[lancamento_tag],
+def gera_lancamentos(session, consulta, tamanho_bloco: int = 500):
+    """ Gera a listagem em JSON aos poucos, lendo os lançamentos do cursor do banco
+        em blocos, para que a memória não cresça com o tamanho do resultado.
+        A sessão é encerrada no teardown da requisição, ao fim do stream.
+    """
+    yield '{"despesas": ['
+    blocos = session.execute(consulta.execution_options(stream_results=True, yield_per=tamanho_bloco)) \
+        .partitions(tamanho_bloco)
+    primeiro = True
+    for bloco in blocos:
+        itens = ", ".join(json.dumps(item) for item in apresenta_linhas(bloco)["despesas"])
+        yield itens if primeiro else ", " + itens
+        primeiro = False
+    yield ']}'
+
+
+@api.get('/lancamentos/exportacao', tags=[lancamento_tag])
+def exporta_lancamentos(query: ExportacaoBuscaSchema):
+    """
+    Exporta todo o histórico do usuário em CSV ou JSON Lines (ndjson), ordenado por vencimento.
+    O arquivo é enviado aos poucos, lido do banco em blocos, com memória constante.
+    """
+    logger.debug("Exportando lançamentos do usuário %s em %s", query.login, query.formato)
+    conteudo = exporta(Session(), query.login, query.formato)
+    resposta = Response(stream_with_context(conteudo), mimetype=FORMATOS[query.formato])
+    resposta.headers["Content-Disposition"] = f'attachment; filename="lancamentos-{query.login}.{query.formato}"'
+    return resposta
+
+
+@api.get('/lancamentos/changes', tags=[lancamento_tag],
+         responses={"200": AlteracoesViewSchema, "400": ErrorSchema, "410": ErrorSchema})
+def get_alteracoes(query: AlteracoesBuscaSchema):
+    """
+    Retorna apenas os lançamentos do usuário inseridos, alterados ou removidos depois do
+    cursor (since), para o cliente manter uma cópia local. Sem since, envia todos.
+    """
+    logger.debug("Alterações do usuário %s desde %s", query.login, query.since, extra=AMOSTRA)
+    try:
+        desde = decodifica_cursor_alteracoes(query.since) if query.since else None
+    except ValueError as e:
+        error_msg = "Cursor inválido :/"
+        logger.warning(f"Erro ao buscar alterações, {e}")
+        return {"mesage": error_msg}, 400
+    if desde is not None and cursor_expirado(desde[0]):
+        error_msg = "Cursor expirado, recarregue os lançamentos sem since :/"
+        logger.warning(f"Erro ao buscar alterações do usuário {query.login}, {error_msg}")
+        return {"mesage": error_msg}, 410
+
+    # sempre no primário: a réplica atrasada poderia pular alterações já cobertas pelo cursor
+    alteracoes, tem_mais, cursor = consulta_alteracoes(Session(), query.login, desde, query.limite)
+    return apresenta_alteracoes(alteracoes, tem_mais, cursor), 200
+
+
+@api.get('/lancamentos/busca', tags=[lancamento_tag],
+         responses={"200": ListagemBuscaSchema})
+def busca_lancamentos_texto(query: LancamentosTextoBuscaSchema):
+    """
+    Busca os lançamentos do usuário pelas palavras da descrição, por prefixo e sem
+    diferenciar acentos ("ingl" encontra "Inglês"), do mais relevante para o menos.
+    """
+    logger.debug("Buscando '%s' nos lançamentos do usuário %s", query.texto, query.login, extra=AMOSTRA)
+    session = Session()
+    # um a mais que o limite indica se há próxima página
+    lancamentos = busca_lancamentos(session, query.login, query.texto, query.limite + 1,
+                                    query.deslocamento, fts=model.busca_fts)
+    proximo_deslocamento = None
+    if len(lancamentos) > query.limite:
+        lancamentos = lancamentos[:query.limite]
+        proximo_deslocamento = query.deslocamento + query.limite
+
+    resultado = apresenta_lancamentos(lancamentos) if lancamentos else {"despesas": []}
+    resultado["proximo_deslocamento"] = proximo_deslocamento
+    return resultado, 200
+
+
+@api.get('/lancamento', tags=[lancamento_tag],
          responses={"200": LancamentoViewSchema, "404": ErrorSchema})
 def get_lancamento(query: LancamentoBuscaSchema):
     """
@@ -116,11 +467,12 @@ def get_lancamento(query: LancamentoBuscaSchema):
     Retorna uma representação do lançamento encontrado.
     """
     lancamento_descricao = query.descricao
-    logger.debug(f"Coletando dados sobre lançamento #{lancamento_descricao}")
+    logger.debug("Coletando dados sobre lançamento #%s", lancamento_descricao, extra=AMOSTRA)
     # criando conexão com a base
     session = Session()
-    lancamento = session.query(Lancamento).filter(
-        Lancamento.descricao == lancamento_descricao).first()
+    lancamento = session.execute(ordem_leitura(leitura_completa(lambda modelo: (
+        modelo.login == query.login,
+        modelo.descricao == lancamento_descricao)), decrescente=True).limit(1)).first()
 
     if not lancamento:
         # se lançamento não foi encontrado
@@ -129,11 +481,14 @@ def get_lancamento(query: LancamentoBuscaSchema):
             f"Erro ao buscar lançamento '{lancamento_descricao}', {error_msg}")
         return {"mesage": error_msg}, 404
     else:
-        logger.debug(f"Despesa encontrada: '{lancamento_descricao}'")
+        logger.debug("Despesa encontrada: '%s'", lancamento_descricao, extra=AMOSTRA)
+        data_vencimento = vencimento(lancamento)
+        versao = versao_mes(session, lancamento.login, data_vencimento)
+        chave = f"lancamento|{lancamento.id}|{lancamento.login}|{data_vencimento}|{versao}|{epoca_categorias(session)}"
         # retorna a representação da despesa
-        return apresenta_lancamento(lancamento), 200
+        return resposta_condicional(chave, lambda: (apresenta_linhas([lancamento])["despesas"][0], 200))
 
-@app.get('/mensal', tags=[lancamento_tag],
+@api.get('/mensal', tags=[lancamento_tag],
          responses={"200": ListagemLancamentosSchema, "404": ErrorSchema})
 def get_mensal(query: MensalBuscaSchema):
     """
@@ -142,27 +497,38 @@ def get_mensal(query: MensalBuscaSchema):
 
     lancamento_mes = query.data_vencimento
     login = query.login
-    logger.debug(f"Coletando dados sobre lançamento #{lancamento_mes} para usuário {login}")
+    logger.debug("Coletando dados sobre lançamento #%s para usuário %s", lancamento_mes, login, extra=AMOSTRA)
     # criando conexão com a base
     session = Session()
     
-    lancamentos = session.query(Lancamento).filter(
-        extract('month', Lancamento.data_vencimento) ==  extract('month', lancamento_mes),
-        cast(extract('year', Lancamento.data_vencimento), Integer) == cast(extract('year', lancamento_mes), Integer),
-        Lancamento.login == login).all()
+    inicio, fim = intervalo_mes(lancamento_mes)
+
+    # recorrências sob demanda geram as ocorrências na primeira consulta do mês (escrita: no primário)
+    with no_primario(session, login):
+        materializa_pendentes(session, login, fim - timedelta(days=1))
+
+    def gera():
+        # meses antigos podem ter lançamentos arquivados
+        lancamentos = session.execute(ordem_leitura(leitura_completa(lambda modelo: (
+            modelo.login == login,
+            modelo.data_vencimento >= inicio,
+            modelo.data_vencimento < fim)))).all()
+
+        if not lancamentos:
+            # se lançamento não foi encontrado
+            error_msg = f"Lançamentos não encontrados na base para o usuário {login}:"
+            logger.warning(
+                f"Erro ao buscar lançamento '{lancamento_mes}' para o usuário {login}, {error_msg}")
+            return {"mesage": error_msg}, 404
+        else:
+            logger.debug("Lançamentos encontrados: '%s' para o usuário %s", lancamento_mes, login, extra=AMOSTRA)
+            # retorna a representação da despesa
+            return apresenta_linhas(lancamentos), 200
 
-    if not lancamentos:
-        # se lançamento não foi encontrado
-        error_msg = f"Lançamentos não encontrados na base para o usuário {login}:"
-        logger.warning(
-            f"Erro ao buscar lançamento '{lancamento_mes}' para o usuário {login}, {error_msg}")
-        return {"mesage": error_msg}, 404
-    else:
-        logger.debug(f"Lançamentos encontrados: '{lancamento_mes}' para o usuário {login}")
-        # retorna a representação da despesa
-        return apresenta_lancamentos(lancamentos), 200
+    chave = f"mensal|{login}|{inicio}|{versao_mes(session, login, inicio)}|{epoca_categorias(session)}"
+    return resposta_condicional(chave, gera)
     
-@app.get('/saldo', tags=[lancamento_tag], responses={"200": ControleViewSchema, "409": ErrorSchema, "400": ErrorSchema})
+@api.get('/saldo', tags=[lancamento_tag], responses={"200": ControleViewSchema, "409": ErrorSchema, "400": ErrorSchema})
 def get_saldo(query: MensalBuscaSchema):
     """
     Consolida os lançamentos totalizando os valores mensais
@@ -171,48 +537,88 @@ def get_saldo(query: MensalBuscaSchema):
 
     """
     mes_corrente = query.data_vencimento
-    logger.debug(f"Buscando lançamentos do mês '{mes_corrente}'")
+    login = query.login
+    logger.debug("Buscando lançamentos do mês '%s' para o usuário %s", mes_corrente, login, extra=AMOSTRA)
 
     session = Session()
-    lancamentos = session.query(Lancamento).filter(
-        extract('month', Lancamento.data_vencimento) ==  extract('month', mes_corrente),
-        cast(extract('year', Lancamento.data_vencimento), Integer) == cast(extract('year', mes_corrente), Integer)).all()
-    
-    if not lancamentos:
+    inicio, _ = intervalo_mes(mes_corrente)
+
+    # totais do mês mantidos em monthly_summary: leitura pela chave primária
+    resumo = session.get(ResumoMensal, (login, mes_corrente.year, mes_corrente.month))
+    quantidade = resumo.quantidade if resumo else 0
+
+    if not quantidade:
         # se lançamento não foi encontrado
         error_msg = "Lançamento não encontrada na base para o mês corrente :/"
         logger.warning(
             f"Erro ao buscar lançamento para o mês '{mes_corrente}', {error_msg}")
         return {"mesage": error_msg}, 404
-    else:
 
-        despesas = [lancamento for lancamento in lancamentos if lancamento.tipo == "Despesa"]
-        receitas = [lancamento for lancamento in lancamentos if lancamento.tipo == "Receita"]
-        despesas_pagas = [lancamento for lancamento in despesas if lancamento.pago == True]
-        despesas_nao_pagas = [lancamento for lancamento in despesas if lancamento.pago == False]
-        despesas_nao_pagas_atrasadas = [lancamento for lancamento in despesas if lancamento.pago == False and lancamento.data_vencimento < mes_corrente]
-        
-        total_valor = sum(lancamento.valor for lancamento in lancamentos)
-        total_despesas = sum(lancamento.valor for lancamento in despesas)
-        total_receitas = sum(lancamento.valor for lancamento in receitas)
-        saldo_pago = sum(lancamento.valor for lancamento in despesas_pagas)
-        total_atrasadas = sum(lancamento.valor for lancamento in despesas_nao_pagas_atrasadas)
-        total_a_vencer = (sum(lancamento.valor for lancamento in despesas_nao_pagas)) - total_atrasadas
+    def gera():
+        # despesas em atraso dependem do dia consultado: busca pelo índice (login, data_vencimento)
+        total_atrasadas = session.query(func.coalesce(func.sum(Lancamento.valor), 0)).filter(
+            Lancamento.login == login,
+            Lancamento.data_vencimento >= inicio,
+            Lancamento.data_vencimento < mes_corrente,
+            Lancamento.tipo == "Despesa",
+            Lancamento.pago == False).scalar()
+
+        total_valor = resumo.total_valor
+        total_despesas = resumo.total_despesas
+        total_receitas = resumo.total_receitas
+        saldo_pago = resumo.despesas_pagas
+        total_a_vencer = resumo.despesas_nao_pagas - total_atrasadas
         saldo_mes = total_receitas - saldo_pago
 
+        # totais acumulados podem carregar resíduos de ponto flutuante
         valores = {
-            "saldo_mes": saldo_mes,
-            "saldo_pago": saldo_pago,
-            "total_a_vencer": total_a_vencer,
-            "total_atrasadas": total_atrasadas,
-            "total_despesas": total_despesas,
-            "total_receitas": total_receitas,
-            "total_valor": total_valor}
-
-        logger.debug(f"Valor encontrada na API #{total_valor}")
-        return valores
-
-@app.delete('/lancamento', tags=[lancamento_tag],
+            "saldo_mes": round(saldo_mes, 2),
+            "saldo_pago": round(saldo_pago, 2),
+            "total_a_vencer": round(total_a_vencer, 2),
+            "total_atrasadas": round(total_atrasadas, 2),
+            "total_despesas": round(total_despesas, 2),
+            "total_receitas": round(total_receitas, 2),
+            "total_valor": round(total_valor, 2)}
+
+        logger.debug("Valor encontrada na API #%s", total_valor, extra=AMOSTRA)
+        return valores, 200
+
+    chave = f"saldo|{login}|{mes_corrente}|{resumo.versao}"
+    return resposta_condicional(chave, gera)
+
+# maior período aceito pelo relatório
+MAXIMO_MESES_RELATORIO = int(os.environ.get("RELATORIO_MAXIMO_MESES", 36))
+
+
+@api.get('/relatorio', tags=[lancamento_tag],
+         responses={"200": RelatorioViewSchema, "400": ErrorSchema})
+def get_relatorio(query: RelatorioBuscaSchema):
+    """
+    Totaliza os lançamentos do usuário no período por mês e categoria: receitas, despesas
+    e despesas pagas, não pagas e atrasadas. O retorno é em colunas (listas paralelas).
+    """
+    login = query.login
+    inicio, fim = query.data_inicio, query.data_fim
+    referencia = query.data_referencia or date.today()
+    logger.debug("Gerando relatório de %s a %s para o usuário %s", inicio, fim, login, extra=AMOSTRA)
+
+    meses = (fim.year - inicio.year) * 12 + fim.month - inicio.month + 1
+    if fim < inicio or meses > MAXIMO_MESES_RELATORIO:
+        error_msg = f"Período inválido: informe até {MAXIMO_MESES_RELATORIO} meses com data_fim após data_inicio :/"
+        logger.warning(f"Erro ao gerar relatório de '{inicio}' a '{fim}', {error_msg}")
+        return {"mesage": error_msg}, 400
+
+    session = Session()
+
+    def gera():
+        linhas = calcula_relatorio(session, login, inicio, fim, referencia)
+        return apresenta_relatorio(login, inicio, fim, referencia, linhas), 200
+
+    versao = versao_periodo(session, login, inicio, fim)
+    chave = f"relatorio|{login}|{inicio}|{fim}|{referencia}|{versao}|{epoca_categorias(session)}"
+    return resposta_condicional(chave, gera)
+
+@api.delete('/lancamento', tags=[lancamento_tag],
             responses={"200": LancamentoRetornoSchema, "404": ErrorSchema})
 def del_lancamento(query: LancamentoDelPagaSchema):
     """
@@ -220,19 +626,26 @@ def del_lancamento(query: LancamentoDelPagaSchema):
     Retorna uma mensagem de confirmação da remoção.
     """
     lancamento_id= query.id
-    print(lancamento_id)
-    logger.debug(f"Deletando dados sobre lançamento #{lancamento_id}")
+    logger.debug("Deletando dados sobre lançamento #%s", lancamento_id)
 
     # criando conexão com a base
     session = Session()
-    # fazendo a remoção
-    count = session.query(Lancamento).filter(
-        Lancamento.id == lancamento_id).delete()
+    # um lançamento arquivado volta para lancamentos e é removido de lá
+    desarquiva(session, LancamentoArquivado.id == lancamento_id)
+    # fazendo a remoção e retirando o lançamento do resumo do mês
+    lancamento = session.query(Lancamento).filter(
+        Lancamento.id == lancamento_id).first()
+    count = 0
+    if lancamento:
+        registra_lancamento(session, lancamento, sinal=-1)
+        registra_remocao(session, lancamento)
+        count = session.query(Lancamento).filter(
+            Lancamento.id == lancamento_id).delete()
     session.commit()
 
     if count:
         # retorna a representação da mensagem de confirmação
-        logger.debug(f"Deletado lançamento #{lancamento_id}")
+        logger.debug("Deletado lançamento #%s", lancamento_id)
         return {"mesage": "Lançamento removido", "id": lancamento_id}
     else:
         # se a lançamento não foi encontrada
@@ -242,27 +655,24 @@ def del_lancamento(query: LancamentoDelPagaSchema):
         return {"mesage": error_msg}, 404
 
 
-@app.put('/paga', tags=[lancamento_tag],
+@api.put('/paga', tags=[lancamento_tag],
          responses={"200": LancamentoRetornoSchema, "404": ErrorSchema})
 def paga_lancamento(query: LancamentoDelPagaSchema):
     """ 
     Atualiza o status de pagamento de uma lancamento a partir do nome informado. 
     """
     lancamento_id = query.id
-    print(lancamento_id)
-    logger.debug(f"Atualizando dados sobre despesa #{lancamento_id}")
+    logger.debug("Atualizando dados sobre despesa #%s", lancamento_id)
 
     # criando conexão com a base
     session = Session()
-    # fazendo a remoção
-    lancamento = session.query(Lancamento).filter(
-        Lancamento.id == lancamento_id).first()
+    # inversão atômica no banco, com o resumo do mês na mesma transação
+    lancamento = alterna_pagamento(session, lancamento_id)
 
     if lancamento:
-        lancamento.pago = not lancamento.pago
         session.commit()
         # retorna a representação da mensagem de confirmação
-        logger.debug(f"Atualizando lancamento #{lancamento_id}")
+        logger.debug("Atualizando lancamento #%s", lancamento_id)
         return {"mesage": "Lançamento atualizado", "id": lancamento_id}
     else:
         # se o lancamento não foi encontrado
@@ -272,7 +682,61 @@ def paga_lancamento(query: LancamentoDelPagaSchema):
         return {"mesage": error_msg}, 404
 
 
-@app.put('/lancamento', tags=[lancamento_tag],
+@api.put('/lancamentos/paga', tags=[lancamento_tag],
+         responses={"200": ResultadoPagamentoLoteSchema, "400": ErrorSchema})
+def paga_lancamentos_lote(body: PagamentoLoteSchema):
+    """
+    Marca como pagos (ou não pagos, com pago=false) os lançamentos da lista de ids, ou
+    todos os lançamentos do usuário no mês informado, opcionalmente apenas de um tipo.
+    Retorna a quantidade alterada e os ids que não foram encontrados.
+    """
+    if body.ids is None and (body.login is None or body.mes is None):
+        error_msg = "Informe ids ou login e mes :/"
+        logger.warning(f"Erro ao marcar pagamento em lote, {error_msg}")
+        return {"mesage": error_msg}, 400
+
+    logger.debug("Marcando pagamento em lote: pago=%s, %s ids, login %s, mês %s, tipo %s",
+                 body.pago, len(body.ids) if body.ids is not None else None, body.login, body.mes, body.tipo)
+    session = Session()
+    if body.ids is not None:
+        alteradas, nao_encontrados = marca_pagamento(session, body.pago, ids=body.ids)
+    else:
+        alteradas, nao_encontrados = marca_pagamento(session, body.pago, login=body.login, mes=body.mes,
+                                                     tipo=body.tipo)
+    session.commit()
+
+    return {"alterados": len(alteradas),
+            "ids": [linha.id for linha in alteradas],
+            "nao_encontrados": nao_encontrados}, 200
+
+
+@api.post('/categorias/invalidacao', tags=[categoria_tag],
+          responses={"200": ResultadoSincronizacaoSchema, "503": ErrorSchema})
+def invalida_categoria(body: CategoriaInvalidacaoSchema):
+    """
+    Webhook para o serviço de categorias avisar de uma alteração: a categoria
+    informada é buscada de novo para a cópia local (ou removida, se não existir mais).
+    Sem id, todo o cadastro é sincronizado.
+    """
+    logger.debug("Invalidação da categoria %s", body.id)
+    session = Session()
+    try:
+        if body.id is None:
+            gravadas, removidas = sincroniza_categorias(session)
+        else:
+            gravadas, removidas = atualiza_categoria(session, body.id)
+    except ServicoIndisponivel as e:
+        error_msg = SERVICO_INDISPONIVEL
+        logger.warning(f"Erro ao sincronizar a categoria '{body.id}', {e}")
+        return {"mesage": error_msg}, 503
+    session.commit()
+    if gravadas or removidas:
+        # os outros workers percebem pela versão das categorias, que faz parte dos ETags
+        respostas_cache.invalida()
+    return {"gravadas": gravadas, "removidas": removidas}, 200
+
+
+@api.put('/lancamento', tags=[lancamento_tag],
          responses={"200": LancamentoRetornoCompletoSchema, "404": ErrorSchema})
 def edita_lancamento(query: LancamentoBuscaEdicaoSchema):
     """ 
@@ -287,11 +751,13 @@ def edita_lancamento(query: LancamentoBuscaEdicaoSchema):
     lancamento_vencimento = query.data_vencimento
     lancamento_id_categoria = query.categoria_id
 
-    logger.debug(f"Atualizando dados sobre lançamento #{lancamento_id}")
+    logger.debug("Atualizando dados sobre lançamento #%s", lancamento_id)
 
     # criando conexão com a base
     session = Session()
 
+    # um lançamento arquivado volta para lancamentos antes de ser editado
+    desarquiva(session, LancamentoArquivado.id == lancamento_id)
     # fazendo a edição de acordo com o ID do lançamento.
     lancamento = session.query(Lancamento).filter(
         Lancamento.id == lancamento_id).first()
@@ -302,14 +768,25 @@ def edita_lancamento(query: LancamentoBuscaEdicaoSchema):
         categoria_tipo = TipoCategoria(lancamento_id_categoria)
 
         if lancamento_tipo == categoria_tipo:
+            # retira os valores antigos do resumo e inclui os novos, mesmo se o mês mudar
+            registra_lancamento(session, lancamento, sinal=-1)
             lancamento.descricao = lancamento_descricao
             lancamento.valor = lancamento_valor
             lancamento.data_vencimento = lancamento_vencimento
             lancamento.categoria_id = lancamento_id_categoria
-
-            session.commit()
+            lancamento.tipo = lancamento_tipo
+            registra_lancamento(session, lancamento)
+
+            try:
+                session.commit()
+            except IntegrityError:
+                session.rollback()
+                # a nova chave já existe em lancamentos ou no arquivo
+                error_msg = "Lançamento de mesmo nome, vencimento e login já salvo na base :/"
+                logger.warning(f"Erro ao atualizar lançamento #'{lancamento_id}', {error_msg}")
+                return {"mesage": error_msg}, 409
             # retorna a representação da mensagem de confirmação
-            logger.debug(f"Atualizando lançamento #{lancamento_id}")
+            logger.debug("Atualizando lançamento #%s", lancamento_id)
             return {"mesage": "Lançamento atualizado com sucesso", "lancamento": apresenta_lancamento(lancamento)}, 200
         
         else:
@@ -324,3 +801,186 @@ def edita_lancamento(query: LancamentoBuscaEdicaoSchema):
             f"Erro ao atualizar lançamento #'{lancamento_id}', {error_msg}")
         return {"mesage": error_msg}, 404
 
+
+# comandos de manutenção: flask resumo verifica | flask resumo reconstroi
+resumo_cli = AppGroup('resumo', help="Manutenção dos totais mensais (monthly_summary).")
+
+
+@resumo_cli.command('verifica')
+def verifica_resumo():
+    """Compara monthly_summary com os totais recalculados a partir de lancamentos."""
+    session = Session()
+    divergencias = verifica_resumos(session)
+    for (login, ano, mes), gravado, esperado in divergencias:
+        click.echo(f"{login} {mes:02d}/{ano}: gravado {gravado} esperado {esperado}")
+    click.echo(f"{len(divergencias)} mês(es) com divergência")
+    if divergencias:
+        raise SystemExit(1)
+
+
+@resumo_cli.command('reconstroi')
+def reconstroi_resumo():
+    """Recalcula monthly_summary a partir de lancamentos."""
+    session = Session()
+    divergencias = verifica_resumos(session)
+    quantidade = reconstroi_resumos(session)
+    session.commit()
+    click.echo(f"{quantidade} mês(es) recalculados, {len(divergencias)} divergência(s) corrigida(s)")
+
+
+
+# comandos da busca por texto: flask busca reconstroi
+busca_cli = AppGroup('busca', help="Manutenção do índice de busca por texto (lancamentos_fts).")
+
+
+@busca_cli.command('reconstroi')
+def reconstroi_indice_busca():
+    """Recria o índice de busca por texto a partir de lancamentos."""
+    if not model.busca_fts:
+        click.echo("Banco sem FTS5: a busca usa LIKE e não tem índice")
+        raise SystemExit(1)
+    with engine.begin() as conexao:
+        reconstroi_busca(conexao)
+    click.echo("Índice de busca recriado")
+
+
+
+# réplica de leitura local: flask replica sincroniza
+replica_cli = AppGroup('replica', help="Cópia do banco primário para a réplica de leitura (SQLite).")
+
+
+@replica_cli.command('sincroniza')
+@click.option('--intervalo', type=float, help="Repete a cópia a cada N segundos.")
+def sincroniza_replica_cli(intervalo):
+    """Copia o banco primário para a réplica com a API de backup do SQLite."""
+    while True:
+        inicio = time.monotonic()
+        try:
+            sincroniza_replica()
+        except ValueError as e:
+            click.echo(str(e))
+            raise SystemExit(1)
+        click.echo(f"Réplica sincronizada em {time.monotonic() - inicio:.2f}s")
+        if not intervalo:
+            break
+        time.sleep(intervalo)
+
+
+
+# cópia local das categorias: flask categorias sincroniza
+categorias_cli = AppGroup('categorias', help="Cópia local das categorias do serviço de categorias.")
+
+
+@categorias_cli.command('sincroniza')
+@click.option('--intervalo', type=float, help="Repete a sincronização a cada N segundos.")
+def sincroniza_categorias_cli(intervalo):
+    """Copia o cadastro de categorias do serviço para a tabela local."""
+    while True:
+        session = Session()
+        try:
+            gravadas, removidas = sincroniza_categorias(session)
+        except ServicoIndisponivel as e:
+            click.echo(f"Serviço de categorias indisponível: {e}")
+            raise SystemExit(1)
+        session.commit()
+        Session.remove()
+        click.echo(f"{gravadas} categoria(s) gravada(s), {removidas} removida(s)")
+        if not intervalo:
+            break
+        time.sleep(intervalo)
+
+
+# registros de remoção usados por /lancamentos/changes: flask alteracoes limpa
+alteracoes_cli = AppGroup('alteracoes', help="Manutenção dos registros de remoção (lancamentos_removidos).")
+
+
+@alteracoes_cli.command('limpa')
+@click.option('--dias', type=int, help="Retenção em dias; padrão ALTERACOES_RETENCAO_DIAS.")
+def limpa_remocoes_cli(dias):
+    """Apaga os registros de remoção mais antigos que a retenção."""
+    session = Session()
+    quantidade = limpa_remocoes(session, dias) if dias is not None else limpa_remocoes(session)
+    session.commit()
+    click.echo(f"{quantidade} registro(s) de remoção apagado(s)")
+
+
+# arquivamento dos lançamentos pagos antigos: flask arquivo executa
+arquivo_cli = AppGroup('arquivo', help="Arquivamento de lançamentos pagos antigos (lancamentos_archive).")
+
+
+@arquivo_cli.command('executa')
+@click.option('--meses', type=int, default=ARQUIVO_HORIZONTE_MESES, show_default=True,
+              help="Meses, antes do mês corrente, mantidos em lancamentos.")
+@click.option('--bloco', default=1000, show_default=True, help="Lançamentos movidos por transação.")
+def arquiva_cli(meses, bloco):
+    """Move os lançamentos pagos com vencimento anterior ao horizonte para o arquivo."""
+    horizonte = horizonte_arquivo(meses)
+    try:
+        movidos = arquiva(Session(), horizonte, bloco)
+    except ValueError as e:
+        click.echo(str(e))
+        raise SystemExit(1)
+    finally:
+        Session.remove()
+    click.echo(f"{movidos} lançamento(s) arquivado(s), vencidos antes de {horizonte.isoformat()}")
+
+
+@click.command('importa')
+@with_appcontext
+@click.argument('caminho', type=click.Path(exists=True, dir_okay=False))
+@click.option('--login', required=True, help="Usuário dono dos lançamentos.")
+@click.option('--formato', type=click.Choice(["csv", "ofx"]), help="Padrão: extensão do arquivo.")
+@click.option('--categoria-despesa', type=int, help="Categoria das despesas sem regra.")
+@click.option('--categoria-receita', type=int, help="Categoria das receitas sem regra.")
+@click.option('--regras', type=click.Path(exists=True, dir_okay=False), help="JSON com as regras de categoria.")
+@click.option('--bloco', default=1000, show_default=True, help="Linhas gravadas por transação.")
+def importa_extrato_cli(caminho, login, formato, categoria_despesa, categoria_receita, regras, bloco):
+    """Importa um extrato CSV ou OFX; executar de novo retoma uma importação interrompida."""
+    formato = formato or caminho.rsplit(".", 1)[-1].lower()
+    with open(caminho, "rb") as arquivo:
+        importacao_id = identificador_importacao(arquivo, login)
+    regras = RegrasCategoria.de_arquivo(regras, categoria_despesa=categoria_despesa,
+                                        categoria_receita=categoria_receita)
+    with open(caminho, encoding="utf-8-sig", errors="replace", newline="") as texto:
+        registros = le_csv(texto) if formato == "csv" else le_ofx(texto)
+        try:
+            relatorio = importa(Session(), registros, login, regras, importacao_id,
+                                arquivo=os.path.basename(caminho), tamanho_bloco=bloco)
+        except LinhaInvalida as e:
+            raise click.ClickException(f"Extrato inválido: {e}")
+        except ServicoIndisponivel as e:
+            raise click.ClickException(f"Serviço de categorias indisponível, execute novamente para retomar: {e}")
+    click.echo(json.dumps(relatorio, ensure_ascii=False, indent=2))
+
+
+def create_app():
+    """ Monta o app: prepara o banco (uma vez por processo), o log, a sessão por
+        requisição, as métricas, as rotas e os comandos do flask.
+
+        Com preload_app (gunicorn_config.py) é chamada só no master; cada worker
+        recria conexões, log e cliente de categorias em post_fork.
+    """
+    inicializa_banco()
+    inicia_log()
+
+    app = OpenAPI(__name__, info=info)
+    CORS(app, expose_headers=["ETag"])
+
+    # sessão do banco por requisição: confirmada ou desfeita e fechada ao final
+    app.teardown_appcontext(encerra_sessao)
+
+    # tempos por requisição, comandos SQL e chamadas ao serviço de categorias, expostos em /metrics
+    metricas.instala(app, [engine] + ([engine_replica] if engine_replica is not None else []), cliente_categoria)
+    app.before_request(escolhe_banco)
+    # a thread de sincronização das categorias nasce no worker, na primeira requisição
+    app.before_request(sincronizador_categorias.inicia)
+
+    app.register_api(api)
+    for comando in (resumo_cli, busca_cli, replica_cli, categorias_cli, alteracoes_cli,
+                    arquivo_cli, importa_extrato_cli):
+        app.cli.add_command(comando)
+    return app
+
+
+# app usado pelo gunicorn (app:app) e pelo flask run
+app = create_app()
@@ -0,0 +1,10 @@
+""" Benchmark reprodutível da API de lançamentos.
+
+    dados: gerador de lançamentos com semente fixa
+    categoria_stub: servidor local que substitui o serviço de categorias
+    driver: executa os endpoints em níveis de concorrência e gera o relatório em JSON
+    leitura: custo por linha da leitura com ORM e com projeção de colunas
+    inicializacao: tempo de partida do app e dos workers, com e sem preload
+
+    Uso: python -m benchmark.driver --usuarios 20 --meses 12 --concorrencia 1 4 8
+"""
@@ -0,0 +1,89 @@
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from threading import Thread, Lock
+import argparse
+import json
+import time
+
+
+def categorias_padrao(quantidade: int = 15):
+    """ Categorias servidas pelo stub: múltiplos de 5 são receitas, as demais despesas. """
+    return {id: {"id": id, "nome": f"Categoria {id}", "tipo": "Receita" if id % 5 == 0 else "Despesa"}
+            for id in range(1, quantidade + 1)}
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        servidor = self.server
+        with servidor.lock:
+            servidor.chamadas += 1
+        if servidor.latencia:
+            time.sleep(servidor.latencia)
+
+        url = urlparse(self.path)
+        parametros = parse_qs(url.query)
+        if url.path == "/categoriaID":
+            categoria = servidor.categorias.get(int(parametros.get("id", ["0"])[0]))
+            if categoria is None:
+                return self._responde(404, {"mesage": "Categoria não encontrada"})
+            return self._responde(200, categoria)
+        if url.path == "/categorias":
+            return self._responde(200, {"categorias": list(servidor.categorias.values())})
+        if url.path == "/categoriasID":
+            ids = [int(id) for id in parametros.get("ids", [""])[0].split(",") if id]
+            return self._responde(200, {"categorias": [servidor.categorias[id] for id in ids
+                                                       if id in servidor.categorias]})
+        self._responde(404, {"mesage": "Rota não encontrada"})
+
+    def _responde(self, status: int, corpo: dict):
+        conteudo = json.dumps(corpo).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(conteudo)))
+        self.end_headers()
+        self.wfile.write(conteudo)
+
+
+class CategoriaStub(ThreadingHTTPServer):
+    """ Servidor local com as rotas /categoriaID, /categoriasID e /categorias do serviço de categorias,
+        com latência configurável e contagem das chamadas recebidas.
+    """
+    daemon_threads = True
+
+    def __init__(self, porta: int = 0, latencia: float = 0.0, categorias: dict = None):
+        """
+        Cria o servidor
+
+        Arguments:
+            porta: porta local; 0 escolhe uma porta livre
+            latencia: segundos de espera antes de cada resposta
+            categorias: dicionário id -> categoria; por padrão categorias_padrao()
+        """
+        super().__init__(("127.0.0.1", porta), _Handler)
+        self.latencia = latencia
+        self.categorias = categorias or categorias_padrao()
+        self.chamadas = 0
+        self.lock = Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_port}"
+
+    def inicia(self):
+        """ Atende as requisições em uma thread separada e retorna o próprio servidor. """
+        Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stub local do serviço de categorias.")
+    parser.add_argument("--porta", type=int, default=5000)
+    parser.add_argument("--latencia", type=float, default=0.0, help="segundos por resposta")
+    argumentos = parser.parse_args()
+    servidor = CategoriaStub(argumentos.porta, argumentos.latencia)
+    print(f"Stub de categorias em {servidor.url} (latência {argumentos.latencia}s)")
+    servidor.serve_forever()
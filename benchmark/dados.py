@@ -0,0 +1,51 @@
+from datetime import date
+import random
+
+from benchmark.categoria_stub import categorias_padrao
+
+
+def gera_lancamentos(usuarios: int, meses: int, por_mes: int, semente: int = 42,
+                     inicio: date = date(2024, 1, 1), categorias: dict = None):
+    """ Gera, de forma reprodutível, os lançamentos de N usuários em M meses.
+        O tipo de cada lançamento é o mesmo da sua categoria.
+    """
+    aleatorio = random.Random(semente)
+    categorias = categorias or categorias_padrao()
+    ids = sorted(categorias)
+    for usuario in range(usuarios):
+        login = f"user{usuario:04d}"
+        for mes in range(meses):
+            ano, mes_ano = inicio.year + (inicio.month - 1 + mes) // 12, (inicio.month - 1 + mes) % 12 + 1
+            for numero in range(por_mes):
+                categoria_id = aleatorio.choice(ids)
+                yield {
+                    "descricao": f"Lançamento {numero} {mes_ano:02d}/{ano}",
+                    "valor": round(aleatorio.uniform(5, 2000), 2),
+                    "pago": aleatorio.random() < 0.5,
+                    "tipo": categorias[categoria_id]["tipo"],
+                    "categoria_id": categoria_id,
+                    "data_vencimento": date(ano, mes_ano, aleatorio.randint(1, 28)),
+                    "login": login}
+
+
+def popula(session, usuarios: int, meses: int, por_mes: int, semente: int = 42, tamanho_bloco: int = 5000):
+    """ Grava os lançamentos gerados e recalcula os resumos mensais.
+        Retorna a quantidade de lançamentos gravados.
+    """
+    from model.lancamento import Lancamento
+    from model.resumo import reconstroi_resumos
+
+    total = 0
+    bloco = []
+    for item in gera_lancamentos(usuarios, meses, por_mes, semente):
+        bloco.append(item)
+        if len(bloco) == tamanho_bloco:
+            session.execute(Lancamento.__table__.insert(), bloco)
+            total += len(bloco)
+            bloco = []
+    if bloco:
+        session.execute(Lancamento.__table__.insert(), bloco)
+        total += len(bloco)
+    reconstroi_resumos(session)
+    session.commit()
+    return total
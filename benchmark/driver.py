@@ -0,0 +1,253 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from threading import Lock
+from contextlib import redirect_stdout
+import argparse
+import logging
+import itertools
+import platform
+import tempfile
+import random
+import json
+import time
+import sys
+import os
+
+from benchmark.categoria_stub import CategoriaStub, categorias_padrao
+from benchmark.dados import popula
+
+# raiz do repositório, para importar o app a partir do diretório temporário
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentil(valores, p: float):
+    """ Percentil pelo método do posto mais próximo; valores já ordenados. """
+    if not valores:
+        return None
+    indice = max(0, min(len(valores) - 1, int(round(p / 100 * len(valores) + 0.5)) - 1))
+    return valores[indice]
+
+
+class ContadorSQL:
+    """ Conta os comandos SQL executados pelos engines do app (primário e réplica). """
+
+    def __init__(self, *engines):
+        from sqlalchemy import event
+        self.total = 0
+        self.lock = Lock()
+        for engine in engines:
+            if engine is not None:
+                event.listen(engine, "before_cursor_execute", self._conta)
+
+    def _conta(self, *args):
+        with self.lock:
+            self.total += 1
+
+
+class Cenarios:
+    """ Requisições de cada endpoint, com parâmetros sorteados a partir da semente
+        dentro dos usuários e meses gerados.
+    """
+
+    def __init__(self, usuarios: int, meses: int, por_mes: int, semente: int, inicio: date = date(2024, 1, 1)):
+        self.usuarios = usuarios
+        self.meses = meses
+        self.por_mes = por_mes
+        self.inicio = inicio
+        self.aleatorio = random.Random(semente)
+        self.lock = Lock()
+        self.sequencia = itertools.count()
+        self.categorias = categorias_padrao()
+        # ids gerados por popula: 1..total, em ordem de usuário e mês
+        self.ids_livres = list(range(1, usuarios * meses * por_mes + 1))
+        self.aleatorio.shuffle(self.ids_livres)
+
+    def _login(self):
+        return f"user{self.aleatorio.randrange(self.usuarios):04d}"
+
+    def _data(self):
+        indice = self.inicio.month - 1 + self.aleatorio.randrange(self.meses)
+        return date(self.inicio.year + indice // 12, indice % 12 + 1, self.aleatorio.randint(1, 28))
+
+    def _id(self, remove: bool = False):
+        if remove:
+            return self.ids_livres.pop()
+        return self.ids_livres[self.aleatorio.randrange(len(self.ids_livres))]
+
+    def requisicao(self, nome: str):
+        """ Retorna (metodo, caminho, parametros de query, dados de formulário). """
+        with self.lock:
+            if nome == "GET /mensal":
+                return "get", "/mensal", {"login": self._login(), "data_vencimento": self._data().isoformat()}, None
+            if nome == "GET /saldo":
+                return "get", "/saldo", {"login": self._login(), "data_vencimento": self._data().isoformat()}, None
+            if nome == "GET /lancamentos":
+                return "get", "/lancamentos", {"login": self._login(), "limite": 100}, None
+            if nome == "POST /lancamento":
+                categoria_id = self.aleatorio.choice(sorted(self.categorias))
+                return "post", "/lancamento", None, {
+                    "descricao": f"Benchmark {next(self.sequencia)}",
+                    "valor": round(self.aleatorio.uniform(5, 2000), 2),
+                    "pago": "false",
+                    "tipo": self.categorias[categoria_id]["tipo"],
+                    "categoria_id": categoria_id,
+                    "data_vencimento": self._data().isoformat(),
+                    "login": self._login()}
+            if nome == "PUT /lancamento":
+                categoria_id = self.aleatorio.choice(sorted(self.categorias))
+                return "put", "/lancamento", {
+                    "id": self._id(),
+                    "descricao": f"Editado {next(self.sequencia)}",
+                    "valor": round(self.aleatorio.uniform(5, 2000), 2),
+                    "tipo": self.categorias[categoria_id]["tipo"],
+                    "categoria_id": categoria_id,
+                    "data_vencimento": self._data().isoformat()}, None
+            if nome == "PUT /paga":
+                return "put", "/paga", {"id": self._id()}, None
+            if nome == "DELETE /lancamento":
+                return "delete", "/lancamento", {"id": self._id(remove=True)}, None
+        raise ValueError(f"cenário desconhecido: {nome}")
+
+
+# leituras antes das escritas; DELETE por último, pois remove lançamentos usados nos demais
+ENDPOINTS = ("GET /mensal", "GET /saldo", "GET /lancamentos",
+             "POST /lancamento", "PUT /lancamento", "PUT /paga", "DELETE /lancamento")
+
+
+def executa_cenario(app, cenarios: Cenarios, nome: str, concorrencia: int, requisicoes: int,
+                    contador_sql: ContadorSQL, stub: CategoriaStub):
+    """ Executa as requisições de um endpoint com N clientes simultâneos e
+        retorna as métricas do cenário.
+    """
+    latencias = []
+    erros = {}
+    lock = Lock()
+
+    def cliente(quantidade: int):
+        http = app.test_client()
+        for _ in range(quantidade):
+            metodo, caminho, parametros, formulario = cenarios.requisicao(nome)
+            inicio = time.perf_counter()
+            resposta = getattr(http, metodo)(caminho, query_string=parametros, data=formulario)
+            duracao = time.perf_counter() - inicio
+            with lock:
+                latencias.append(duracao)
+                if resposta.status_code >= 400:
+                    erros[resposta.status_code] = erros.get(resposta.status_code, 0) + 1
+
+    divisao = [requisicoes // concorrencia + (1 if i < requisicoes % concorrencia else 0)
+               for i in range(concorrencia)]
+    sql_antes, http_antes = contador_sql.total, stub.chamadas
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concorrencia) as executor:
+        list(executor.map(cliente, divisao))
+    duracao = time.perf_counter() - inicio
+
+    latencias.sort()
+    return {
+        "endpoint": nome,
+        "concorrencia": concorrencia,
+        "requisicoes": len(latencias),
+        "erros": {str(status): quantidade for status, quantidade in sorted(erros.items())},
+        "segundos": round(duracao, 3),
+        "throughput_rps": round(len(latencias) / duracao, 1) if duracao else None,
+        "p50_ms": round(percentil(latencias, 50) * 1000, 2),
+        "p95_ms": round(percentil(latencias, 95) * 1000, 2),
+        "p99_ms": round(percentil(latencias, 99) * 1000, 2),
+        "sql_por_requisicao": round((contador_sql.total - sql_antes) / len(latencias), 2),
+        "http_por_requisicao": round((stub.chamadas - http_antes) / len(latencias), 2)}
+
+
+def executa(usuarios: int = 20, meses: int = 12, por_mes: int = 30, semente: int = 42,
+            concorrencias=(1, 4, 8), requisicoes: int = 200, latencia: float = 0.005,
+            endpoints=ENDPOINTS, limpa_caches: bool = False, diretorio: str = None,
+            nivel_log: str = "WARNING", replica: bool = False):
+    """ Cria um banco novo em um diretório temporário, popula com os dados gerados e
+        executa cada endpoint em cada nível de concorrência. Retorna o relatório.
+    """
+    diretorio = diretorio or tempfile.mkdtemp(prefix="benchmark-lancamentos-")
+    stub = CategoriaStub(latencia=latencia).inicia()
+
+    # o app cria database/ e log/ no diretório corrente e lê a URL do serviço ao ser importado
+    os.chdir(diretorio)
+    os.environ["CATEGORIA_URL"] = stub.url
+    # a cópia local das categorias é sincronizada uma vez, antes das medições
+    os.environ["CATEGORIA_SINCRONIZACAO"] = "0"
+    if replica:
+        os.environ["DATABASE_REPLICA_URL"] = "sqlite:///database/replica.sqlite3"
+    if RAIZ not in sys.path:
+        sys.path.insert(0, RAIZ)
+
+    inicio = time.perf_counter()
+    from app import app, respostas_cache
+    from model import Session, engine, engine_replica, sincroniza_replica
+    from schemas.lancamento import InvalidaCategoria
+    from categorias import sincroniza_categorias
+    importacao_app = time.perf_counter() - inicio
+    # o log de debug no console distorce as latências e mistura-se ao relatório
+    logging.getLogger().setLevel(nivel_log)
+
+    inicio = time.perf_counter()
+    session = Session()
+    total = popula(session, usuarios, meses, por_mes, semente)
+    sincroniza_categorias(session)
+    session.commit()
+    Session.remove()
+    if replica:
+        sincroniza_replica()
+    geracao = time.perf_counter() - inicio
+
+    contador_sql = ContadorSQL(engine, engine_replica)
+    # compartilhado entre as concorrências: ids removidos e descrições criadas não se repetem
+    cenarios = Cenarios(usuarios, meses, por_mes, semente)
+    resultados = []
+    for concorrencia in concorrencias:
+        for nome in endpoints:
+            if limpa_caches:
+                InvalidaCategoria()
+                respostas_cache.invalida()
+            resultados.append(executa_cenario(app, cenarios, nome, concorrencia, requisicoes,
+                                              contador_sql, stub))
+    stub.shutdown()
+
+    return {
+        "configuracao": {
+            "usuarios": usuarios, "meses": meses, "por_mes": por_mes, "semente": semente,
+            "requisicoes": requisicoes, "concorrencias": list(concorrencias),
+            "latencia_categoria_s": latencia, "limpa_caches": limpa_caches, "nivel_log": nivel_log,
+            "replica": replica},
+        "ambiente": {"python": platform.python_version(), "plataforma": platform.platform(),
+                     "banco": str(engine.url)},
+        "preparacao": {"lancamentos": total, "importacao_app_s": round(importacao_app, 3),
+                       "geracao_s": round(geracao, 3)},
+        "cenarios": resultados}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark dos endpoints de lançamentos.")
+    parser.add_argument("--usuarios", type=int, default=20)
+    parser.add_argument("--meses", type=int, default=12)
+    parser.add_argument("--por-mes", type=int, default=30, help="lançamentos por usuário e mês")
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--concorrencia", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--requisicoes", type=int, default=200, help="requisições por endpoint e concorrência")
+    parser.add_argument("--latencia", type=float, default=0.005, help="latência do stub de categorias, em segundos")
+    parser.add_argument("--endpoint", action="append", choices=ENDPOINTS, help="restringe os endpoints executados")
+    parser.add_argument("--limpa-caches", action="store_true", help="esvazia os caches antes de cada cenário")
+    parser.add_argument("--replica", action="store_true", help="consultas em uma réplica SQLite local")
+    parser.add_argument("--nivel-log", default="WARNING", help="nível do log do app durante as medições")
+    parser.add_argument("--saida", help="arquivo JSON do relatório; por padrão, a saída padrão")
+    argumentos = parser.parse_args()
+
+    # saídas do app durante as medições não se misturam ao relatório
+    with redirect_stdout(sys.stderr):
+        relatorio = executa(argumentos.usuarios, argumentos.meses, argumentos.por_mes, argumentos.semente,
+                            argumentos.concorrencia, argumentos.requisicoes, argumentos.latencia,
+                            argumentos.endpoint or ENDPOINTS, argumentos.limpa_caches,
+                            nivel_log=argumentos.nivel_log, replica=argumentos.replica)
+    texto = json.dumps(relatorio, indent=2, ensure_ascii=False)
+    if argumentos.saida:
+        with open(argumentos.saida, "w", encoding="utf-8") as arquivo:
+            arquivo.write(texto)
+    else:
+        print(texto)
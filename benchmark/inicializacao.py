@@ -0,0 +1,117 @@
+""" Mede o tempo de partida do app: partida fria (banco novo), partida quente
+    (banco existente) e o tempo até um worker atender a primeira requisição,
+    com preload_app (fork do master já carregado) e sem (cada worker importa o app).
+
+    Uso: python -m benchmark.inicializacao --repeticoes 5 --workers 4
+"""
+import subprocess
+import argparse
+import tempfile
+import json
+import time
+import sys
+import os
+
+from benchmark.driver import RAIZ, percentil
+
+
+PRIMEIRA_REQUISICAO = "/saldo?login=inicializacao&data_vencimento=2024-01-01"
+
+# lançamento do mês consultado, gravado após a partida fria para que a primeira requisição responda 200
+SCRIPT_DADOS = """
+from datetime import date
+from model import Session
+from model.lote import insere_lancamentos
+session = Session()
+insere_lancamentos(session, [{"descricao": "Inicialização", "valor": 10.0, "pago": False, "tipo": "Despesa",
+                              "categoria_id": 1, "data_vencimento": date(2024, 1, 10), "login": "inicializacao"}])
+session.commit()
+print("{}")
+"""
+
+# worker sem preload: importa e monta o app e atende a primeira requisição
+SCRIPT_PARTIDA = f"""
+import time, json
+inicio = time.perf_counter()
+from app import app
+montado = time.perf_counter()
+status = app.test_client().get({PRIMEIRA_REQUISICAO!r}).status_code
+fim = time.perf_counter()
+print(json.dumps({{"create_app_s": montado - inicio, "primeira_requisicao_s": fim - montado, "status": status}}))
+"""
+
+# worker com preload: o master monta o app uma vez e cada fork executa o post_fork
+# do gunicorn_config antes da primeira requisição
+SCRIPT_PRELOAD = f"""
+import time, json, os, sys
+from app import app
+import gunicorn_config
+tempos = []
+for _ in range(int(sys.argv[1])):
+    leitura, escrita = os.pipe()
+    inicio = time.perf_counter()
+    pid = os.fork()
+    if pid == 0:
+        os.close(leitura)
+        gunicorn_config.post_fork(None, None)
+        status = app.test_client().get({PRIMEIRA_REQUISICAO!r}).status_code
+        os.write(escrita, json.dumps([time.perf_counter() - inicio, status]).encode())
+        os._exit(0)
+    os.close(escrita)
+    with os.fdopen(leitura) as resultado:
+        tempos.append(json.loads(resultado.read()))
+    os.waitpid(pid, 0)
+print(json.dumps(tempos))
+"""
+
+
+def executa_script(script: str, diretorio: str, *argumentos):
+    """ Executa o script em um novo interpretador no diretório informado;
+        retorna o tempo total do processo e a última linha impressa (JSON).
+    """
+    ambiente = dict(os.environ, PYTHONPATH=RAIZ, LOG_LEVEL="WARNING")
+    inicio = time.perf_counter()
+    saida = subprocess.run([sys.executable, "-c", script, *argumentos], cwd=diretorio, env=ambiente,
+                           check=True, capture_output=True, text=True).stdout
+    return time.perf_counter() - inicio, json.loads(saida.strip().splitlines()[-1])
+
+
+def resumo(valores):
+    """ Mediana e máximo em milissegundos. """
+    valores = sorted(valores)
+    return {"p50_ms": round(percentil(valores, 50) * 1000, 1), "max_ms": round(valores[-1] * 1000, 1)}
+
+
+def executa(repeticoes: int = 5, workers: int = 4):
+    fria, quente, processo = [], [], []
+    for _ in range(repeticoes):
+        # cada partida fria cria o banco e o esquema em um diretório novo
+        diretorio = tempfile.mkdtemp(prefix="benchmark-inicializacao-")
+        _, tempos = executa_script(SCRIPT_PARTIDA, diretorio)
+        fria.append(tempos["create_app_s"])
+        executa_script(SCRIPT_DADOS, diretorio)
+        total, tempos = executa_script(SCRIPT_PARTIDA, diretorio)
+        assert tempos["status"] == 200, f"primeira requisição respondeu {tempos['status']}"
+        quente.append(tempos["create_app_s"])
+        processo.append(total)
+
+    _, forks = executa_script(SCRIPT_PRELOAD, diretorio, str(workers))
+    assert all(status == 200 for _, status in forks), f"primeira requisição respondeu {forks}"
+    preload = [tempo for tempo, _ in forks]
+    return {
+        "repeticoes": repeticoes,
+        "partida_fria": resumo(fria),
+        "partida_quente": resumo(quente),
+        # do início do processo do worker até a resposta da primeira requisição
+        "worker_sem_preload": resumo(processo),
+        # do fork até a resposta da primeira requisição
+        "worker_com_preload": resumo(preload),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tempo de partida do app e dos workers.")
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=4, help="Forks medidos com preload.")
+    argumentos = parser.parse_args()
+    print(json.dumps(executa(argumentos.repeticoes, argumentos.workers), indent=2))
@@ -0,0 +1,85 @@
+""" Compara o custo por linha da leitura com objetos do ORM (apresenta_lancamentos)
+    e com projeção de colunas (consulta_leitura + apresenta_linhas).
+
+    Uso: python -m benchmark.leitura --linhas 20000 --repeticoes 5
+"""
+import argparse
+import tempfile
+import tracemalloc
+import json
+import time
+import sys
+import os
+
+from benchmark.categoria_stub import CategoriaStub
+from benchmark.dados import popula
+from benchmark.driver import RAIZ
+
+
+def mede(funcao, repeticoes: int):
+    """ Retorna o menor tempo de CPU e o pico de memória alocada de uma execução. """
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.process_time()
+        funcao()
+        tempos.append(time.process_time() - inicio)
+    tracemalloc.start()
+    funcao()
+    pico = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return min(tempos), pico
+
+
+def executa(linhas: int = 20000, repeticoes: int = 5, semente: int = 42):
+    os.chdir(tempfile.mkdtemp(prefix="benchmark-leitura-"))
+    stub = CategoriaStub().inicia()
+    os.environ["CATEGORIA_URL"] = stub.url
+    if RAIZ not in sys.path:
+        sys.path.insert(0, RAIZ)
+
+    from model import Session, inicializa_banco
+    from model.lancamento import Lancamento
+    from model.leitura import consulta_leitura
+    from schemas.lancamento import apresenta_lancamentos, apresenta_linhas
+    from categorias import sincroniza_categorias
+
+    # um usuário com todas as linhas em um único mês, como em /mensal
+    inicializa_banco()
+    popula(Session(), 1, 1, linhas, semente)
+    # nomes das categorias pela cópia local, como nas consultas do app
+    sincroniza_categorias(Session())
+    Session.commit()
+    Session.remove()
+
+    def orm():
+        session = Session()
+        apresenta_lancamentos(session.query(Lancamento).filter(Lancamento.login == "user0000").all())
+        Session.remove()
+
+    def projecao():
+        session = Session()
+        apresenta_linhas(consulta_leitura(session).filter(Lancamento.login == "user0000").all())
+        Session.remove()
+
+    # aquece o cache de categorias e as conexões
+    orm()
+    projecao()
+
+    resultado = {"linhas": linhas, "repeticoes": repeticoes}
+    for nome, funcao in (("orm", orm), ("projecao", projecao)):
+        cpu, pico = mede(funcao, repeticoes)
+        resultado[nome] = {"cpu_ms": round(cpu * 1000, 1),
+                           "cpu_us_por_linha": round(cpu / linhas * 1e6, 2),
+                           "pico_memoria_kb": pico // 1024,
+                           "bytes_por_linha": pico // linhas}
+    stub.shutdown()
+    return resultado
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Custo por linha dos caminhos de leitura.")
+    parser.add_argument("--linhas", type=int, default=20000)
+    parser.add_argument("--repeticoes", type=int, default=5)
+    argumentos = parser.parse_args()
+    resultado = executa(argumentos.linhas, argumentos.repeticoes)
+    print(json.dumps(resultado, indent=2))
@@ -0,0 +1,88 @@
+from collections import OrderedDict
+from threading import Lock
+import time
+
+
+# marcador usado para diferenciar "não encontrado" de um valor None guardado
+AUSENTE = object()
+
+
+class CacheTTL:
+    """ Cache em memória, limitado em tamanho (LRU) e com expiração por tempo (TTL).
+
+        Seguro para uso entre threads. Cada entrada pode ter um TTL próprio, o
+        que permite guardar respostas negativas por um período mais curto.
+    """
+
+    def __init__(self, tamanho_maximo: int = 1024, ttl: float = 300, relogio=time.monotonic):
+        """
+        Cria um cache
+
+        Arguments:
+            tamanho_maximo: quantidade máxima de entradas antes de descartar as menos usadas
+            ttl: tempo padrão, em segundos, que uma entrada permanece válida
+            relogio: função que retorna o instante atual em segundos
+        """
+        self.tamanho_maximo = tamanho_maximo
+        self.ttl = ttl
+        self._relogio = relogio
+        self._entradas = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, chave, padrao=None):
+        """ Retorna o valor guardado para a chave ou o padrão informado,
+            caso a chave não exista ou esteja expirada.
+        """
+        valor = self.busca(chave)
+        return padrao if valor is AUSENTE else valor
+
+    def busca(self, chave):
+        """ Retorna o valor guardado para a chave ou o marcador AUSENTE. """
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is not None:
+                expira_em, valor = entrada
+                if expira_em > self._relogio():
+                    self._entradas.move_to_end(chave)
+                    self.hits += 1
+                    return valor
+                # entrada expirada é descartada
+                del self._entradas[chave]
+            self.misses += 1
+            return AUSENTE
+
+    def set(self, chave, valor, ttl: float = None):
+        """ Guarda o valor para a chave, descartando as entradas menos usadas
+            se o tamanho máximo for ultrapassado.
+        """
+        expira_em = self._relogio() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._entradas[chave] = (expira_em, valor)
+            self._entradas.move_to_end(chave)
+            while len(self._entradas) > self.tamanho_maximo:
+                self._entradas.popitem(last=False)
+                self.evictions += 1
+
+    def invalida(self, chave=None):
+        """ Remove uma chave do cache ou, se nenhuma for informada, todo o conteúdo. """
+        with self._lock:
+            if chave is None:
+                self._entradas.clear()
+            else:
+                self._entradas.pop(chave, None)
+
+    def estatisticas(self):
+        """ Retorna os contadores de uso do cache. """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "tamanho": len(self._entradas)}
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entradas)
@@ -0,0 +1,109 @@
+from threading import Thread, Event, Lock
+import json
+import os
+
+from model import Session
+from model.categoria import grava_categorias, remove_categoria
+from cliente_categoria import cliente_categoria, ServicoIndisponivel
+from schemas.lancamento import InvalidaCategoria
+from logger import logger
+
+
+# rota do serviço de categorias que lista o cadastro inteiro
+CATEGORIA_LISTAGEM = os.environ.get("CATEGORIA_LISTAGEM", "/categorias")
+# segundos entre as sincronizações completas feitas em segundo plano (0 desliga)
+CATEGORIA_SINCRONIZACAO = float(os.environ.get("CATEGORIA_SINCRONIZACAO", 300))
+
+
+def _categoria(dados: dict):
+    return {"id": dados["id"], "nome": dados["nome"], "tipo": dados["tipo"]}
+
+
+def sincroniza_categorias(session):
+    """ Copia o cadastro inteiro do serviço de categorias para a tabela local,
+        removendo as categorias que deixaram de existir.
+
+        Retorna a quantidade de categorias gravadas e removidas.
+        Levanta ServicoIndisponivel se o serviço não responder.
+    """
+    resposta = cliente_categoria.get(CATEGORIA_LISTAGEM)
+    if resposta.status_code != 200:
+        raise ServicoIndisponivel(f"status {resposta.status_code} em {CATEGORIA_LISTAGEM}")
+
+    categorias = [_categoria(item) for item in json.loads(resposta.content).get("categorias", [])]
+    # uma listagem vazia não apaga a cópia local: mais provável ser uma falha do serviço
+    gravadas, removidas = grava_categorias(session, categorias, completa=bool(categorias))
+    # o cache guarda só as categorias buscadas ao vivo; a cópia local agora responde por elas
+    InvalidaCategoria()
+    return gravadas, removidas
+
+
+def atualiza_categoria(session, categoria_id: int):
+    """ Busca uma categoria no serviço e a grava na tabela local, ou a remove se ela
+        não existir mais. Retorna a quantidade de categorias gravadas e removidas.
+    """
+    InvalidaCategoria(categoria_id)
+    resposta = cliente_categoria.get("/categoriaID", params={"id": categoria_id})
+    if resposta.status_code == 404:
+        return 0, remove_categoria(session, categoria_id)
+    if resposta.status_code != 200:
+        raise ServicoIndisponivel(f"status {resposta.status_code} em /categoriaID")
+    return grava_categorias(session, [_categoria(json.loads(resposta.content))])
+
+
+class SincronizadorCategorias:
+    """ Thread que repete a sincronização completa das categorias a cada intervalo.
+
+        Iniciada na primeira requisição de cada worker: com preload_app, o master
+        do gunicorn não fica com uma thread que os workers não herdariam.
+    """
+
+    def __init__(self, intervalo: float):
+        """
+        Cria o sincronizador
+
+        Arguments:
+            intervalo: segundos entre as sincronizações; 0 desliga
+        """
+        self.intervalo = intervalo
+        self._lock = Lock()
+        self._thread = None
+        self._pid = None
+        self._parar = Event()
+
+    def inicia(self):
+        """ Inicia a thread neste processo, se ainda não estiver rodando. """
+        if not self.intervalo or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._parar = Event()
+            self._thread = Thread(target=self._executa, name="sincroniza-categorias", daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def para(self):
+        self._parar.set()
+
+    def _executa(self):
+        while True:
+            session = Session()
+            try:
+                gravadas, removidas = sincroniza_categorias(session)
+                session.commit()
+                logger.debug("Categorias sincronizadas: %d gravadas, %d removidas", gravadas, removidas)
+            except ServicoIndisponivel as e:
+                session.rollback()
+                logger.warning(f"Erro ao sincronizar categorias, {e}")
+            except Exception:
+                session.rollback()
+                logger.exception("Erro ao sincronizar categorias")
+            finally:
+                Session.remove()
+            if self._parar.wait(self.intervalo):
+                break
+
+
+# um sincronizador por processo, configurado pelo ambiente
+sincronizador = SincronizadorCategorias(CATEGORIA_SINCRONIZACAO)
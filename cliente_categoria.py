@@ -0,0 +1,158 @@
+from threading import Lock
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import requests
+import time
+import os
+
+from logger import logger
+
+
+class ServicoIndisponivel(Exception):
+    """ Indica que o serviço de categorias não respondeu ou está com o circuito aberto. """
+
+
+class CircuitBreaker:
+    """ Interrompe as chamadas a um serviço após falhas consecutivas.
+
+        Fechado: as chamadas passam normalmente.
+        Aberto: as chamadas falham imediatamente até o tempo de espera acabar.
+        Semiaberto: uma chamada de teste é liberada; se der certo o circuito
+        fecha, senão volta a abrir.
+    """
+    FECHADO = "fechado"
+    ABERTO = "aberto"
+    SEMIABERTO = "semiaberto"
+
+    def __init__(self, limite_falhas: int = 5, tempo_espera: float = 30, relogio=time.monotonic):
+        """
+        Cria um circuit breaker
+
+        Arguments:
+            limite_falhas: falhas consecutivas que abrem o circuito
+            tempo_espera: segundos que o circuito fica aberto antes de liberar uma chamada de teste
+            relogio: função que retorna o instante atual em segundos
+        """
+        self.limite_falhas = limite_falhas
+        self.tempo_espera = tempo_espera
+        self._relogio = relogio
+        self._lock = Lock()
+        self._estado = self.FECHADO
+        self._falhas = 0
+        self._aberto_em = 0.0
+        self._teste_em_andamento = False
+
+    @property
+    def estado(self):
+        """ Estado atual do circuito: fechado, aberto ou semiaberto. """
+        with self._lock:
+            if self._estado == self.ABERTO and self._relogio() - self._aberto_em >= self.tempo_espera:
+                self._estado = self.SEMIABERTO
+            return self._estado
+
+    def permite(self):
+        """ Indica se uma chamada pode ser feita agora. """
+        estado = self.estado
+        with self._lock:
+            if estado == self.FECHADO:
+                return True
+            if estado == self.SEMIABERTO and not self._teste_em_andamento:
+                # apenas uma chamada de teste por vez
+                self._teste_em_andamento = True
+                return True
+            return False
+
+    def registra_sucesso(self):
+        with self._lock:
+            self._estado = self.FECHADO
+            self._falhas = 0
+            self._teste_em_andamento = False
+
+    def registra_falha(self):
+        with self._lock:
+            self._falhas += 1
+            self._teste_em_andamento = False
+            if self._estado == self.SEMIABERTO or self._falhas >= self.limite_falhas:
+                if self._estado != self.ABERTO:
+                    logger.warning(f"Circuito do serviço de categorias aberto após {self._falhas} falhas")
+                self._estado = self.ABERTO
+                self._aberto_em = self._relogio()
+
+
+class ClienteCategoria:
+    """ Cliente HTTP compartilhado para o serviço de categorias.
+
+        Mantém um pool de conexões reaproveitadas (keep-alive), aplica timeouts
+        de conexão e leitura, repete falhas transitórias com backoff e protege
+        o worker com um circuit breaker.
+    """
+
+    def __init__(self, url_base: str, tamanho_pool: int = 8, timeout_conexao: float = 1.0,
+                 timeout_leitura: float = 2.0, tentativas: int = 2, backoff: float = 0.1,
+                 circuit_breaker: CircuitBreaker = None):
+        """
+        Cria um cliente
+
+        Arguments:
+            url_base: endereço do serviço de categorias, ex.: http://localhost:5000
+            tamanho_pool: conexões mantidas abertas por worker
+            timeout_conexao: segundos para estabelecer a conexão
+            timeout_leitura: segundos aguardando a resposta
+            tentativas: novas tentativas em falhas transitórias
+            backoff: fator de espera entre as tentativas
+            circuit_breaker: circuit breaker usado; um novo é criado se não for informado
+        """
+        self.url_base = url_base.rstrip("/")
+        self.timeout = (timeout_conexao, timeout_leitura)
+        self.circuit_breaker = circuit_breaker or CircuitBreaker()
+
+        self.tamanho_pool = tamanho_pool
+        self.retry = Retry(total=tentativas, connect=tentativas, read=tentativas, status=tentativas,
+                           backoff_factor=backoff, status_forcelist=(502, 503, 504),
+                           allowed_methods=frozenset(["GET"]), raise_on_status=False)
+        self.recria_sessao()
+
+    def recria_sessao(self):
+        """ Cria a sessão HTTP e o seu pool de conexões. Chamada também após o fork
+            (gunicorn_config.post_fork): conexões do processo pai não são reaproveitadas.
+        """
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.tamanho_pool,
+                              max_retries=self.retry, pool_block=False)
+        sessao = requests.Session()
+        sessao.mount("http://", adapter)
+        sessao.mount("https://", adapter)
+        self.sessao = sessao
+
+    def get(self, caminho: str, params: dict = None):
+        """ Faz um GET no serviço de categorias.
+            Levanta ServicoIndisponivel se o serviço falhar ou o circuito estiver aberto.
+        """
+        if not self.circuit_breaker.permite():
+            raise ServicoIndisponivel("circuito aberto")
+
+        try:
+            resposta = self.sessao.get(f"{self.url_base}{caminho}", params=params, timeout=self.timeout)
+        except requests.exceptions.RequestException as e:
+            self.circuit_breaker.registra_falha()
+            logger.warning(f"Falha ao chamar o serviço de categorias em '{caminho}': {e}")
+            raise ServicoIndisponivel(str(e)) from e
+
+        if resposta.status_code >= 500:
+            self.circuit_breaker.registra_falha()
+            raise ServicoIndisponivel(f"status {resposta.status_code}")
+
+        self.circuit_breaker.registra_sucesso()
+        return resposta
+
+
+# cliente único por processo, configurado pelo ambiente
+cliente_categoria = ClienteCategoria(
+    url_base=os.environ.get("CATEGORIA_URL", "http://192.168.15.5:5000"),
+    tamanho_pool=int(os.environ.get("CATEGORIA_POOL", os.environ.get("CATEGORIA_WORKERS", 8))),
+    timeout_conexao=float(os.environ.get("CATEGORIA_TIMEOUT_CONEXAO", 1.0)),
+    timeout_leitura=float(os.environ.get("CATEGORIA_TIMEOUT_LEITURA", 2.0)),
+    tentativas=int(os.environ.get("CATEGORIA_TENTATIVAS", 2)),
+    backoff=float(os.environ.get("CATEGORIA_BACKOFF", 0.1)),
+    circuit_breaker=CircuitBreaker(
+        limite_falhas=int(os.environ.get("CATEGORIA_CIRCUITO_FALHAS", 5)),
+        tempo_espera=float(os.environ.get("CATEGORIA_CIRCUITO_ESPERA", 30))))
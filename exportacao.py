@@ -0,0 +1,68 @@
+from sqlalchemy import select, distinct
+from io import StringIO
+import json
+import csv
+
+from model.categoria import Categoria, junta_categoria
+from model.arquivo import uniao
+from model.leitura import leitura_completa, ordem_leitura
+from schemas.lancamento import NomesCategorias, FormatoData, formatador_linhas
+
+
+# colunas exportadas, na ordem do arquivo (as mesmas de colunas_leitura)
+COLUNAS_EXPORTACAO = ("id", "descricao", "valor", "pago", "tipo", "data_vencimento",
+                      "categoria_id", "categoria_nome", "login")
+
+FORMATOS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+
+def categorias_usuario(session, login: str):
+    """ Resolve, antes da exportação, o nome das categorias do usuário que ainda
+        não estão na cópia local; as demais vêm do join na própria leitura.
+    """
+    ids = {linha[0] for linha in session.execute(uniao(lambda modelo: junta_categoria(
+        select(distinct(modelo.categoria_id)), modelo).where(modelo.login == login, Categoria.id.is_(None))))}
+    return NomesCategorias(ids, local=False)
+
+
+def linhas_exportacao(session, login: str, tamanho_bloco: int = 1000):
+    """ Lê os lançamentos do usuário, incluindo os arquivados, em ordem de vencimento com
+        um cursor no servidor, entregando blocos de tuplas: a memória não cresce com o histórico.
+    """
+    consulta = ordem_leitura(leitura_completa(lambda modelo: (modelo.login == login,))) \
+        .execution_options(stream_results=True, yield_per=tamanho_bloco)
+    return session.execute(consulta).partitions(tamanho_bloco)
+
+
+def gera_csv(blocos, categorias: dict):
+    """ Gera o CSV aos poucos: o cabeçalho e depois um pedaço de texto por bloco. """
+    formata_data = FormatoData()
+    buffer = StringIO()
+    escritor = csv.writer(buffer)
+    escritor.writerow(COLUNAS_EXPORTACAO)
+    for bloco in blocos:
+        escritor.writerows(
+            (id, descricao, valor, "true" if pago else "false", tipo, formata_data(vencimento),
+             categoria_id, nome if nome is not None else categorias.get(categoria_id), login)
+            for id, descricao, valor, pago, tipo, vencimento, categoria_id, nome, login in bloco)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def gera_ndjson(blocos, categorias: dict):
+    """ Gera um objeto JSON por linha (JSON Lines), com os campos de LancamentoViewSchema. """
+    formata = formatador_linhas(categorias)
+    codifica = json.JSONEncoder(ensure_ascii=False).encode
+    for bloco in blocos:
+        yield "".join(codifica(formata(linha)) + "\n" for linha in bloco)
+
+
+def exporta(session, login: str, formato: str, tamanho_bloco: int = 1000):
+    """ Retorna o gerador do arquivo de exportação do usuário no formato informado. """
+    categorias = categorias_usuario(session, login)
+    blocos = linhas_exportacao(session, login, tamanho_bloco)
+    gerador = gera_csv if formato == "csv" else gera_ndjson
+    return gerador(blocos, categorias)
@@ -1,2 +1,21 @@
+import os
+
 bind = "0.0.0.0:8080"
-workers = 2
\ No newline at end of file
+workers = int(os.environ.get("GUNICORN_WORKERS", 2))
+
+# o master importa o app uma vez (banco e esquema preparados só nele) e os
+# workers nascem do fork já com tudo carregado; GUNICORN_PRELOAD=0 desliga
+preload_app = os.environ.get("GUNICORN_PRELOAD", "1") == "1"
+
+
+def post_fork(server, worker):
+    """ Recria no worker o que não pode ser compartilhado com o master:
+        conexões do banco, a thread do log e o pool HTTP do serviço de categorias.
+    """
+    from model import recria_conexoes
+    from logger import inicia_log
+    from cliente_categoria import cliente_categoria
+
+    recria_conexoes()
+    inicia_log()
+    cliente_categoria.recria_sessao()
@@ -0,0 +1,285 @@
+from datetime import datetime, date
+from hashlib import sha256
+from itertools import islice
+import unicodedata
+import json
+import time
+import csv
+import re
+import os
+
+from model.importacao import Importacao
+from model.lote import insere_lancamentos
+from schemas.lancamento import ResolveCategorias, SERVICO_INDISPONIVEL
+from cliente_categoria import ServicoIndisponivel
+from logger import logger
+
+
+# quantidade máxima de linhas rejeitadas detalhadas no relatório
+MAXIMO_ERROS_RELATORIO = 100
+
+
+class LinhaInvalida(ValueError):
+    """ Indica uma linha do extrato que não pôde ser convertida em lançamento. """
+
+
+def _sem_acentos(texto: str):
+    texto = unicodedata.normalize("NFKD", texto)
+    return "".join(c for c in texto if not unicodedata.combining(c))
+
+
+def _normaliza(texto: str):
+    """ Remove acentos, espaços e maiúsculas, para comparar nomes de colunas e descrições. """
+    return _sem_acentos(texto).strip().lower()
+
+
+def converte_valor(texto: str):
+    """ Converte valores como "-1.234,56", "1234.56" ou "R$ 10,00" em float. """
+    texto = texto.strip().replace("R$", "").replace(" ", "")
+    if "," in texto:
+        texto = texto.replace(".", "").replace(",", ".")
+    try:
+        return float(texto)
+    except ValueError:
+        raise LinhaInvalida(f"valor inválido: '{texto}'")
+
+
+def converte_data(texto: str):
+    """ Converte datas dd/mm/aaaa, aaaa-mm-dd ou aaaammdd (OFX) em date. """
+    texto = texto.strip()
+    try:
+        if "/" in texto:
+            return datetime.strptime(texto, "%d/%m/%Y").date()
+        if "-" in texto:
+            return date.fromisoformat(texto[:10])
+        return datetime.strptime(texto[:8], "%Y%m%d").date()
+    except ValueError:
+        raise LinhaInvalida(f"data inválida: '{texto}'")
+
+
+# nomes aceitos para as colunas do CSV, já normalizados
+COLUNAS_CSV = {
+    "data": ("data", "data_vencimento", "vencimento", "data lancamento", "date"),
+    "descricao": ("descricao", "historico", "lancamento", "memo", "description"),
+    "valor": ("valor", "valor (r$)", "amount"),
+}
+
+
+def le_csv(arquivo):
+    """ Lê um extrato CSV linha a linha.
+        Gera tuplas (numero_linha, registro), onde registro é um dicionário com
+        data, descricao e valor, ou uma exceção LinhaInvalida.
+    """
+    cabecalho = arquivo.readline()
+    delimitador = ";" if cabecalho.count(";") >= cabecalho.count(",") else ","
+    nomes = [_normaliza(nome) for nome in next(csv.reader([cabecalho], delimiter=delimitador))]
+
+    posicoes = {}
+    for campo, aceitos in COLUNAS_CSV.items():
+        for posicao, nome in enumerate(nomes):
+            if nome in aceitos:
+                posicoes[campo] = posicao
+                break
+        else:
+            raise LinhaInvalida(f"coluna '{campo}' não encontrada no cabeçalho")
+
+    for numero, colunas in enumerate(csv.reader(arquivo, delimiter=delimitador), start=2):
+        if not any(coluna.strip() for coluna in colunas):
+            continue
+        try:
+            yield numero, {
+                "data": converte_data(colunas[posicoes["data"]]),
+                "descricao": colunas[posicoes["descricao"]].strip(),
+                "valor": converte_valor(colunas[posicoes["valor"]])}
+        except IndexError:
+            yield numero, LinhaInvalida("quantidade de colunas inválida")
+        except LinhaInvalida as e:
+            yield numero, e
+
+
+def le_ofx(arquivo, tamanho_leitura: int = 65536):
+    """ Lê as transações (STMTTRN) de um extrato OFX, SGML ou XML, em blocos.
+        Gera tuplas (numero_transacao, registro) como em le_csv.
+    """
+    numero = 0
+    transacao = None
+    resto = ""
+    while True:
+        bloco = arquivo.read(tamanho_leitura)
+        if not bloco:
+            break
+        partes = (resto + bloco).split("<")
+        resto = partes.pop()
+        for parte in partes:
+            tag, _, valor = parte.partition(">")
+            tag = tag.strip().upper()
+            if tag == "STMTTRN":
+                transacao = {}
+            elif tag == "/STMTTRN" and transacao is not None:
+                numero += 1
+                try:
+                    yield numero, {
+                        "data": converte_data(transacao.get("DTPOSTED", "")),
+                        "descricao": (transacao.get("MEMO") or transacao.get("NAME") or "").strip(),
+                        "valor": converte_valor(transacao.get("TRNAMT", ""))}
+                except LinhaInvalida as e:
+                    yield numero, e
+                transacao = None
+            elif transacao is not None and tag and not tag.startswith("/"):
+                transacao[tag] = valor.strip()
+
+
+class RegrasCategoria:
+    """ Associa descrições do extrato a categorias por expressões regulares.
+        A primeira regra que encontrar a descrição define a categoria.
+    """
+
+    def __init__(self, regras=None, categoria_despesa: int = None, categoria_receita: int = None):
+        """
+        Cria as regras
+
+        Arguments:
+            regras: lista de {"padrao": expressão regular, "categoria_id": id}
+            categoria_despesa: categoria usada para despesas sem regra
+            categoria_receita: categoria usada para receitas sem regra
+        """
+        self.regras = [(re.compile(_sem_acentos(regra["padrao"]), re.IGNORECASE), int(regra["categoria_id"]))
+                       for regra in (regras or [])]
+        self.padrao = {"Despesa": categoria_despesa, "Receita": categoria_receita}
+
+    @classmethod
+    def de_arquivo(cls, caminho: str = None, **padroes):
+        """ Carrega as regras de um arquivo JSON; por padrão, de IMPORTACAO_REGRAS. """
+        caminho = caminho or os.environ.get("IMPORTACAO_REGRAS")
+        regras = []
+        if caminho:
+            with open(caminho, encoding="utf-8") as arquivo:
+                regras = json.load(arquivo)
+        return cls(regras, **padroes)
+
+    def categoria(self, descricao: str, tipo: str):
+        descricao = _normaliza(descricao)
+        for padrao, categoria_id in self.regras:
+            if padrao.search(descricao):
+                return categoria_id
+        return self.padrao.get(tipo)
+
+
+def identificador_importacao(arquivo_binario, login: str):
+    """ Calcula o identificador da importação a partir do conteúdo do arquivo,
+        lido em blocos, e volta o arquivo para o início.
+    """
+    resumo = sha256(login.encode())
+    for bloco in iter(lambda: arquivo_binario.read(65536), b""):
+        resumo.update(bloco)
+    arquivo_binario.seek(0)
+    return resumo.hexdigest()
+
+
+def importa(session, registros, login: str, regras: RegrasCategoria, importacao_id: str,
+            arquivo: str = None, tamanho_bloco: int = 1000):
+    """ Importa os registros lidos do extrato em blocos de tamanho fixo,
+        cada bloco em uma transação. Se a importação já tiver sido iniciada,
+        continua a partir da última linha gravada: os lançamentos de um bloco e o
+        progresso da importação são confirmados no mesmo commit.
+
+        Arguments:
+            registros: iterador de (numero_linha, registro) gerado por le_csv ou le_ofx
+            login: usuário dono dos lançamentos
+            regras: regras de associação de categorias
+            importacao_id: identificador da importação, ver identificador_importacao
+            arquivo: nome do arquivo, apenas para registro
+            tamanho_bloco: linhas gravadas por transação
+
+        Retorna o relatório da importação.
+    """
+    inicio = time.monotonic()
+    importacao = session.get(Importacao, importacao_id)
+    if importacao is None:
+        importacao = Importacao(importacao_id, login, arquivo)
+        session.add(importacao)
+        session.commit()
+    retomada_em = importacao.linhas_processadas
+
+    erros = []
+    processadas_agora = 0
+    if not importacao.concluida:
+        # linhas gravadas em execuções anteriores são puladas
+        registros = islice(registros, importacao.linhas_processadas, None)
+        while True:
+            bloco = list(islice(registros, tamanho_bloco))
+            if not bloco:
+                break
+
+            itens, rejeitados = _converte_bloco(bloco, login, regras)
+            ids = insere_lancamentos(session, itens) if itens else []
+
+            criados = sum(1 for id in ids if id is not None)
+            importacao.linhas_processadas += len(bloco)
+            importacao.criados += criados
+            importacao.duplicados += len(ids) - criados
+            importacao.rejeitados += len(rejeitados)
+            session.commit()
+
+            processadas_agora += len(bloco)
+            erros.extend(rejeitados[:MAXIMO_ERROS_RELATORIO - len(erros)])
+            logger.debug("Importação %s: %s linhas processadas", importacao_id[:8], importacao.linhas_processadas)
+
+        importacao.concluida = True
+        session.commit()
+
+    duracao = time.monotonic() - inicio
+    return {
+        "importacao_id": importacao.id,
+        "linhas": importacao.linhas_processadas,
+        "criados": importacao.criados,
+        "duplicados": importacao.duplicados,
+        "rejeitados": importacao.rejeitados,
+        "retomada_em": retomada_em,
+        "segundos": round(duracao, 3),
+        "linhas_por_segundo": round(processadas_agora / duracao, 1) if duracao else 0,
+        "erros": erros}
+
+
+def _converte_bloco(bloco, login: str, regras: RegrasCategoria):
+    """ Converte um bloco de registros em itens de Lancamento.
+        Retorna os itens válidos e a lista de linhas rejeitadas.
+    """
+    itens = []
+    rejeitados = []
+    for numero, registro in bloco:
+        if isinstance(registro, Exception):
+            rejeitados.append({"linha": numero, "motivo": str(registro)})
+            continue
+        tipo = "Despesa" if registro["valor"] < 0 else "Receita"
+        categoria_id = regras.categoria(registro["descricao"], tipo)
+        if categoria_id is None:
+            rejeitados.append({"linha": numero, "motivo": "nenhuma categoria para a descrição"})
+            continue
+        if not registro["descricao"]:
+            rejeitados.append({"linha": numero, "motivo": "descrição vazia"})
+            continue
+        itens.append((numero, {
+            "descricao": registro["descricao"][:140],
+            "valor": abs(registro["valor"]),
+            "pago": True,
+            "tipo": tipo,
+            "categoria_id": categoria_id,
+            "data_vencimento": registro["data"],
+            "login": login}))
+
+    # tipo verificado uma vez por categoria distinta do bloco
+    categorias = ResolveCategorias(item["categoria_id"] for _, item in itens)
+    if SERVICO_INDISPONIVEL in categorias.values():
+        # interrompe sem marcar o bloco como processado, para retomar depois
+        raise ServicoIndisponivel("não foi possível verificar as categorias do bloco")
+    validos = []
+    for numero, item in itens:
+        categoria = categorias[item["categoria_id"]]
+        tipo_categoria = categoria if isinstance(categoria, str) else categoria["tipo"]
+        if tipo_categoria != item["tipo"]:
+            rejeitados.append({"linha": numero, "motivo": f"tipo da categoria {item['categoria_id']} "
+                                                          f"diferente de {item['tipo']}: {tipo_categoria}"})
+        else:
+            validos.append(item)
+    return validos, rejeitados
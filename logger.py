@@ -1,71 +1,122 @@
-from logging.config import dictConfig
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from itertools import count
+from threading import Lock
 import logging
+import atexit
+import queue
+import sys
 import os
 
 
 log_path = "log/"
-# Verifica se o diretorio para armexanar os logs não existe
-if not os.path.exists(log_path):
-   # então cria o diretorio
-   os.makedirs(log_path)
-
-
-dictConfig({
-    "version": 1,
-    "disable_existing_loggers": True,
-    "formatters": {
-        "default": {
-            "format": "[%(asctime)s] %(levelname)-4s %(funcName)s() L%(lineno)-4d %(message)s",
-        },
-        "detailed": {
-            "format": "[%(asctime)s] %(levelname)-4s %(funcName)s() L%(lineno)-4d %(message)s - call_trace=%(pathname)s L%(lineno)-4d",
-        }
-    },
-    "handlers": {
-        "console": {
-            "class": "logging.StreamHandler",
-            "formatter": "default",
-            "stream": "ext://sys.stdout",
-        },
-        # "email": {
-        #     "class": "logging.handlers.SMTPHandler",
-        #     "formatter": "default",
-        #     "level": "ERROR",
-        #     "mailhost": ("smtp.example.com", 587),
-        #     "fromaddr": "devops@example.com",
-        #     "toaddrs": ["receiver@example.com", "receiver2@example.com"],
-        #     "subject": "Error Logs",
-        #     "credentials": ("username", "password"),
-        # },
-        "error_file": {
-            "class": "logging.handlers.RotatingFileHandler",
-            "formatter": "detailed",
-            "filename": "log/gunicorn.error.log",
-            "maxBytes": 10000,
-            "backupCount": 10,
-            "delay": "True",
-        },
-        "detailed_file": {
-            "class": "logging.handlers.RotatingFileHandler",
-            "formatter": "detailed",
-            "filename": "log/gunicorn.detailed.log",
-            "maxBytes": 10000,
-            "backupCount": 10,
-            "delay": "True",
-        }
-    },
-    "loggers": {
-        "gunicorn.error": {
-            "handlers": ["console", "error_file"],  #, email],
-            "level": "DEBUG",
-            "propagate": False,
-        }
-    },
-    "root": {
-        "handlers": ["console", "detailed_file"],
-        "level": "DEBUG",
-    }
-})
+
+# níveis e rotação configurados pelo ambiente
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_ARQUIVO_NIVEL = os.environ.get("LOG_ARQUIVO_NIVEL", LOG_LEVEL).upper()
+LOG_ARQUIVO_MAX_BYTES = int(os.environ.get("LOG_ARQUIVO_MAX_BYTES", 10 * 1024 * 1024))
+LOG_ARQUIVO_BACKUPS = int(os.environ.get("LOG_ARQUIVO_BACKUPS", 10))
+# das mensagens marcadas com extra=AMOSTRA, apenas 1 a cada N é registrada
+LOG_AMOSTRAGEM = int(os.environ.get("LOG_AMOSTRAGEM", 100))
+
+# marca as mensagens de debug de alto volume, ex.: logger.debug("...", x, extra=AMOSTRA)
+AMOSTRA = {"amostra": True}
+
+FORMATO_PADRAO = "[%(asctime)s] %(levelname)-4s %(funcName)s() L%(lineno)-4d %(message)s"
+FORMATO_DETALHADO = FORMATO_PADRAO + " - call_trace=%(pathname)s L%(lineno)-4d"
+
+
+class FiltroAmostragem(logging.Filter):
+    """ Deixa passar 1 a cada N mensagens marcadas com extra=AMOSTRA, contadas
+        por mensagem; as demais mensagens passam sempre.
+    """
+
+    def __init__(self, taxa: int):
+        super().__init__()
+        self.taxa = max(1, taxa)
+        self._contadores = {}
+        self._lock = Lock()
+
+    def filter(self, record):
+        if not getattr(record, "amostra", False) or self.taxa == 1:
+            return True
+        with self._lock:
+            contador = self._contadores.get(record.msg)
+            if contador is None:
+                contador = self._contadores[record.msg] = count()
+        return next(contador) % self.taxa == 0
+
+
+def _cria_saidas():
+    """ Handlers que escrevem de fato, executados pela thread do QueueListener. """
+    # Verifica se o diretorio para armexanar os logs não existe
+    if not os.path.exists(log_path):
+        # então cria o diretorio
+        os.makedirs(log_path)
+    console = logging.StreamHandler(sys.stdout)
+    console.setFormatter(logging.Formatter(FORMATO_PADRAO))
+
+    arquivo_detalhado = RotatingFileHandler(
+        os.path.join(log_path, "gunicorn.detailed.log"), maxBytes=LOG_ARQUIVO_MAX_BYTES,
+        backupCount=LOG_ARQUIVO_BACKUPS, delay=True)
+    arquivo_detalhado.setFormatter(logging.Formatter(FORMATO_DETALHADO))
+    arquivo_detalhado.setLevel(LOG_ARQUIVO_NIVEL)
+
+    arquivo_erros = RotatingFileHandler(
+        os.path.join(log_path, "gunicorn.error.log"), maxBytes=LOG_ARQUIVO_MAX_BYTES,
+        backupCount=LOG_ARQUIVO_BACKUPS, delay=True)
+    arquivo_erros.setFormatter(logging.Formatter(FORMATO_DETALHADO))
+    arquivo_erros.setLevel(LOG_ARQUIVO_NIVEL)
+    # arquivo_erros só recebe o log do gunicorn
+    arquivo_erros.addFilter(lambda record: record.name.startswith("gunicorn.error"))
+    arquivo_detalhado.addFilter(lambda record: not record.name.startswith("gunicorn.error"))
+    return console, arquivo_detalhado, arquivo_erros
+
+
+class FilaHandler(QueueHandler):
+    """ Coloca o registro na fila sem formatá-lo: a mensagem e os argumentos
+        são combinados apenas na thread do listener.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+# as requisições apenas colocam o registro na fila; formatação e escrita em
+# console e arquivos (incluindo a rotação) acontecem na thread do listener
+fila_handler = FilaHandler(queue.SimpleQueue())
+fila_handler.addFilter(FiltroAmostragem(LOG_AMOSTRAGEM))
+listener = None
+_listener_pid = None
+
+
+def inicia_log():
+    """ Configura o log e inicia a thread que o escreve; chamada por create_app.
+        Chamada de novo em um processo filho (ex.: worker do gunicorn após o fork),
+        cria a fila e a thread desse processo.
+    """
+    global listener, _listener_pid
+    if listener is not None and _listener_pid == os.getpid():
+        return
+    if _listener_pid is None:
+        # primeira chamada no processo: direciona o root e o gunicorn para a fila
+        for nome in ("", "gunicorn.error"):
+            configurado = logging.getLogger(nome)
+            configurado.handlers = [fila_handler]
+            configurado.setLevel(LOG_LEVEL)
+            configurado.propagate = nome == ""
+        atexit.register(encerra_log)
+    fila_handler.queue = queue.SimpleQueue()
+    listener = QueueListener(fila_handler.queue, *_cria_saidas(), respect_handler_level=True)
+    listener.start()
+    _listener_pid = os.getpid()
+
+
+def encerra_log():
+    """ Escreve os registros pendentes na fila e para a thread do log. """
+    global listener
+    if listener is not None and _listener_pid == os.getpid():
+        listener.stop()
+        listener = None
 
 
 logger = logging.getLogger(__name__)
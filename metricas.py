@@ -0,0 +1,254 @@
+from contextvars import ContextVar, copy_context
+from threading import Lock
+from flask import request
+from sqlalchemy import event
+import time
+import os
+
+from logger import logger
+
+
+# limites dos histogramas de duração (segundos) e de quantidade por requisição
+LIMITES_SEGUNDOS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+LIMITES_QUANTIDADE = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+# requisições acima deste tempo (ms) são registradas no log com o detalhamento; vazio desativa
+LIMITE_LENTO_MS = os.environ.get("METRICAS_LENTO_MS")
+
+
+class Histograma:
+    """ Histograma no formato de texto do Prometheus, com buckets cumulativos por
+        combinação de rótulos.
+    """
+
+    def __init__(self, nome: str, descricao: str, rotulos=(), limites=LIMITES_SEGUNDOS):
+        """
+        Cria um histograma
+
+        Arguments:
+            nome: nome da métrica, ex.: lancamentos_requisicao_segundos
+            descricao: texto do HELP
+            rotulos: nomes dos rótulos, na ordem usada em observa
+            limites: limites superiores dos buckets, em ordem crescente
+        """
+        self.nome = nome
+        self.descricao = descricao
+        self.rotulos = tuple(rotulos)
+        self.limites = tuple(limites)
+        self._lock = Lock()
+        # valores dos rótulos -> [contagem por bucket..., soma, total]
+        self._series = {}
+
+    def observa(self, valor: float, *valores_rotulos):
+        with self._lock:
+            serie = self._series.get(valores_rotulos)
+            if serie is None:
+                serie = self._series[valores_rotulos] = [0] * (len(self.limites) + 2)
+            for posicao, limite in enumerate(self.limites):
+                if valor <= limite:
+                    serie[posicao] += 1
+                    break
+            serie[-2] += valor
+            serie[-1] += 1
+
+    def exporta(self):
+        """ Retorna as linhas do histograma no formato de texto do Prometheus. """
+        linhas = [f"# HELP {self.nome} {self.descricao}", f"# TYPE {self.nome} histogram"]
+        with self._lock:
+            series = sorted((chave, list(serie)) for chave, serie in self._series.items())
+        for valores_rotulos, serie in series:
+            rotulos = [f'{nome}="{_escapa(valor)}"' for nome, valor in zip(self.rotulos, valores_rotulos)]
+            acumulado = 0
+            for limite, quantidade in zip(self.limites, serie):
+                acumulado += quantidade
+                linhas.append(self._bucket(rotulos, limite, acumulado))
+            linhas.append(self._bucket(rotulos, "+Inf", serie[-1]))
+            sufixo = f"{{{','.join(rotulos)}}}" if rotulos else ""
+            linhas.append(f"{self.nome}_sum{sufixo} {serie[-2]}")
+            linhas.append(f"{self.nome}_count{sufixo} {serie[-1]}")
+        return linhas
+
+    def _bucket(self, rotulos, limite, quantidade):
+        rotulos = ",".join(rotulos + ['le="%s"' % limite])
+        return f"{self.nome}_bucket{{{rotulos}}} {quantidade}"
+
+
+def _escapa(valor):
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+requisicao_segundos = Histograma(
+    "lancamentos_requisicao_segundos", "Duração das requisições HTTP.", ("endpoint", "metodo", "status"))
+sql_comandos_requisicao = Histograma(
+    "lancamentos_sql_comandos_requisicao", "Comandos SQL executados por requisição.", ("endpoint",),
+    LIMITES_QUANTIDADE)
+sql_segundos_requisicao = Histograma(
+    "lancamentos_sql_segundos_requisicao", "Tempo total em SQL por requisição.", ("endpoint",))
+sql_comando_segundos = Histograma(
+    "lancamentos_sql_comando_segundos", "Duração de cada comando SQL.")
+categoria_chamadas_requisicao = Histograma(
+    "lancamentos_categoria_chamadas_requisicao", "Chamadas ao serviço de categorias por requisição.",
+    ("endpoint",), LIMITES_QUANTIDADE)
+categoria_segundos = Histograma(
+    "lancamentos_categoria_segundos", "Duração das chamadas ao serviço de categorias.", ("resultado",))
+
+HISTOGRAMAS = (requisicao_segundos, sql_comandos_requisicao, sql_segundos_requisicao, sql_comando_segundos,
+               categoria_chamadas_requisicao, categoria_segundos)
+
+
+class MedicaoRequisicao:
+    """ Tempos acumulados durante uma requisição, inclusive pelas threads que
+        consultam categorias em paralelo.
+    """
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.sql_comandos = 0
+        self.sql_segundos = 0.0
+        self.categoria_chamadas = 0
+        self._categoria_intervalos = []
+        self._lock = Lock()
+
+    def soma_sql(self, duracao: float):
+        with self._lock:
+            self.sql_comandos += 1
+            self.sql_segundos += duracao
+
+    def soma_categoria(self, inicio: float, fim: float):
+        with self._lock:
+            self.categoria_chamadas += 1
+            self._categoria_intervalos.append((inicio, fim))
+
+    @property
+    def categoria_segundos(self):
+        """ Tempo de relógio aguardando o serviço de categorias: chamadas
+            simultâneas são contadas uma vez.
+        """
+        total = 0.0
+        fim_anterior = None
+        for inicio, fim in sorted(self._categoria_intervalos):
+            if fim_anterior is not None and inicio < fim_anterior:
+                inicio = fim_anterior
+            if fim > inicio:
+                total += fim - inicio
+            fim_anterior = fim if fim_anterior is None else max(fim, fim_anterior)
+        return total
+
+
+# medição da requisição em andamento no contexto atual
+medicao_atual: ContextVar = ContextVar("medicao_atual", default=None)
+
+
+def contextos(quantidade: int):
+    """ Cópias do contexto atual, uma por tarefa enviada a outra thread, para que
+        as chamadas feitas nela sejam somadas à requisição de origem.
+    """
+    return [copy_context() for _ in range(quantidade)]
+
+
+def _antes_da_requisicao():
+    medicao_atual.set(MedicaoRequisicao())
+
+
+def _depois_da_requisicao(resposta):
+    medicao = medicao_atual.get()
+    if medicao is None:
+        return resposta
+    endpoint = request.url_rule.rule if request.url_rule else "desconhecido"
+    caminho = request.full_path.rstrip('?')
+    metodo = request.method
+    # registrada no fechamento da resposta: corpos em stream (exportação) entram na duração
+    resposta.call_on_close(lambda: _registra_requisicao(medicao, endpoint, metodo, caminho, resposta.status_code))
+    return resposta
+
+
+def _registra_requisicao(medicao: MedicaoRequisicao, endpoint: str, metodo: str, caminho: str, status: int):
+    duracao = time.perf_counter() - medicao.inicio
+
+    requisicao_segundos.observa(duracao, endpoint, metodo, str(status))
+    sql_comandos_requisicao.observa(medicao.sql_comandos, endpoint)
+    sql_segundos_requisicao.observa(medicao.sql_segundos, endpoint)
+    categoria_chamadas_requisicao.observa(medicao.categoria_chamadas, endpoint)
+
+    if LIMITE_LENTO_MS and duracao * 1000 >= float(LIMITE_LENTO_MS):
+        categorias = medicao.categoria_segundos
+        restante = max(0.0, duracao - medicao.sql_segundos - categorias)
+        logger.warning(
+            f"Requisição lenta: {metodo} {caminho} {status} "
+            f"{duracao * 1000:.1f} ms (sql: {medicao.sql_comandos} comandos {medicao.sql_segundos * 1000:.1f} ms, "
+            f"categorias: {medicao.categoria_chamadas} chamadas {categorias * 1000:.1f} ms, "
+            f"restante: {restante * 1000:.1f} ms)")
+    if medicao_atual.get() is medicao:
+        medicao_atual.set(None)
+
+
+def _antes_do_comando(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metricas_inicio", []).append(time.perf_counter())
+
+
+def _depois_do_comando(conn, cursor, statement, parameters, context, executemany):
+    _fim_do_comando(conn)
+
+
+def _erro_no_comando(contexto):
+    # o comando que falhou não passa por after_cursor_execute: o início é retirado aqui
+    if contexto.statement is not None and contexto.connection is not None \
+            and contexto.connection.info.get("metricas_inicio"):
+        _fim_do_comando(contexto.connection)
+
+
+def _fim_do_comando(conn):
+    duracao = time.perf_counter() - conn.info["metricas_inicio"].pop()
+    sql_comando_segundos.observa(duracao)
+    medicao = medicao_atual.get()
+    if medicao is not None:
+        medicao.soma_sql(duracao)
+
+
+def instrumenta_cliente(cliente):
+    """ Envolve o get do cliente de categorias para contar e medir as chamadas. """
+    if getattr(cliente.get, "instrumentado", False):
+        return cliente
+    get_original = cliente.get
+
+    def get(caminho: str, params: dict = None):
+        inicio = time.perf_counter()
+        resultado = "erro"
+        try:
+            resposta = get_original(caminho, params)
+            resultado = str(resposta.status_code)
+            return resposta
+        finally:
+            fim = time.perf_counter()
+            categoria_segundos.observa(fim - inicio, resultado)
+            medicao = medicao_atual.get()
+            if medicao is not None:
+                medicao.soma_categoria(inicio, fim)
+
+    get.instrumentado = True
+    cliente.get = get
+    return cliente
+
+
+def instala(app, engines, cliente):
+    """ Registra a medição das requisições do app, dos comandos SQL dos engines
+        e das chamadas do cliente de categorias. Pode ser chamada por mais de um
+        app (create_app) sem medir duas vezes o mesmo engine ou cliente.
+    """
+    app.before_request(_antes_da_requisicao)
+    app.after_request(_depois_da_requisicao)
+    for engine in engines:
+        if event.contains(engine, "before_cursor_execute", _antes_do_comando):
+            continue
+        event.listen(engine, "before_cursor_execute", _antes_do_comando)
+        event.listen(engine, "after_cursor_execute", _depois_do_comando)
+        event.listen(engine, "handle_error", _erro_no_comando)
+    instrumenta_cliente(cliente)
+
+
+def exporta():
+    """ Retorna todas as métricas no formato de texto do Prometheus. """
+    linhas = []
+    for histograma in HISTOGRAMAS:
+        linhas.extend(histograma.exporta())
+    return "\n".join(linhas) + "\n"
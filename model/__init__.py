@@ -1,31 +1,229 @@
-from sqlalchemy_utils import database_exists, create_database
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker, scoped_session, Session as SessaoOrm
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.pool import QueuePool
+from sqlalchemy import create_engine, event, inspect
+from contextlib import contextmanager
 import os
 
 # importando os elementos definidos no modelo
 from model.base import Base
 from model.lancamento import Lancamento
+from model.resumo import ResumoMensal, reconstroi_resumos
+from model.importacao import Importacao
+from model.recorrencia import Recorrencia
+from model.categoria import Categoria
+from model.alteracoes import LancamentoRemovido
+from model.arquivo import LancamentoArquivado, cria_arquivo
+from model.busca import cria_busca
+from model.replica import EscritaRecente, escreveu_recentemente, caminho_sqlite, copia_sqlite
 
 
 db_path = "database/"
-# Verifica se o diretorio não existe
-if not os.path.exists(db_path):
-    # então cria o diretorio
-    os.makedirs(db_path)
 
-# url de acesso ao banco (essa é uma url de acesso ao sqlite local)
-db_url = 'sqlite:///%s/db.sqlite3' % db_path
+# url de acesso ao banco (por padrão, uma url de acesso ao sqlite local)
+db_url = os.environ.get("DATABASE_URL", 'sqlite:///%s/db.sqlite3' % db_path)
+# réplica de leitura opcional, ex.: sqlite:///database/replica.sqlite3
+db_replica_url = os.environ.get("DATABASE_REPLICA_URL")
+
+
+def configura_sqlite(dbapi_connection, connection_record):
+    """ Ajusta cada nova conexão SQLite: WAL permite leituras durante uma escrita
+        e o busy_timeout faz a escrita concorrente aguardar em vez de falhar
+        com "database is locked".
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA busy_timeout=%d" % int(os.environ.get("SQLITE_BUSY_TIMEOUT", 5000)))
+    cursor.execute("PRAGMA cache_size=%d" % int(os.environ.get("SQLITE_CACHE_SIZE", -20000)))
+    cursor.execute("PRAGMA mmap_size=%d" % int(os.environ.get("SQLITE_MMAP_SIZE", 268435456)))
+    cursor.close()
+
+
+def cria_engine(url: str, pool_size: int = 5, max_overflow: int = 10, pool_timeout: float = 30):
+    """ Cria a engine de conexão com o banco com um pool de conexões limitado.
+
+    Arguments:
+        url: url de acesso ao banco
+        pool_size: conexões mantidas abertas no pool
+        max_overflow: conexões extras permitidas em picos
+        pool_timeout: segundos aguardando uma conexão livre do pool
+    """
+    argumentos = {}
+    if url.startswith("sqlite"):
+        # a conexão pode ser devolvida ao pool por outra thread do worker
+        argumentos["connect_args"] = {"check_same_thread": False}
+
+    engine = create_engine(url, echo=False, poolclass=QueuePool, pool_size=pool_size,
+                           max_overflow=max_overflow, pool_timeout=pool_timeout,
+                           pool_pre_ping=True, **argumentos)
+
+    if url.startswith("sqlite"):
+        event.listen(engine, "connect", configura_sqlite)
+    return engine
+
+
+parametros_pool = dict(pool_size=int(os.environ.get("DB_POOL_SIZE", 5)),
+                      max_overflow=int(os.environ.get("DB_MAX_OVERFLOW", 10)),
+                      pool_timeout=float(os.environ.get("DB_POOL_TIMEOUT", 30)))
 
 # cria a engine de conexão com o banco
-engine = create_engine(db_url, echo=False)
+engine = cria_engine(db_url, **parametros_pool)
+engine_replica = cria_engine(db_replica_url, **parametros_pool) if db_replica_url else None
+
+
+class SessaoRoteada(SessaoOrm):
+    """ Sessão que envia as leituras para a réplica quando info["replica"] é True.
+        Flush e comandos de alteração vão sempre para o primário.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if (engine_replica is not None and self.info.get("replica")
+                and not self._flushing and not isinstance(clause, UpdateBase)):
+            return engine_replica
+        return engine
+
+
+def usa_replica(session, login: str = None):
+    """ Direciona as leituras da sessão para a réplica, exceto se o usuário
+        escreveu há pouco (leia as próprias escritas no primário).
+    """
+    session.info["replica"] = not escreveu_recentemente(engine, login)
+
+
+@contextmanager
+def no_primario(session, login: str = None):
+    """ Executa o bloco no primário (ex.: escritas dentro de uma consulta) e depois
+        volta para a réplica, se o usuário não tiver escrito no bloco.
+    """
+    replica = session.info.get("replica", False)
+    session.info["replica"] = False
+    try:
+        yield session
+    finally:
+        if replica:
+            usa_replica(session, login)
+
+
+# Instancia um criador de seção com o banco; cada requisição (thread) usa a sua sessão
+Session = scoped_session(sessionmaker(class_=SessaoRoteada))
+
+
+def encerra_sessao(exc=None):
+    """ Finaliza a sessão da requisição: confirma se não houve erro, senão desfaz,
+        e sempre devolve a conexão ao pool.
+    """
+    try:
+        if Session.registry.has():
+            if exc is None:
+                Session.commit()
+            else:
+                Session.rollback()
+    finally:
+        Session.remove()
+
+
+def migra_colunas(engine):
+    """ Acrescenta às tabelas existentes as colunas novas do modelo,
+        já que create_all não altera tabelas que já existem.
+
+        Retorna os nomes (tabela.coluna) das colunas acrescentadas.
+    """
+    acrescentadas = []
+    inspetor = inspect(engine)
+    with engine.begin() as conexao:
+        for tabela in Base.metadata.sorted_tables:
+            if not inspetor.has_table(tabela.name):
+                continue
+            existentes = {coluna["name"] for coluna in inspetor.get_columns(tabela.name)}
+            for coluna in tabela.columns:
+                if coluna.name in existentes:
+                    continue
+                ddl = "ALTER TABLE %s ADD COLUMN %s %s" % (
+                    tabela.name, coluna.name, coluna.type.compile(engine.dialect))
+                if coluna.server_default is not None:
+                    ddl += " NOT NULL DEFAULT %s" % coluna.server_default.arg
+                conexao.exec_driver_sql(ddl)
+                acrescentadas.append("%s.%s" % (tabela.name, coluna.name))
+    return acrescentadas
+
+
+def sincroniza_replica():
+    """ Copia o banco primário para a réplica (ambos SQLite) com a API de backup. """
+    origem, destino = caminho_sqlite(db_url), caminho_sqlite(db_replica_url) if db_replica_url else None
+    if origem is None or destino is None:
+        raise ValueError("a cópia da réplica exige DATABASE_URL e DATABASE_REPLICA_URL em arquivos SQLite")
+    copia_sqlite(origem, destino)
+
+
+# True quando o banco tem FTS5 (definido por inicializa_banco; False: busca com LIKE)
+busca_fts = False
+_inicializado = False
+
+
+def inicializa_banco():
+    """ Cria o banco, as tabelas, colunas e índices novos e o índice de busca.
+
+        Executada uma vez por processo, por create_app: com preload_app o gunicorn
+        a executa apenas no master e os workers já nascem com o esquema pronto.
+    """
+    global busca_fts, _inicializado
+    if _inicializado:
+        return
+    # importado só aqui: sqlalchemy_utils pesa no tempo de importação e só é usado uma vez
+    from sqlalchemy_utils import database_exists, create_database
+
+    # Verifica se o diretorio não existe
+    if db_url.startswith("sqlite") and not os.path.exists(db_path):
+        # então cria o diretorio
+        os.makedirs(db_path)
+
+    # cria o banco se ele não existir
+    if not database_exists(engine.url):
+        create_database(engine.url)
+
+    # cria as tabelas do banco, caso não existam
+    resumo_existente = inspect(engine).has_table(ResumoMensal.__tablename__)
+    Base.metadata.create_all(engine)
+
+    # em bancos antigos o resumo mensal é preenchido a partir dos lançamentos existentes
+    if not resumo_existente:
+        reconstroi_resumos(Session())
+        Session.commit()
+        Session.remove()
+
+    acrescentadas = migra_colunas(engine)
+    if "lancamentos.atualizado_em" in acrescentadas:
+        # lançamentos anteriores ao controle de alterações partem da data de inserção
+        with engine.begin() as conexao:
+            conexao.exec_driver_sql(
+                "UPDATE lancamentos SET atualizado_em = coalesce(data_insercao, CURRENT_TIMESTAMP)")
+
+    # create_all não cria índices novos em tabelas já existentes,
+    # então bancos antigos recebem os índices aqui
+    for tabela in Base.metadata.sorted_tables:
+        for indice in tabela.indexes:
+            indice.create(engine, checkfirst=True)
+
+    # chave única somando lancamentos e o arquivo
+    cria_arquivo(engine)
+
+    # índice de texto completo usado na busca por descrição
+    busca_fts = cria_busca(engine)
+
+    # uma réplica SQLite ainda inexistente começa como cópia do primário
+    if db_replica_url and caminho_sqlite(db_replica_url) and not os.path.exists(caminho_sqlite(db_replica_url)):
+        sincroniza_replica()
 
-# Instancia um criador de seção com o banco
-Session = sessionmaker(bind=engine)
+    # as conexões abertas na inicialização não devem ser herdadas pelos workers
+    engine.dispose()
+    _inicializado = True
 
-# cria o banco se ele não existir
-if not database_exists(engine.url):
-    create_database(engine.url)
 
-# cria as tabelas do banco, caso não existam
-Base.metadata.create_all(engine)
+def recria_conexoes():
+    """ Descarta, sem fechá-las, as conexões herdadas do processo pai: após o fork
+        cada worker abre as suas (gunicorn_config.post_fork).
+    """
+    for banco in (engine, engine_replica):
+        if banco is not None:
+            banco.dispose(close=False)
@@ -0,0 +1,93 @@
+from sqlalchemy import Column, String, Integer, DateTime, Index, tuple_, and_
+from datetime import datetime, timedelta
+import os
+
+from model import Base
+from model.lancamento import Lancamento
+from model.leitura import leitura_completa
+
+
+# segundos do fim da sincronização que voltam no próximo pedido: uma transação
+# mais lenta pode gravar um atualizado_em anterior a alterações já entregues
+ALTERACOES_MARGEM = float(os.environ.get("ALTERACOES_MARGEM", 5))
+# dias em que as remoções ficam registradas; cursores mais antigos exigem recarga completa
+ALTERACOES_RETENCAO_DIAS = int(os.environ.get("ALTERACOES_RETENCAO_DIAS", 90))
+
+
+class LancamentoRemovido(Base):
+    """ Registro (tombstone) de um lançamento removido, para que clientes que
+        sincronizam por alterações também apaguem a sua cópia.
+    """
+    __tablename__ = 'lancamentos_removidos'
+
+    registro = Column(Integer, primary_key=True)
+    id = Column(Integer, nullable=False)
+    login = Column(String(10))
+    removido_em = Column(DateTime, nullable=False, default=datetime.now)
+
+    __table_args__ = (
+        Index('ix_lancamentos_removidos_login_removido_em', 'login', 'removido_em'),
+    )
+
+
+def registra_remocao(session, lancamento: Lancamento):
+    """ Registra a remoção do lançamento, na mesma transação do DELETE. """
+    session.add(LancamentoRemovido(id=lancamento.id, login=lancamento.login))
+
+
+def limpa_remocoes(session, dias: int = ALTERACOES_RETENCAO_DIAS):
+    """ Apaga os registros de remoção mais antigos que a retenção; retorna a quantidade. """
+    limite = datetime.now() - timedelta(days=dias)
+    return session.query(LancamentoRemovido).filter(LancamentoRemovido.removido_em < limite) \
+                  .delete(synchronize_session=False)
+
+
+def cursor_expirado(desde: datetime):
+    """ Indica se o cursor é anterior à retenção das remoções: o cliente pode ter
+        perdido remoções e precisa recarregar tudo.
+    """
+    return desde < datetime.now() - timedelta(days=ALTERACOES_RETENCAO_DIAS)
+
+
+def _posteriores(coluna_tempo, coluna_id, desde):
+    """ Filtro (tempo, id) > cursor que ainda usa o índice por (login, tempo). """
+    instante, id = desde
+    return and_(coluna_tempo >= instante, tuple_(coluna_tempo, coluna_id) > tuple_(instante, id))
+
+
+def consulta_alteracoes(session, login: str, desde=None, limite: int = 500):
+    """ Lançamentos inseridos ou alterados e lançamentos removidos do usuário depois
+        do cursor (atualizado_em, id), em ordem, até o limite.
+
+        Retorna as alterações como ((instante, id), linha de leitura_completa ou None
+        para remoções), se há mais alterações depois delas, e o próximo cursor.
+    """
+    def filtro(modelo):
+        # lançamentos arquivados entram na recarga completa; depois de arquivados não mudam mais
+        condicoes = [modelo.login == login]
+        if desde is not None:
+            condicoes.append(_posteriores(modelo.atualizado_em, modelo.id, desde))
+        return condicoes
+
+    alterados = leitura_completa(filtro, "atualizado_em")
+    alterados = session.execute(alterados.order_by(
+        alterados.selected_columns.atualizado_em, alterados.selected_columns.id).limit(limite + 1))
+    removidos = session.query(LancamentoRemovido.removido_em, LancamentoRemovido.id) \
+        .filter(LancamentoRemovido.login == login)
+    if desde is not None:
+        removidos = removidos.filter(_posteriores(LancamentoRemovido.removido_em, LancamentoRemovido.id, desde))
+    removidos = removidos.order_by(LancamentoRemovido.removido_em, LancamentoRemovido.id).limit(limite + 1)
+
+    # as duas listas já vêm ordenadas: basta intercalá-las pela chave (instante, id)
+    alteracoes = sorted([((linha[-1], linha.id), linha[:-1]) for linha in alterados] +
+                        [((instante, id), None) for instante, id in removidos], key=lambda item: item[0])
+    tem_mais = len(alteracoes) > limite
+    alteracoes = alteracoes[:limite]
+
+    cursor = alteracoes[-1][0] if alteracoes else desde
+    if not tem_mais:
+        # a última página não avança além da margem: o que foi gravado nela é relido no próximo pedido
+        margem = (datetime.now() - timedelta(seconds=ALTERACOES_MARGEM), 0)
+        if cursor is None or cursor > margem:
+            cursor = margem if desde is None or margem > desde else desde
+    return alteracoes, tem_mais, cursor
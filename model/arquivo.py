@@ -0,0 +1,164 @@
+from sqlalchemy import Column, String, Integer, Boolean, Date, DateTime, Float, UniqueConstraint, Index
+from sqlalchemy import select, insert, delete, union_all, text
+from sqlalchemy.schema import CreateTable
+from datetime import date
+import os
+
+from model import Base
+from model.lancamento import Lancamento
+
+
+# meses, antes do mês corrente, mantidos em lancamentos; pagos mais antigos vão para o arquivo
+ARQUIVO_HORIZONTE_MESES = int(os.environ.get("ARQUIVO_HORIZONTE_MESES", 12))
+
+
+class LancamentoArquivado(Base):
+    """ Lançamento pago e antigo movido de lancamentos pelo arquivamento, com o mesmo id.
+        Mantém lancamentos (e seus índices) pequena; as consultas históricas leem as duas.
+    """
+    __tablename__ = 'lancamentos_archive'
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    descricao = Column(String(140))
+    valor = Column(Float)
+    pago = Column(Boolean)
+    tipo = Column(String(20))
+    categoria_id = Column(Integer, nullable=False)
+    data_vencimento = Column(Date)
+    login = Column(String(10))
+    data_insercao = Column(DateTime)
+    atualizado_em = Column(DateTime)
+
+    __table_args__ = (
+        UniqueConstraint('descricao', 'data_vencimento', 'login', name='uq_archive_descricao_data_vencimento_login'),
+        Index('ix_lancamentos_archive_login_data_vencimento', 'login', 'data_vencimento'),
+        Index('ix_lancamentos_archive_login_atualizado_em', 'login', 'atualizado_em'),
+    )
+
+
+# tabelas lidas pelas consultas históricas, na ordem da união
+MODELOS = (Lancamento, LancamentoArquivado)
+
+_UNICO_NO_ARQUIVO = """EXISTS (SELECT 1 FROM lancamentos_archive a
+        WHERE a.descricao = new.descricao AND a.data_vencimento = new.data_vencimento AND a.login = new.login)"""
+_ERRO_UNICO = "UNIQUE constraint failed: lancamentos.descricao, lancamentos.data_vencimento, lancamentos.login"
+
+DDL_ARQUIVO = (
+    # a chave (descricao, data_vencimento, login) continua única somando as duas tabelas:
+    # o conflito com o arquivo falha como o da própria tabela (IntegrityError)
+    f"""CREATE TRIGGER IF NOT EXISTS lancamentos_unico_arquivo_insere BEFORE INSERT ON lancamentos
+        WHEN {_UNICO_NO_ARQUIVO}
+    BEGIN SELECT RAISE(ABORT, '{_ERRO_UNICO}'); END""",
+    f"""CREATE TRIGGER IF NOT EXISTS lancamentos_unico_arquivo_altera
+        BEFORE UPDATE OF descricao, data_vencimento, login ON lancamentos
+        WHEN {_UNICO_NO_ARQUIVO}
+    BEGIN SELECT RAISE(ABORT, '{_ERRO_UNICO}'); END""",
+)
+
+
+def cria_arquivo(engine):
+    """ Cria os triggers que mantêm a chave única entre lancamentos e o arquivo e garante
+        que os ids de lancamentos nunca se repetem (SQLite). Nos demais bancos não há
+        triggers e o arquivamento é recusado (arquiva).
+    """
+    if engine.dialect.name != "sqlite":
+        return False
+    with engine.begin() as conexao:
+        ddl = conexao.execute(text(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'lancamentos'")).scalar()
+        if "AUTOINCREMENT" not in ddl.upper():
+            _recria_com_autoincremento(conexao)
+        # a sequência começa acima de todo id já arquivado
+        conexao.exec_driver_sql("""INSERT INTO sqlite_sequence (name, seq) SELECT 'lancamentos', 0
+            WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'lancamentos')""")
+        conexao.exec_driver_sql("""UPDATE sqlite_sequence
+            SET seq = max(seq, (SELECT coalesce(max(id), 0) FROM lancamentos_archive))
+            WHERE name = 'lancamentos'""")
+        for ddl in DDL_ARQUIVO:
+            conexao.exec_driver_sql(ddl)
+    return True
+
+
+def _recria_com_autoincremento(conexao):
+    """ Recria lancamentos, criada antes do arquivo, com AUTOINCREMENT: sem ele o SQLite
+        reutiliza o maior id quando o último lançamento é removido, e o id de um lançamento
+        arquivado voltaria a ser usado. Os triggers da busca são recriados por cria_busca.
+    """
+    tabela = Lancamento.__table__
+    colunas = ", ".join(coluna.name for coluna in tabela.columns)
+    ddl = str(CreateTable(tabela).compile(dialect=conexao.dialect))
+    conexao.exec_driver_sql(ddl.replace("CREATE TABLE lancamentos ", "CREATE TABLE lancamentos_novo ", 1))
+    conexao.exec_driver_sql(f"INSERT INTO lancamentos_novo ({colunas}) SELECT {colunas} FROM lancamentos")
+    conexao.exec_driver_sql("DROP TABLE lancamentos")
+    conexao.exec_driver_sql("ALTER TABLE lancamentos_novo RENAME TO lancamentos")
+    for indice in tabela.indexes:
+        indice.create(conexao)
+
+
+def uniao(selecao):
+    """ UNION ALL da consulta montada por selecao(modelo) sobre lancamentos e sobre o arquivo. """
+    return union_all(*(selecao(modelo) for modelo in MODELOS))
+
+
+def todos_lancamentos(*colunas: str):
+    """ Subconsulta com as colunas informadas de lancamentos e do arquivo, para agregações. """
+    return uniao(lambda modelo: select(*(getattr(modelo, coluna) for coluna in colunas))) \
+        .subquery("lancamentos_todos")
+
+
+def horizonte_arquivo(meses: int = ARQUIVO_HORIZONTE_MESES, hoje: date = None):
+    """ Primeiro dia do mês que fica meses antes do mês corrente: pagos com vencimento
+        anterior a ele podem ser arquivados.
+    """
+    hoje = hoje or date.today()
+    total = hoje.year * 12 + hoje.month - 1 - meses
+    return date(total // 12, total % 12 + 1, 1)
+
+
+def arquiva(session, horizonte: date, tamanho_bloco: int = 1000):
+    """ Move para lancamentos_archive os lançamentos pagos com vencimento anterior ao
+        horizonte, em uma transação por bloco.
+
+        Retorna a quantidade de lançamentos movidos.
+        Levanta ValueError fora do SQLite, onde não há os triggers de cria_arquivo.
+    """
+    if session.get_bind().dialect.name != "sqlite":
+        # sem os triggers, POST e PUT /lancamento poderiam repetir uma chave arquivada
+        raise ValueError("o arquivamento exige SQLite: nos demais bancos a chave única "
+                         "não seria verificada no arquivo")
+
+    movidos = 0
+    ultimo = 0
+    while True:
+        ids = [id for (id,) in session.query(Lancamento.id).filter(
+            Lancamento.id > ultimo, Lancamento.pago == True, Lancamento.data_vencimento < horizonte)
+            .order_by(Lancamento.id).limit(tamanho_bloco)]
+        if not ids:
+            break
+        # os totais mensais não mudam: o resumo conta lançamentos das duas tabelas
+        linhas = [dict(linha._mapping) for linha in
+                  session.execute(select(Lancamento.__table__).where(Lancamento.id.in_(ids)))]
+        # sai de lancamentos antes: cada id fica uma única vez no índice da busca (triggers)
+        session.execute(delete(Lancamento).where(Lancamento.id.in_(ids)))
+        session.execute(insert(LancamentoArquivado), linhas)
+        session.commit()
+        movidos += len(ids)
+        ultimo = ids[-1]
+    return movidos
+
+
+def desarquiva(session, *filtro):
+    """ Devolve a lancamentos, na transação da sessão, os lançamentos arquivados que
+        atendem ao filtro (sobre LancamentoArquivado), para que possam ser alterados
+        ou removidos. Os totais mensais não mudam.
+
+        Retorna os ids devolvidos.
+    """
+    linhas = [dict(linha._mapping) for linha in
+              session.execute(select(LancamentoArquivado.__table__).where(*filtro))]
+    if linhas:
+        # sai do arquivo antes: o trigger de chave única recusaria a inserção
+        session.execute(delete(LancamentoArquivado).where(
+            LancamentoArquivado.id.in_([linha["id"] for linha in linhas])))
+        session.execute(insert(Lancamento), linhas)
+    return [linha["id"] for linha in linhas]
@@ -0,0 +1,142 @@
+from sqlalchemy import text
+import re
+
+from model.arquivo import MODELOS
+from logger import logger
+
+
+# índice de texto completo sobre lancamentos e o arquivo (tabela de conteúdo externo: guarda só o índice)
+TABELA_BUSCA = "lancamentos_fts"
+
+DDL_BUSCA = (
+    # remove_diacritics: "inglês" e "ingles" geram o mesmo termo; prefix: índices para buscas "ing*"
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {TABELA_BUSCA} USING fts5(
+        descricao, login,
+        content='lancamentos', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3')""",
+    f"""CREATE TRIGGER IF NOT EXISTS lancamentos_fts_insere AFTER INSERT ON lancamentos BEGIN
+        INSERT INTO {TABELA_BUSCA}(rowid, descricao, login) VALUES (new.id, new.descricao, new.login);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS lancamentos_fts_remove AFTER DELETE ON lancamentos BEGIN
+        INSERT INTO {TABELA_BUSCA}({TABELA_BUSCA}, rowid, descricao, login)
+        VALUES ('delete', old.id, old.descricao, old.login);
+    END""",
+    # só alterações no texto indexado reindexam a linha (ex.: /paga não passa por aqui)
+    f"""CREATE TRIGGER IF NOT EXISTS lancamentos_fts_altera AFTER UPDATE OF descricao, login ON lancamentos BEGIN
+        INSERT INTO {TABELA_BUSCA}({TABELA_BUSCA}, rowid, descricao, login)
+        VALUES ('delete', old.id, old.descricao, old.login);
+        INSERT INTO {TABELA_BUSCA}(rowid, descricao, login) VALUES (new.id, new.descricao, new.login);
+    END""",
+)
+
+# o arquivo usa o mesmo índice: os ids não se repetem entre as duas tabelas e o arquivamento
+# remove de lancamentos antes de inserir no arquivo
+DDL_BUSCA_ARQUIVO = (
+    f"""CREATE TRIGGER IF NOT EXISTS lancamentos_archive_fts_insere AFTER INSERT ON lancamentos_archive BEGIN
+        INSERT INTO {TABELA_BUSCA}(rowid, descricao, login) VALUES (new.id, new.descricao, new.login);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS lancamentos_archive_fts_remove AFTER DELETE ON lancamentos_archive BEGIN
+        INSERT INTO {TABELA_BUSCA}({TABELA_BUSCA}, rowid, descricao, login)
+        VALUES ('delete', old.id, old.descricao, old.login);
+    END""",
+)
+
+
+def cria_busca(engine):
+    """ Cria o índice de texto completo e os triggers que o mantêm sincronizado.
+        Em um banco existente, o índice é preenchido com os lançamentos já gravados
+        (e, se o índice for anterior aos triggers do arquivo, com os arquivados).
+
+        Retorna False se o banco não tiver FTS5; a busca usa então LIKE.
+    """
+    if engine.dialect.name != "sqlite":
+        return False
+    try:
+        with engine.begin() as conexao:
+            existente = _existe(conexao, "table", TABELA_BUSCA)
+            arquivo_indexado = _existe(conexao, "trigger", "lancamentos_archive_fts_insere")
+            for ddl in DDL_BUSCA + DDL_BUSCA_ARQUIVO:
+                conexao.exec_driver_sql(ddl)
+            if not existente:
+                reconstroi_busca(conexao)
+            elif not arquivo_indexado:
+                _indexa_arquivo(conexao)
+    except Exception as e:
+        logger.warning(f"Busca de texto completo indisponível, usando LIKE: {e}")
+        return False
+    return True
+
+
+def _existe(conexao, tipo: str, nome: str):
+    return conexao.execute(text(
+        "SELECT 1 FROM sqlite_master WHERE type = :tipo AND name = :nome"),
+        {"tipo": tipo, "nome": nome}).first() is not None
+
+
+def _indexa_arquivo(conexao):
+    conexao.exec_driver_sql(f"""INSERT INTO {TABELA_BUSCA}(rowid, descricao, login)
+        SELECT id, descricao, login FROM lancamentos_archive""")
+
+
+def reconstroi_busca(conexao):
+    """ Recria todo o índice de texto completo a partir de lancamentos e do arquivo. """
+    # o rebuild lê só a tabela de conteúdo (lancamentos); os arquivados entram em seguida
+    conexao.exec_driver_sql(f"INSERT INTO {TABELA_BUSCA}({TABELA_BUSCA}) VALUES ('rebuild')")
+    _indexa_arquivo(conexao)
+
+
+def termos_busca(texto: str):
+    """ Separa o texto digitado em termos (letras e números). """
+    return re.findall(r"\w+", texto)
+
+
+def _literal(valor: str):
+    return '"%s"' % valor.replace('"', '""')
+
+
+def consulta_fts(texto: str, login: str):
+    """ Monta a expressão MATCH: todos os termos, cada um como prefixo, na
+        descrição, e o login na coluna login.
+    """
+    termos = " ".join(_literal(termo) + "*" for termo in termos_busca(texto))
+    return f"login : {_literal(login)} AND descricao : ({termos})"
+
+
+def busca_lancamentos(session, login: str, texto: str, limite: int, deslocamento: int = 0,
+                      fts: bool = True):
+    """ Busca os lançamentos do usuário, inclusive os arquivados, cuja descrição contém
+        todos os termos (por prefixo e sem diferenciar acentos), ordenados por relevância (bm25).
+
+        Retorna até limite lançamentos a partir da posição deslocamento.
+    """
+    if not termos_busca(texto):
+        return []
+
+    if not fts:
+        encontrados = []
+        for modelo in MODELOS:
+            consulta = session.query(modelo).filter(modelo.login == login)
+            for termo in termos_busca(texto):
+                consulta = consulta.filter(modelo.descricao.ilike(f"%{termo}%"))
+            encontrados += consulta.order_by(modelo.data_vencimento.desc(), modelo.id) \
+                                   .limit(limite + deslocamento).all()
+        encontrados.sort(key=lambda l: (-l.data_vencimento.toordinal(), l.id))
+        return encontrados[deslocamento:deslocamento + limite]
+
+    # bm25 com peso 0 no login: só a descrição conta para a relevância
+    ids = [linha[0] for linha in session.execute(text(
+        f"""SELECT f.rowid FROM {TABELA_BUSCA} f
+            WHERE {TABELA_BUSCA} MATCH :consulta
+              AND (EXISTS (SELECT 1 FROM lancamentos l WHERE l.id = f.rowid AND l.login = :login)
+                   OR EXISTS (SELECT 1 FROM lancamentos_archive a WHERE a.id = f.rowid AND a.login = :login))
+            ORDER BY bm25({TABELA_BUSCA}, 1.0, 0.0), f.rowid
+            LIMIT :limite OFFSET :deslocamento"""),
+        {"consulta": consulta_fts(texto, login), "login": login,
+         "limite": limite, "deslocamento": deslocamento})]
+    if not ids:
+        return []
+
+    encontrados = {}
+    for modelo in MODELOS:
+        encontrados.update((l.id, l) for l in session.query(modelo).filter(modelo.id.in_(ids)))
+    return [encontrados[id] for id in ids if id in encontrados]
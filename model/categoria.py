@@ -0,0 +1,97 @@
+from sqlalchemy import Column, String, Integer, DateTime
+from datetime import datetime
+from model import Base
+from model.lancamento import Lancamento
+
+
+class Categoria(Base):
+    """ Cópia local das categorias do serviço de categorias, mantida pela
+        sincronização (categorias.py). As consultas obtêm o nome por join.
+    """
+    __tablename__ = 'categorias'
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    nome = Column(String(140), nullable=False)
+    tipo = Column(String(20))
+    sincronizado_em = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+
+class VersaoCategorias(Base):
+    """ Versão da cópia local das categorias, avançada a cada alteração. Faz parte dos
+        ETags das respostas com nome de categoria, em todos os workers.
+    """
+    __tablename__ = 'categorias_versao'
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    versao = Column(Integer, nullable=False, default=0)
+
+
+def avanca_versao_categorias(session):
+    """ Avança a versão das categorias dentro da transação da sessão. """
+    tabela = VersaoCategorias.__table__
+    resultado = session.execute(tabela.update().where(tabela.c.id == 1).values(versao=tabela.c.versao + 1))
+    if resultado.rowcount == 0:
+        session.execute(tabela.insert().values(id=1, versao=1))
+
+
+def versao_categorias(session):
+    """ Retorna a versão atual da cópia local das categorias (0 se nunca alterada). """
+    return session.query(VersaoCategorias.versao).filter(VersaoCategorias.id == 1).scalar() or 0
+
+
+def junta_categoria(consulta, modelo=Lancamento):
+    """ Acrescenta à consulta sobre lancamentos (ou sobre o arquivo, em modelo) o join com
+        a cópia local das categorias. Lançamentos de categorias ainda não sincronizadas vêm com nome nulo.
+    """
+    return consulta.outerjoin(Categoria, Categoria.id == modelo.categoria_id)
+
+
+def categorias_locais(session, ids):
+    """ Retorna, das categorias informadas, as presentes na cópia local: id -> {"nome", "tipo"}. """
+    ids = list(ids)
+    if not ids:
+        return {}
+    return {id: {"nome": nome, "tipo": tipo} for id, nome, tipo in
+            session.query(Categoria.id, Categoria.nome, Categoria.tipo).filter(Categoria.id.in_(ids))}
+
+
+def grava_categorias(session, categorias, completa: bool = False):
+    """ Insere ou atualiza as categorias ({"id", "nome", "tipo"}) na cópia local.
+        Com completa=True a lista é o cadastro inteiro e as ausentes são removidas.
+
+        Retorna a quantidade de categorias gravadas (novas ou alteradas) e removidas.
+    """
+    recebidas = {item["id"]: item for item in categorias}
+    consulta = session.query(Categoria)
+    if not completa:
+        consulta = consulta.filter(Categoria.id.in_(list(recebidas)))
+    existentes = {categoria.id: categoria for categoria in consulta}
+
+    gravadas = 0
+    for id, item in recebidas.items():
+        categoria = existentes.get(id)
+        if categoria is None:
+            session.add(Categoria(id=id, nome=item["nome"], tipo=item["tipo"]))
+            gravadas += 1
+        elif (categoria.nome, categoria.tipo) != (item["nome"], item["tipo"]):
+            categoria.nome, categoria.tipo = item["nome"], item["tipo"]
+            gravadas += 1
+
+    removidas = 0
+    if completa:
+        for id, categoria in existentes.items():
+            if id not in recebidas:
+                session.delete(categoria)
+                removidas += 1
+    session.flush()
+    if gravadas or removidas:
+        avanca_versao_categorias(session)
+    return gravadas, removidas
+
+
+def remove_categoria(session, id: int):
+    """ Remove a categoria da cópia local; retorna 1 se ela existia, senão 0. """
+    removidas = session.query(Categoria).filter(Categoria.id == id).delete(synchronize_session=False)
+    if removidas:
+        avanca_versao_categorias(session)
+    return removidas
@@ -0,0 +1,39 @@
+from sqlalchemy import Column, String, Integer, Boolean, DateTime
+from datetime import datetime
+from model import Base
+
+
+class Importacao(Base):
+    """ Progresso de uma importação de extrato, usado para retomar a importação
+        do ponto em que parou após uma falha.
+    """
+    __tablename__ = 'importacoes'
+
+    # hash do conteúdo do arquivo e do login
+    id = Column(String(64), primary_key=True)
+    login = Column(String(10), nullable=False)
+    arquivo = Column(String(255))
+    linhas_processadas = Column(Integer, nullable=False, default=0)
+    criados = Column(Integer, nullable=False, default=0)
+    duplicados = Column(Integer, nullable=False, default=0)
+    rejeitados = Column(Integer, nullable=False, default=0)
+    concluida = Column(Boolean, nullable=False, default=False)
+    atualizado_em = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+    def __init__(self, id: str, login: str, arquivo: str = None):
+        """
+        Cria o registro de uma importação
+
+        Arguments:
+            id: identificador da importação (hash do arquivo e do login)
+            login: usuário dono dos lançamentos importados
+            arquivo: nome do arquivo importado
+        """
+        self.id = id
+        self.login = login
+        self.arquivo = arquivo
+        self.linhas_processadas = 0
+        self.criados = 0
+        self.duplicados = 0
+        self.rejeitados = 0
+        self.concluida = False
@@ -1,9 +1,21 @@
-from sqlalchemy import Column, String, Integer, Boolean, Date, DateTime, Float, ForeignKey, UniqueConstraint
+from sqlalchemy import Column, String, Integer, Boolean, Date, DateTime, Float, ForeignKey, UniqueConstraint, Index
 from datetime import datetime, date
 from typing import Union
 from model import Base
 
 
+def intervalo_mes(data: date):
+    """ Retorna o primeiro dia do mês da data e o primeiro dia do mês seguinte,
+        para filtrar o mês como intervalo semiaberto [inicio, fim).
+    """
+    inicio = date(data.year, data.month, 1)
+    if data.month == 12:
+        fim = date(data.year + 1, 1, 1)
+    else:
+        fim = date(data.year, data.month + 1, 1)
+    return inicio, fim
+
+
 class Lancamento(Base):
     __tablename__ = 'lancamentos'
 
@@ -15,11 +27,20 @@ class Lancamento(Base):
     categoria_id = Column(Integer, nullable=False)
     data_vencimento = Column(Date)
     login = Column(String(10))
-    data_insercao = Column(DateTime, default=datetime.now())
+    # callable: avaliado a cada inserção, não uma única vez na importação do módulo
+    data_insercao = Column(DateTime, default=datetime.now)
+    # última inserção ou alteração, usada na sincronização incremental (/lancamentos/changes)
+    atualizado_em = Column(DateTime, default=datetime.now, onupdate=datetime.now)
     
     # Adicione a restrição de unicidade composta nas colunas descricao, data_vencimento e login
     __table_args__ = (
         UniqueConstraint('descricao', 'data_vencimento', 'login', name='uq_descricao_data_vencimento_login'),
+        # atende as consultas mensais por usuário com uma busca por intervalo no índice
+        Index('ix_lancamentos_login_data_vencimento', 'login', 'data_vencimento'),
+        # alterações do usuário em ordem, a partir do cursor do cliente
+        Index('ix_lancamentos_login_atualizado_em', 'login', 'atualizado_em'),
+        # ids nunca reutilizados: um lançamento arquivado mantém o seu id (model.arquivo)
+        {'sqlite_autoincrement': True},
     )
 
     def __init__(self, descricao: str, valor: float, pago: Boolean, tipo: str, categoria_id: int, data_vencimento: Date,
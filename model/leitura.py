@@ -0,0 +1,53 @@
+from sqlalchemy import String, select, type_coerce
+from datetime import date
+
+from model.lancamento import Lancamento
+from model.categoria import Categoria, junta_categoria
+from model.arquivo import uniao
+
+
+def colunas_leitura(modelo=Lancamento):
+    """ Colunas lidas pelos endpoints de consulta, na ordem de LancamentoViewSchema, em
+        lancamentos ou no arquivo. O vencimento vem como texto do banco, sem conversão
+        para date em cada linha, e o nome da categoria vem da cópia local (nulo se
+        ainda não sincronizada).
+    """
+    return (
+        modelo.id.label("id"), modelo.descricao, modelo.valor, modelo.pago, modelo.tipo,
+        type_coerce(modelo.data_vencimento, String).label("data_vencimento"),
+        modelo.categoria_id, Categoria.nome.label("categoria_nome"), modelo.login)
+
+
+COLUNAS_LEITURA = colunas_leitura()
+
+
+def consulta_leitura(session):
+    """ Consulta somente de leitura sobre lancamentos: retorna tuplas com as colunas de
+        COLUNAS_LEITURA, sem criar objetos do ORM nem registrá-los na sessão.
+    """
+    return junta_categoria(session.query(*COLUNAS_LEITURA))
+
+
+def leitura_completa(filtro, *extras: str):
+    """ Mesmas colunas de consulta_leitura (mais as colunas extras informadas) sobre
+        lancamentos e o arquivo, em UNION ALL, com filtro(modelo) aplicado a cada tabela.
+        Ordene com ordem_leitura e execute com session.execute (no SQLite, o ORDER BY de
+        uma união só aceita colunas rotuladas).
+    """
+    return uniao(lambda modelo: junta_categoria(
+        select(*colunas_leitura(modelo), *(getattr(modelo, extra).label(extra) for extra in extras)), modelo)
+        .where(*filtro(modelo)))
+
+
+def ordem_leitura(consulta, decrescente: bool = False):
+    """ Ordena o resultado de leitura_completa por vencimento e id. """
+    colunas = consulta.selected_columns
+    if decrescente:
+        return consulta.order_by(colunas.data_vencimento.desc(), colunas.id.desc())
+    return consulta.order_by(colunas.data_vencimento, colunas.id)
+
+
+def vencimento(linha):
+    """ Vencimento de uma linha de consulta_leitura como date. """
+    valor = linha.data_vencimento
+    return date.fromisoformat(valor[:10]) if isinstance(valor, str) else valor
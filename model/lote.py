@@ -0,0 +1,97 @@
+from sqlalchemy import tuple_, text
+from sqlalchemy.exc import IntegrityError
+from model.lancamento import Lancamento
+from model.arquivo import MODELOS
+from model.resumo import delta_resumo, aplica_deltas
+
+
+# chaves por consulta ao verificar duplicidades (3 parâmetros por chave)
+TAMANHO_CONSULTA = 500
+
+
+def _chave(item):
+    return (item["descricao"], item["data_vencimento"], item["login"])
+
+
+def busca_ids(session, chaves):
+    """ Retorna um dicionário (descricao, data_vencimento, login) -> id
+        com os lançamentos já gravados para as chaves informadas, em
+        lancamentos ou no arquivo.
+    """
+    chaves = list(chaves)
+    encontrados = {}
+    for modelo in MODELOS:
+        chave_coluna = tuple_(modelo.descricao, modelo.data_vencimento, modelo.login)
+        for inicio in range(0, len(chaves), TAMANHO_CONSULTA):
+            parte = chaves[inicio:inicio + TAMANHO_CONSULTA]
+            linhas = session.query(modelo.id, modelo.descricao, modelo.data_vencimento,
+                                   modelo.login).filter(chave_coluna.in_(parte))
+            for id, descricao, data_vencimento, login in linhas:
+                encontrados[(descricao, data_vencimento, login)] = id
+    return encontrados
+
+
+def ids_criados(session, novos):
+    """ Retorna um dicionário chave -> id para os lançamentos que acabaram de ser inseridos,
+        na ordem de novos, na transação da sessão.
+
+        No SQLite, lancamentos usa AUTOINCREMENT (cria_arquivo) e a transação detém o lock de
+        escrita: os ids são os últimos len(novos) valores da sequência, sem nova consulta.
+    """
+    if session.get_bind().dialect.name != "sqlite":
+        return busca_ids(session, novos)
+    ultimo = session.execute(text("SELECT seq FROM sqlite_sequence WHERE name = 'lancamentos'")).scalar()
+    return dict(zip(novos, range(ultimo - len(novos) + 1, ultimo + 1)))
+
+
+def insere_lancamentos(session, itens, tentativas: int = 3):
+    """ Insere uma lista de lançamentos com executemany e atualiza os resumos mensais, na
+        transação da sessão, sem commit: o chamador confirma junto com as próprias escritas.
+        Deve ser chamada no início da transação, que é desfeita e repetida em um conflito.
+
+        Itens cuja chave (descricao, data_vencimento, login) já existe na base ou
+        se repete na própria lista são ignorados.
+
+        Arguments:
+            itens: dicionários com os campos do Lancamento
+            tentativas: repetições caso outra requisição grave a mesma chave ao mesmo tempo
+
+        Retorna uma lista, na ordem dos itens, com o ID criado ou None para duplicados.
+    """
+    for tentativa in range(tentativas):
+        try:
+            return _insere(session, itens)
+        except IntegrityError:
+            session.rollback()
+            if tentativa == tentativas - 1:
+                raise
+
+
+def _insere(session, itens):
+    existentes = busca_ids(session, {_chave(item) for item in itens})
+
+    novos = {}
+    for item in itens:
+        chave = _chave(item)
+        if chave not in existentes and chave not in novos:
+            novos[chave] = item
+
+    if novos:
+        session.execute(Lancamento.__table__.insert(), list(novos.values()))
+        criados = ids_criados(session, novos)
+        aplica_deltas(session, [
+            delta_resumo(item["login"], item["data_vencimento"], item["tipo"], item["pago"], item["valor"])
+            for item in novos.values()])
+    else:
+        criados = {}
+    session.flush()
+
+    # cada chave nova é atribuída apenas ao primeiro item que a contém
+    resultado = []
+    for item in itens:
+        chave = _chave(item)
+        if chave in novos and novos[chave] is item:
+            resultado.append(criados[chave])
+        else:
+            resultado.append(None)
+    return resultado
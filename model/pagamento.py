@@ -0,0 +1,98 @@
+from sqlalchemy import text, bindparam, Integer, String, Date, DateTime, Boolean, Float
+from datetime import date, datetime
+
+from model.lancamento import intervalo_mes
+from model.resumo import aplica_deltas, delta_resumo
+from model.arquivo import LancamentoArquivado, MODELOS, desarquiva
+
+
+# colunas retornadas pelas atualizações, já com os valores novos
+_RETORNO = "RETURNING id, login, data_vencimento, tipo, valor, pago"
+_TIPOS_RETORNO = dict(id=Integer, login=String, data_vencimento=Date, tipo=String, valor=Float, pago=Boolean)
+
+ALTERNA_PAGAMENTO = text(
+    # a negação acontece no banco: dois cliques simultâneos não se anulam
+    f"UPDATE lancamentos SET pago = NOT coalesce(pago, 0), atualizado_em = :agora WHERE id = :id {_RETORNO}") \
+    .bindparams(bindparam("agora", type_=DateTime)) \
+    .columns(**_TIPOS_RETORNO)
+
+MARCA_PAGAMENTO_IDS = text(
+    f"""UPDATE lancamentos SET pago = :pago, atualizado_em = :agora
+        WHERE id IN :ids AND coalesce(pago, 0) != :pago {_RETORNO}""") \
+    .bindparams(bindparam("ids", expanding=True), bindparam("pago", type_=Boolean),
+                bindparam("agora", type_=DateTime)) \
+    .columns(**_TIPOS_RETORNO)
+
+MARCA_PAGAMENTO_MES = text(
+    f"""UPDATE lancamentos SET pago = :pago, atualizado_em = :agora
+        WHERE login = :login AND data_vencimento >= :inicio AND data_vencimento < :fim
+          AND (:tipo IS NULL OR tipo = :tipo) AND coalesce(pago, 0) != :pago {_RETORNO}""") \
+    .bindparams(bindparam("pago", type_=Boolean), bindparam("inicio", type_=Date), bindparam("fim", type_=Date),
+                bindparam("agora", type_=DateTime)) \
+    .columns(**_TIPOS_RETORNO)
+
+
+def _deltas_pagamento(linhas):
+    """ Variações do resumo mensal para linhas cujo pago acabou de ser invertido:
+        sai o estado anterior e entra o novo.
+    """
+    deltas = []
+    for linha in linhas:
+        deltas.append(delta_resumo(linha.login, linha.data_vencimento, linha.tipo, not linha.pago, linha.valor, -1))
+        deltas.append(delta_resumo(linha.login, linha.data_vencimento, linha.tipo, linha.pago, linha.valor))
+    return deltas
+
+
+def alterna_pagamento(session, lancamento_id: int):
+    """ Inverte o pago do lançamento com um único UPDATE ... RETURNING e
+        atualiza o resumo do mês na mesma transação.
+
+        Retorna a linha atualizada, ou None se o lançamento não existir.
+    """
+    # um lançamento arquivado volta para lancamentos antes de ser alterado
+    desarquiva(session, LancamentoArquivado.id == lancamento_id)
+    linha = session.execute(ALTERNA_PAGAMENTO, {"id": lancamento_id, "agora": datetime.now()}).first()
+    if linha is not None:
+        aplica_deltas(session, _deltas_pagamento([linha]))
+    return linha
+
+
+def marca_pagamento(session, pago: bool, ids=None, login: str = None, mes: date = None, tipo: str = None):
+    """ Define pago para uma lista de ids ou para todos os lançamentos do usuário
+        no mês (opcionalmente só de um tipo), em um único UPDATE. Apenas as linhas
+        que mudaram de estado são alteradas e entram no resumo mensal; arquivados
+        marcados como não pagos voltam para lancamentos.
+
+        Retorna as linhas alteradas e, na busca por ids, os ids que não existem.
+    """
+    if ids is not None:
+        ids = list(dict.fromkeys(ids))
+        if not pago and ids:
+            # arquivados estão pagos: voltam para lancamentos para deixar de estar
+            desarquiva(session, LancamentoArquivado.id.in_(ids))
+        alteradas = session.execute(
+            MARCA_PAGAMENTO_IDS, {"pago": pago, "ids": ids, "agora": datetime.now()}).all() if ids else []
+        nao_encontrados = []
+        if len(alteradas) < len(ids):
+            # ids não alterados: já estavam no estado pedido ou não existem
+            alterados = {linha.id for linha in alteradas}
+            restantes = [id for id in ids if id not in alterados]
+            existentes = {linha[0] for modelo in MODELOS
+                          for linha in session.query(modelo.id).filter(modelo.id.in_(restantes))}
+            nao_encontrados = [id for id in restantes if id not in existentes]
+    else:
+        inicio, fim = intervalo_mes(mes)
+        if not pago:
+            arquivados = [LancamentoArquivado.login == login, LancamentoArquivado.data_vencimento >= inicio,
+                          LancamentoArquivado.data_vencimento < fim]
+            if tipo is not None:
+                arquivados.append(LancamentoArquivado.tipo == tipo)
+            desarquiva(session, *arquivados)
+        alteradas = session.execute(MARCA_PAGAMENTO_MES, {
+            "pago": pago, "login": login, "inicio": inicio, "fim": fim, "tipo": tipo,
+            "agora": datetime.now()}).all()
+        nao_encontrados = []
+
+    if alteradas:
+        aplica_deltas(session, _deltas_pagamento(alteradas))
+    return alteradas, nao_encontrados
@@ -0,0 +1,161 @@
+from sqlalchemy import Column, String, Integer, Boolean, Date, Float, Index
+from calendar import monthrange
+from datetime import date
+from typing import Union
+import os
+
+from model import Base
+from model.lote import insere_lancamentos
+
+# meses, a partir de hoje, até onde as recorrências sob demanda são gravadas nas consultas
+RECORRENCIA_HORIZONTE_MESES = int(os.environ.get("RECORRENCIA_HORIZONTE_MESES", 24))
+
+
+def soma_meses(data: date, meses: int, dia: int = None):
+    """ Soma meses a uma data, ajustando o dia ao último dia do mês quando necessário
+        (ex.: 31/01 + 1 mês = 29/02 em ano bissexto).
+    """
+    dia = dia or data.day
+    indice = data.month - 1 + meses
+    ano, mes = data.year + indice // 12, indice % 12 + 1
+    return date(ano, mes, min(dia, monthrange(ano, mes)[1]))
+
+
+class Recorrencia(Base):
+    """ Regra de repetição de um lançamento: mensal (ou a cada N meses) por uma
+        quantidade de vezes ou até uma data. As ocorrências são gravadas como
+        lançamentos comuns.
+    """
+    __tablename__ = 'recorrencias'
+
+    id = Column(Integer, primary_key=True)
+    lancamento_id = Column(Integer)
+    login = Column(String(10), nullable=False, index=True)
+    descricao = Column(String(140))
+    valor = Column(Float)
+    tipo = Column(String(20))
+    categoria_id = Column(Integer, nullable=False)
+    data_inicio = Column(Date, nullable=False)
+    intervalo_meses = Column(Integer, nullable=False, default=1)
+    quantidade = Column(Integer)
+    data_fim = Column(Date)
+    parcelado = Column(Boolean, nullable=False, default=False)
+    sob_demanda = Column(Boolean, nullable=False, default=False)
+    # vencimento da última ocorrência já gravada
+    gerado_ate = Column(Date)
+    concluida = Column(Boolean, nullable=False, default=False)
+
+    __table_args__ = (
+        # no máximo uma regra por lançamento modelo: uma segunda duplicaria a série
+        Index('ux_recorrencias_lancamento_id', 'lancamento_id', unique=True),
+    )
+
+    def __init__(self, lancamento, intervalo_meses: int = 1, quantidade: Union[int, None] = None,
+                 data_fim: Union[date, None] = None, parcelado: bool = False, sob_demanda: bool = False):
+        """
+        Cria uma recorrência a partir de um lançamento, que é a primeira ocorrência
+
+        Arguments:
+            lancamento: lançamento usado como modelo das ocorrências
+            intervalo_meses: meses entre as ocorrências
+            quantidade: total de ocorrências, incluindo o lançamento modelo
+            data_fim: último vencimento possível
+            parcelado: se a descrição recebe a numeração da parcela, ex.: "Curso (2/12)"
+            sob_demanda: se as ocorrências são gravadas apenas quando o mês for consultado
+        """
+        self.lancamento_id = lancamento.id
+        self.login = lancamento.login
+        self.descricao = lancamento.descricao
+        self.valor = lancamento.valor
+        self.tipo = lancamento.tipo
+        self.categoria_id = lancamento.categoria_id
+        self.data_inicio = lancamento.data_vencimento
+        self.intervalo_meses = intervalo_meses
+        self.quantidade = quantidade
+        self.data_fim = data_fim
+        self.parcelado = parcelado
+        self.sob_demanda = sob_demanda
+        self.gerado_ate = lancamento.data_vencimento
+        self.concluida = quantidade == 1
+
+    def limitada(self):
+        return self.quantidade is not None or self.data_fim is not None
+
+    def total(self):
+        """ Quantidade total de ocorrências, ou None se a recorrência não tiver fim. """
+        if self.quantidade is not None:
+            return self.quantidade
+        if self.data_fim is None:
+            return None
+        return sum(1 for _ in self.ocorrencias())
+
+    def ocorrencias(self, ate: date = None):
+        """ Gera (numero, vencimento) de cada ocorrência, começando em 1 (o lançamento modelo),
+            até o fim da recorrência ou até a data informada.
+        """
+        numero = 1
+        vencimento = self.data_inicio
+        while True:
+            if self.quantidade is not None and numero > self.quantidade:
+                return
+            if self.data_fim is not None and vencimento > self.data_fim:
+                return
+            if ate is not None and vencimento > ate:
+                return
+            yield numero, vencimento
+            vencimento = soma_meses(self.data_inicio, numero * self.intervalo_meses, self.data_inicio.day)
+            numero += 1
+
+    def descricao_parcela(self, numero: int, total: int = None):
+        if self.parcelado:
+            return f"{self.descricao} ({numero}/{total})"
+        return self.descricao
+
+
+def materializa(session, recorrencia: Recorrencia, ate: date = None):
+    """ Grava, em uma única transação, as ocorrências ainda não geradas até a data
+        informada (ou até o fim da recorrência). Ocorrências já existentes são ignoradas.
+
+        Retorna a quantidade de lançamentos criados e de duplicados.
+    """
+    total = recorrencia.total()
+    ocorrencias = list(recorrencia.ocorrencias(ate))
+    itens = [{
+        "descricao": recorrencia.descricao_parcela(numero, total),
+        "valor": recorrencia.valor,
+        "pago": False,
+        "tipo": recorrencia.tipo,
+        "categoria_id": recorrencia.categoria_id,
+        "data_vencimento": vencimento,
+        "login": recorrencia.login}
+        for numero, vencimento in ocorrencias
+        if vencimento > recorrencia.gerado_ate]
+
+    ids = insere_lancamentos(session, itens) if itens else []
+    if itens:
+        recorrencia.gerado_ate = itens[-1]["data_vencimento"]
+    if total is not None and ocorrencias and ocorrencias[-1][0] == total:
+        recorrencia.concluida = True
+    session.commit()
+
+    criados = sum(1 for id in ids if id is not None)
+    return criados, len(ids) - criados
+
+
+def materializa_pendentes(session, login: str, ate: date, hoje: date = None):
+    """ Grava as ocorrências das recorrências sob demanda do usuário até a data informada,
+        limitada a RECORRENCIA_HORIZONTE_MESES a partir de hoje: uma consulta a um mês
+        distante não grava milhares de ocorrências de uma regra sem fim.
+        Chamado na primeira consulta de um mês; nos seguintes não há pendências.
+    """
+    ate = min(ate, soma_meses(hoje or date.today(), RECORRENCIA_HORIZONTE_MESES))
+    pendentes = session.query(Recorrencia).filter(
+        Recorrencia.login == login,
+        Recorrencia.sob_demanda == True,
+        Recorrencia.concluida == False,
+        Recorrencia.gerado_ate < ate).all()
+
+    criados = 0
+    for recorrencia in pendentes:
+        criados += materializa(session, recorrencia, ate)[0]
+    return criados
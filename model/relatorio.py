@@ -0,0 +1,48 @@
+from sqlalchemy import case, func
+from datetime import date
+
+from model.arquivo import todos_lancamentos
+from model.resumo import ResumoMensal
+
+
+# colunas de totais de cada linha do relatório, na ordem da consulta
+COLUNAS_RELATORIO = ("quantidade", "receitas", "despesas", "pagas", "nao_pagas", "atrasadas")
+
+
+def calcula_relatorio(session, login: str, inicio: date, fim: date, referencia: date):
+    """ Totaliza os lançamentos do usuário entre as datas (inclusive) por mês e
+        categoria, em uma única consulta agrupada. Despesas não pagas com
+        vencimento anterior à data de referência são contadas como atrasadas.
+
+        Retorna as linhas (mes "aaaa-mm", categoria_id, totais...) ordenadas por mês e categoria.
+    """
+    # lançamentos arquivados entram no relatório; o filtro chega a cada tabela da união
+    todos = todos_lancamentos("id", "login", "data_vencimento", "categoria_id", "tipo", "pago", "valor").c
+    mes = func.strftime('%Y-%m', todos.data_vencimento)
+    despesa = todos.tipo == "Despesa"
+    nao_paga = despesa & (todos.pago == False)
+
+    def soma(condicao):
+        return func.coalesce(func.sum(case((condicao, todos.valor), else_=0)), 0)
+
+    return session.query(
+        mes, todos.categoria_id,
+        func.count(todos.id),
+        soma(todos.tipo == "Receita"),
+        soma(despesa),
+        soma(despesa & (todos.pago == True)),
+        soma(nao_paga),
+        soma(nao_paga & (todos.data_vencimento < referencia))) \
+        .filter(todos.login == login,
+                todos.data_vencimento >= inicio,
+                todos.data_vencimento <= fim) \
+        .group_by(mes, todos.categoria_id) \
+        .order_by(mes, todos.categoria_id).all()
+
+
+def versao_periodo(session, login: str, inicio: date, fim: date):
+    """ Soma das versões dos meses do período: muda a cada escrita em qualquer um deles. """
+    return session.query(func.coalesce(func.sum(ResumoMensal.versao), 0)).filter(
+        ResumoMensal.login == login,
+        ResumoMensal.ano * 100 + ResumoMensal.mes >= inicio.year * 100 + inicio.month,
+        ResumoMensal.ano * 100 + ResumoMensal.mes <= fim.year * 100 + fim.month).scalar()
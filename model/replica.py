@@ -0,0 +1,79 @@
+from sqlalchemy import Column, String, DateTime, select
+from sqlalchemy.engine import make_url
+from datetime import datetime, timedelta
+import sqlite3
+import os
+
+from model.base import Base
+from cache import CacheTTL
+
+
+# segundos, após uma escrita do usuário, em que as leituras dele vão para o primário
+JANELA_ESCRITA = float(os.environ.get("DB_REPLICA_JANELA", 5))
+
+# usuários com escrita recente neste worker (expiram sozinhos após a janela): evita
+# consultar escritas_recentes quando a escrita foi feita pelo próprio worker
+escritas_recentes = CacheTTL(
+    tamanho_maximo=int(os.environ.get("DB_REPLICA_JANELA_TAMANHO", 10000)), ttl=JANELA_ESCRITA)
+
+
+class EscritaRecente(Base):
+    """ Instante da última escrita de cada usuário, no primário: visível para todos os
+        workers, que mandam as leituras do usuário para o primário durante a janela.
+    """
+    __tablename__ = 'escritas_recentes'
+
+    login = Column(String(10), primary_key=True)
+    escrito_em = Column(DateTime, nullable=False)
+
+
+def registra_escrita(session, login: str):
+    """ Marca o usuário como recém-alterado, na transação da escrita: leituras dele vão
+        para o primário durante a janela, em qualquer worker.
+    """
+    if login is None:
+        return
+    escritas_recentes.set(login, True)
+    tabela = EscritaRecente.__table__
+    agora = datetime.now()
+    resultado = session.execute(tabela.update().where(tabela.c.login == login).values(escrito_em=agora))
+    if resultado.rowcount == 0:
+        session.execute(tabela.insert().values(login=login, escrito_em=agora))
+
+
+def escreveu_recentemente(engine, login: str):
+    """ Indica se o usuário escreveu dentro da janela, neste ou em outro worker
+        (consulta escritas_recentes no primário, pela chave).
+    """
+    if login is None:
+        return False
+    if escritas_recentes.get(login, False):
+        return True
+    with engine.connect() as conexao:
+        escrito_em = conexao.execute(
+            select(EscritaRecente.escrito_em).where(EscritaRecente.login == login)).scalar()
+    return escrito_em is not None and escrito_em > datetime.now() - timedelta(seconds=JANELA_ESCRITA)
+
+
+def caminho_sqlite(url):
+    """ Caminho do arquivo de uma url sqlite, ou None para outros bancos e bancos em memória. """
+    url = make_url(url)
+    if url.get_backend_name() != "sqlite" or not url.database or url.database == ":memory:":
+        return None
+    return url.database
+
+
+def copia_sqlite(origem: str, destino: str, paginas_por_passo: int = 1024):
+    """ Copia o banco de origem para o destino com a API de backup do SQLite,
+        consistente mesmo com escritas acontecendo na origem.
+    """
+    pasta = os.path.dirname(destino)
+    if pasta and not os.path.exists(pasta):
+        os.makedirs(pasta)
+    conexao_origem = sqlite3.connect(origem)
+    conexao_destino = sqlite3.connect(destino)
+    try:
+        conexao_origem.backup(conexao_destino, pages=paginas_por_passo)
+    finally:
+        conexao_destino.close()
+        conexao_origem.close()
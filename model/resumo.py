@@ -0,0 +1,154 @@
+from sqlalchemy import Column, String, Integer, Float, case, func
+from datetime import date
+from model import Base
+from model.arquivo import todos_lancamentos
+from model.replica import registra_escrita
+
+
+# colunas de totais mantidas para cada usuário e mês
+COLUNAS_TOTAIS = ("quantidade", "total_valor", "total_receitas", "total_despesas",
+                  "despesas_pagas", "despesas_nao_pagas")
+
+
+class ResumoMensal(Base):
+    """ Totais dos lançamentos de um usuário em um mês, atualizados na mesma
+        transação de cada escrita em lancamentos.
+    """
+    __tablename__ = 'monthly_summary'
+
+    login = Column(String(10), primary_key=True)
+    ano = Column(Integer, primary_key=True, autoincrement=False)
+    mes = Column(Integer, primary_key=True, autoincrement=False)
+    quantidade = Column(Integer, nullable=False, default=0)
+    total_valor = Column(Float, nullable=False, default=0)
+    total_receitas = Column(Float, nullable=False, default=0)
+    total_despesas = Column(Float, nullable=False, default=0)
+    despesas_pagas = Column(Float, nullable=False, default=0)
+    despesas_nao_pagas = Column(Float, nullable=False, default=0)
+    # incrementada a cada escrita no mês, usada nos ETags das consultas
+    versao = Column(Integer, nullable=False, default=0, server_default='0')
+
+    def totais(self):
+        """ Retorna os totais do resumo como dicionário. """
+        return {coluna: getattr(self, coluna) for coluna in COLUNAS_TOTAIS}
+
+
+def delta_resumo(login: str, data_vencimento: date, tipo: str, pago: bool, valor: float, sinal: int = 1):
+    """ Calcula a variação nos totais do mês causada por um lançamento.
+        Use sinal=1 para incluir o lançamento e sinal=-1 para retirá-lo.
+
+        Retorna a chave (login, ano, mes) e o dicionário com as variações.
+    """
+    valor = sinal * valor
+    despesa = tipo == "Despesa"
+    chave = (login, data_vencimento.year, data_vencimento.month)
+    return chave, {
+        "quantidade": sinal,
+        "total_valor": valor,
+        "total_receitas": valor if tipo == "Receita" else 0,
+        "total_despesas": valor if despesa else 0,
+        "despesas_pagas": valor if despesa and pago == True else 0,
+        "despesas_nao_pagas": valor if despesa and pago == False else 0}
+
+
+def aplica_deltas(session, deltas):
+    """ Aplica as variações nos resumos mensais dentro da transação da sessão.
+        Variações da mesma chave são somadas antes, gerando uma escrita por mês.
+    """
+    acumulado = {}
+    for chave, delta in deltas:
+        totais = acumulado.setdefault(chave, dict.fromkeys(COLUNAS_TOTAIS, 0))
+        for coluna, valor in delta.items():
+            totais[coluna] += valor
+
+    tabela = ResumoMensal.__table__
+    for (login, ano, mes), totais in acumulado.items():
+        # toda escrita em lancamentos passa por aqui: leituras do usuário seguem para o primário
+        registra_escrita(session, login)
+        # UPDATE com incremento relativo: seguro com outras escritas concorrentes
+        valores = {coluna: tabela.c[coluna] + valor for coluna, valor in totais.items()}
+        valores["versao"] = tabela.c.versao + 1
+        resultado = session.execute(
+            tabela.update()
+            .where(tabela.c.login == login, tabela.c.ano == ano, tabela.c.mes == mes)
+            .values(valores))
+        if resultado.rowcount == 0:
+            session.execute(tabela.insert().values(login=login, ano=ano, mes=mes, versao=1, **totais))
+
+
+def registra_lancamento(session, lancamento, sinal: int = 1):
+    """ Inclui (sinal=1) ou retira (sinal=-1) um lançamento do resumo do seu mês.
+        Com sinal=0 só avança a versão do mês (alteração que não muda os totais).
+    """
+    aplica_deltas(session, [delta_resumo(
+        lancamento.login, lancamento.data_vencimento, lancamento.tipo,
+        lancamento.pago, lancamento.valor, sinal)])
+
+
+def versao_mes(session, login: str, data: date):
+    """ Retorna a versão dos lançamentos do usuário no mês da data (0 se o mês não tiver escritas). """
+    return session.query(ResumoMensal.versao).filter(
+        ResumoMensal.login == login,
+        ResumoMensal.ano == data.year,
+        ResumoMensal.mes == data.month).scalar() or 0
+
+
+def calcula_resumos(session):
+    """ Recalcula, a partir de lancamentos e do arquivo, os totais de todos os usuários e meses.
+        Retorna um dicionário (login, ano, mes) -> totais.
+    """
+    # o resumo conta também os lançamentos arquivados
+    todos = todos_lancamentos("id", "login", "data_vencimento", "tipo", "pago", "valor").c
+    ano = func.cast(func.strftime('%Y', todos.data_vencimento), Integer)
+    mes = func.cast(func.strftime('%m', todos.data_vencimento), Integer)
+    despesa = todos.tipo == "Despesa"
+
+    def soma(condicao=None):
+        valor = todos.valor if condicao is None else case((condicao, todos.valor), else_=0)
+        return func.coalesce(func.sum(valor), 0)
+
+    linhas = session.query(
+        todos.login, ano, mes,
+        func.count(todos.id),
+        soma(),
+        soma(todos.tipo == "Receita"),
+        soma(despesa),
+        soma(despesa & (todos.pago == True)),
+        soma(despesa & (todos.pago == False))).group_by(todos.login, ano, mes)
+
+    return {(linha[0], linha[1], linha[2]): dict(zip(COLUNAS_TOTAIS, linha[3:])) for linha in linhas}
+
+
+def verifica_resumos(session, tolerancia: float = 0.005):
+    """ Compara os resumos gravados com os recalculados a partir de lancamentos.
+        Retorna a lista de divergências (chave, gravado, esperado).
+    """
+    esperados = calcula_resumos(session)
+    gravados = {(r.login, r.ano, r.mes): r.totais() for r in session.query(ResumoMensal)}
+    vazio = dict.fromkeys(COLUNAS_TOTAIS, 0)
+
+    divergencias = []
+    for chave in sorted(set(esperados) | set(gravados)):
+        esperado = esperados.get(chave, vazio)
+        gravado = gravados.get(chave, vazio)
+        if any(abs(gravado[coluna] - esperado[coluna]) > tolerancia for coluna in COLUNAS_TOTAIS):
+            divergencias.append((chave, gravado, esperado))
+    return divergencias
+
+
+def reconstroi_resumos(session):
+    """ Apaga e recria todos os resumos a partir de lancamentos.
+        Retorna a quantidade de meses gravados.
+    """
+    esperados = calcula_resumos(session)
+    # as versões continuam crescendo, para invalidar ETags já entregues
+    versoes = {(r.login, r.ano, r.mes): r.versao for r in session.query(ResumoMensal)}
+    vazio = dict.fromkeys(COLUNAS_TOTAIS, 0)
+    session.query(ResumoMensal).delete()
+    chaves = set(esperados) | set(versoes)
+    if chaves:
+        session.execute(ResumoMensal.__table__.insert(), [
+            dict(login=login, ano=ano, mes=mes, versao=versoes.get((login, ano, mes), 0) + 1,
+                 **esperados.get((login, ano, mes), vazio))
+            for login, ano, mes in chaves])
+    return len(esperados)
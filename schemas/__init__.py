@@ -1,4 +1,5 @@
 from schemas.error import ErrorSchema
 from schemas.lancamento import *
+from schemas.categoria import CategoriaInvalidacaoSchema, ResultadoSincronizacaoSchema
 
 
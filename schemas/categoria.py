@@ -0,0 +1,16 @@
+from pydantic import BaseModel
+from typing import Optional
+
+
+class CategoriaInvalidacaoSchema(BaseModel):
+    """ Aviso do serviço de categorias de que uma categoria mudou. Sem id,
+        a cópia local inteira é sincronizada de novo.
+    """
+    id: Optional[int] = None
+
+
+class ResultadoSincronizacaoSchema(BaseModel):
+    """ Define como o resultado de uma sincronização de categorias será retornado.
+    """
+    gravadas: int = 1
+    removidas: int = 0
@@ -1,56 +1,153 @@
 # pydantic - framework para geração de documentação das APIs
 # serve também para validar requisições enviadas
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from flask_openapi3 import FileStorage
 from typing import Optional, List
+from base64 import urlsafe_b64encode, urlsafe_b64decode
+import binascii
 from datetime import datetime, date
+from model import Session
 from model.lancamento import Lancamento
-import requests
+from model.categoria import categorias_locais
+from concurrent.futures import ThreadPoolExecutor
 import json
-from logger import logger
+import os
+from cache import CacheTTL, AUSENTE
+from metricas import contextos
+from cliente_categoria import cliente_categoria, ServicoIndisponivel
+from logger import logger, AMOSTRA
 
 # aqui está exemplificado o uso de schemas para definir um formato de uma requisição.
 
-def NomeCategoria(id_categoria: int):
-    categoria_id = id_categoria
+# cache compartilhado das categorias: uma única entrada serve nome e tipo
+categorias_cache = CacheTTL(
+    tamanho_maximo=int(os.environ.get("CATEGORIA_CACHE_TAMANHO", 1024)),
+    ttl=float(os.environ.get("CATEGORIA_CACHE_TTL", 300)))
 
-    try:
-        request = requests.get(f"http://192.168.15.5:5000/categoriaID?id={categoria_id}")
-        logger.debug(f"Retorno do json #{request.status_code}")
+# categorias inexistentes ficam em cache por menos tempo
+CATEGORIA_CACHE_TTL_NEGATIVO = float(os.environ.get("CATEGORIA_CACHE_TTL_NEGATIVO", 30))
 
-    except requests.exceptions.ConnectionError:
-        return "Serviço Indisponível"
+# rota de busca em lote do serviço de categorias, se disponível (ex.: /categoriasID)
+CATEGORIA_BUSCA_LOTE = os.environ.get("CATEGORIA_BUSCA_LOTE")
 
-    if request.status_code!=200:
-        error_msg = "Sem categoria"
-        logger.warning(
-            f"Erro ao adicionar lançamento para a categoria '{categoria_id}', {error_msg}")
-        return error_msg
-    else:
-        categoria = json.loads(request.content)
-        nome_categoria = categoria['nome']
-        logger.debug(f"Nome de Categoria encontrada na API #{nome_categoria}")
-        return nome_categoria
+# consultas individuais em paralelo ficam limitadas a este pool
+categorias_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("CATEGORIA_WORKERS", 8)), thread_name_prefix="categoria")
 
-def TipoCategoria(id_categoria: int):
+SEM_CATEGORIA = "Sem categoria"
+SERVICO_INDISPONIVEL = "Serviço Indisponível"
+
+
+def BuscaCategoria(id_categoria: int):
+    """ Retorna a categoria ({"nome", "tipo"}) do serviço de categorias, usando o cache.
+        Em caso de falha retorna a mensagem de erro correspondente.
+    """
     categoria_id = id_categoria
 
+    categoria = categorias_cache.busca(categoria_id)
+    if categoria is not AUSENTE:
+        return categoria
+
     try:
-        request = requests.get(f"http://192.168.15.5:5000/categoriaID?id={categoria_id}")
-        logger.debug(f"Retorno do json #{request.status_code}")
+        request = cliente_categoria.get("/categoriaID", params={"id": categoria_id})
+        logger.debug("Retorno do json #%s", request.status_code, extra=AMOSTRA)
 
-    except requests.exceptions.ConnectionError:
-        return "Serviço Indisponível"
+    except ServicoIndisponivel:
+        # indisponibilidade não é guardada, a próxima chamada tenta novamente
+        return SERVICO_INDISPONIVEL
 
     if request.status_code!=200:
-        error_msg = "Sem categoria"
+        error_msg = SEM_CATEGORIA
         logger.warning(
             f"Erro ao adicionar lançamento para a categoria '{categoria_id}', {error_msg}")
+        categorias_cache.set(categoria_id, error_msg, ttl=CATEGORIA_CACHE_TTL_NEGATIVO)
         return error_msg
     else:
-        categoria = json.loads(request.content)
-        tipo_categoria = categoria['tipo']
-        logger.debug(f"Nome de Categoria encontrada na API #{tipo_categoria}")
-        return tipo_categoria
+        dados = json.loads(request.content)
+        categoria = {"nome": dados['nome'], "tipo": dados['tipo']}
+        logger.debug("Categoria encontrada na API #%s", categoria['nome'], extra=AMOSTRA)
+        categorias_cache.set(categoria_id, categoria)
+        return categoria
+
+def BuscaCategoriasLote(ids_categoria: List[int]):
+    """ Busca várias categorias em uma única chamada à rota de lote do serviço.
+        Retorna None se a rota não estiver disponível.
+    """
+    try:
+        request = cliente_categoria.get(CATEGORIA_BUSCA_LOTE,
+                                        params={"ids": ",".join(str(id) for id in ids_categoria)})
+    except ServicoIndisponivel:
+        return None
+
+    if request.status_code != 200:
+        logger.warning(f"Busca em lote de categorias indisponível, status {request.status_code}")
+        return None
+
+    dados = json.loads(request.content)
+    encontradas = {item['id']: {"nome": item['nome'], "tipo": item['tipo']}
+                   for item in dados.get('categorias', [])}
+    categorias = {}
+    for categoria_id in ids_categoria:
+        if categoria_id in encontradas:
+            categorias[categoria_id] = encontradas[categoria_id]
+            categorias_cache.set(categoria_id, encontradas[categoria_id])
+        else:
+            categorias[categoria_id] = SEM_CATEGORIA
+            categorias_cache.set(categoria_id, SEM_CATEGORIA, ttl=CATEGORIA_CACHE_TTL_NEGATIVO)
+    return categorias
+
+def ResolveCategorias(ids_categoria, local: bool = True):
+    """ Resolve uma vez cada categoria distinta da lista informada.
+        Usa a cópia local (tabela categorias) e, para as que ainda não foram
+        sincronizadas, o cache, a busca em lote (se configurada) e, por fim,
+        consultas individuais em paralelo. Retorna um dicionário id -> categoria.
+    """
+    distintas = set(ids_categoria)
+    categorias = categorias_locais(Session(), distintas) if local and distintas else {}
+    pendentes = []
+    for categoria_id in distintas - categorias.keys():
+        categoria = categorias_cache.busca(categoria_id)
+        if categoria is AUSENTE:
+            pendentes.append(categoria_id)
+        else:
+            categorias[categoria_id] = categoria
+
+    if pendentes and CATEGORIA_BUSCA_LOTE:
+        encontradas = BuscaCategoriasLote(pendentes)
+        if encontradas is not None:
+            categorias.update(encontradas)
+            pendentes = []
+
+    if len(pendentes) == 1:
+        categorias[pendentes[0]] = BuscaCategoria(pendentes[0])
+    elif pendentes:
+        # cada tarefa roda em uma cópia do contexto, para somar as chamadas à requisição
+        categorias.update(zip(pendentes, categorias_executor.map(
+            lambda contexto, id: contexto.run(BuscaCategoria, id), contextos(len(pendentes)), pendentes)))
+
+    return categorias
+
+def NomesCategorias(ids_categoria, local: bool = True):
+    """ Resolve as categorias como em ResolveCategorias e retorna id -> nome
+        (ou a mensagem de erro da categoria). """
+    return {id: categoria if isinstance(categoria, str) else categoria['nome']
+            for id, categoria in ResolveCategorias(ids_categoria, local).items()}
+
+def NomeCategoria(id_categoria: int):
+    categoria = ResolveCategorias([id_categoria])[id_categoria]
+    if isinstance(categoria, str):
+        return categoria
+    return categoria['nome']
+
+def TipoCategoria(id_categoria: int):
+    categoria = ResolveCategorias([id_categoria])[id_categoria]
+    if isinstance(categoria, str):
+        return categoria
+    return categoria['tipo']
+
+def InvalidaCategoria(id_categoria: Optional[int] = None):
+    """ Remove uma categoria do cache ou, se nenhuma for informada, todas. """
+    categorias_cache.invalida(id_categoria)
     
 class LancamentoSchema(BaseModel):
     """ Define como um novo lançamento a ser inserido deve ser representada
@@ -64,12 +161,68 @@ class LancamentoSchema(BaseModel):
     categoria_id: int = 1
     login: str = "login"
 
+class LancamentoLoteSchema(BaseModel):
+    """ Define como uma lista de lançamentos a serem inseridos de uma vez deve ser representada.
+    """
+    __root__: List[LancamentoSchema] = Field(..., max_items=5000)
+
 class LancamentoDelPagaSchema(BaseModel):
     """ Define como deve ser a estrutura que representa a deleção. Que será
         feita apenas com base no ID do lançamento.
     """
     id: int = 1
 
+class PagamentoLoteSchema(BaseModel):
+    """ Define como deve ser a estrutura que representa a marcação de pagamento em lote:
+        uma lista de ids, ou todos os lançamentos do usuário no mês (opcionalmente de um tipo).
+    """
+    pago: bool = True
+    ids: Optional[List[int]] = Field(None, max_items=5000)
+    login: Optional[str] = None
+    mes: Optional[date] = None
+    tipo: Optional[str] = None
+
+class ResultadoPagamentoLoteSchema(BaseModel):
+    """ Define como o resultado da marcação de pagamento em lote será retornado.
+    """
+    alterados: int = 2
+    ids: List[int] = [1, 2]
+    nao_encontrados: List[int] = []
+
+class LancamentosBuscaSchema(BaseModel):
+    """ Define como deve ser a estrutura que representa a listagem paginada.
+        O cursor é o valor de proximo_cursor devolvido pela página anterior.
+        Com stream=true todos os lançamentos a partir do cursor são enviados aos poucos.
+    """
+    login: Optional[str] = None
+    limite: int = Field(100, ge=1, le=1000)
+    cursor: Optional[str] = None
+    stream: bool = False
+
+class AlteracoesBuscaSchema(BaseModel):
+    """ Define como deve ser a estrutura que representa a busca das alterações do usuário.
+        since é o proximo_cursor da resposta anterior; sem ele, todos os lançamentos são enviados.
+    """
+    login: str = "login"
+    since: Optional[str] = None
+    limite: int = Field(500, ge=1, le=5000)
+
+class LancamentosTextoBuscaSchema(BaseModel):
+    """ Define como deve ser a estrutura que representa a busca por texto na descrição.
+        Cada palavra é buscada como prefixo e sem diferenciar acentos.
+    """
+    login: str = "login"
+    texto: str = Field("ingl", min_length=1, max_length=140)
+    limite: int = Field(20, ge=1, le=100)
+    deslocamento: int = Field(0, ge=0)
+
+class ExportacaoBuscaSchema(BaseModel):
+    """ Define como deve ser a estrutura que representa a exportação do histórico
+        do usuário, em CSV ou JSON Lines (ndjson).
+    """
+    login: str = "login"
+    formato: str = Field("csv", regex="^(csv|ndjson)$")
+
 class LancamentoBuscaSchema(BaseModel):
     """ Define como deve ser a estrutura que representa a busca. Que será
         feita apenas com base no nome da despesa.
@@ -113,13 +266,64 @@ class ListagemLancamentosSchema(BaseModel):
     """
     despesas: List[LancamentoViewSchema]
 
+class ListagemLancamentosPaginadaSchema(BaseModel):
+    """ Define como uma página da listagem de lançamentos será retornada.
+    """
+    despesas: List[LancamentoViewSchema]
+    proximo_cursor: Optional[str] = None
+
+
+class AlteracoesViewSchema(BaseModel):
+    """ Define como as alterações desde o cursor serão retornadas: lançamentos inseridos
+        ou alterados (estado atual) e IDs removidos, a aplicar antes das despesas. Com tem_mais,
+        peça de novo com o proximo_cursor; alterações dos últimos segundos podem vir mais de uma vez.
+    """
+    despesas: List[LancamentoViewSchema]
+    removidos: List[int] = []
+    proximo_cursor: str
+    tem_mais: bool = False
+
+
+def codifica_cursor(data_vencimento: date, id: int):
+    """ Gera o cursor opaco que aponta para depois do lançamento informado. """
+    return urlsafe_b64encode(f"{data_vencimento.isoformat()}|{id}".encode()).decode()
+
+def decodifica_cursor(cursor: str):
+    """ Retorna a data de vencimento e o ID contidos no cursor.
+        Levanta ValueError se o cursor for inválido.
+    """
+    try:
+        data_vencimento, id = urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return date.fromisoformat(data_vencimento), int(id)
+    except (TypeError, UnicodeDecodeError, binascii.Error) as e:
+        raise ValueError(f"cursor inválido: {cursor}") from e
+
+
+def codifica_cursor_alteracoes(instante: datetime, id: int):
+    """ Gera o cursor opaco da sincronização que aponta para depois da alteração informada. """
+    return urlsafe_b64encode(f"{instante.isoformat()}|{id}".encode()).decode()
+
+def decodifica_cursor_alteracoes(cursor: str):
+    """ Retorna o instante e o ID contidos no cursor da sincronização.
+        Levanta ValueError se o cursor for inválido.
+    """
+    try:
+        instante, id = urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(instante), int(id)
+    except (TypeError, UnicodeDecodeError, binascii.Error) as e:
+        raise ValueError(f"cursor inválido: {cursor}") from e
+
 
 def apresenta_lancamentos(despesas):
     """ Retorna uma representação da despesa seguindo o schema definido em
         DespesaViewSchema.
     """
+    # resolve cada categoria distinta uma única vez
+    categorias = ResolveCategorias(Despesa.categoria_id for Despesa in despesas)
+
     result = []
     for Despesa in despesas:
+        categoria = categorias[Despesa.categoria_id]
         result.append({
             "id":Despesa.id,
             "descricao": Despesa.descricao,
@@ -128,12 +332,65 @@ def apresenta_lancamentos(despesas):
             "tipo": Despesa.tipo,
             "data_vencimento": Despesa.data_vencimento.strftime('%d/%m/%Y'),
             "categoria_id": Despesa.categoria_id,
-            "categoria_nome": NomeCategoria(Despesa.categoria_id),
+            "categoria_nome": categoria if isinstance(categoria, str) else categoria['nome'],
             "login" : Despesa.login
         })
 
     return {"despesas": result}
 
+class FormatoData:
+    """ Converte o vencimento (texto aaaa-mm-dd do banco ou date) para dd/mm/aaaa
+        uma única vez por data distinta.
+    """
+
+    def __init__(self):
+        self._datas = {}
+
+    def __call__(self, valor):
+        texto = self._datas.get(valor)
+        if texto is None:
+            if isinstance(valor, str):
+                texto = f"{valor[8:10]}/{valor[5:7]}/{valor[0:4]}"
+            else:
+                texto = f"{valor.day:02d}/{valor.month:02d}/{valor.year:04d}"
+            self._datas[valor] = texto
+        return texto
+
+def formatador_linhas(nomes_categoria: dict, formata_data: FormatoData = None):
+    """ Monta, uma vez por resposta, a função que converte uma linha de consulta_leitura
+        no dicionário de LancamentoViewSchema.
+
+        Arguments:
+            nomes_categoria: id da categoria -> nome, para as linhas sem o nome da cópia local
+            formata_data: conversor de datas compartilhado; um novo é criado se não for informado
+    """
+    formata_data = formata_data or FormatoData()
+    nome = nomes_categoria.get
+
+    def formata(linha):
+        id, descricao, valor, pago, tipo, data_vencimento, categoria_id, categoria_nome, login = linha
+        return {
+            "id": id,
+            "descricao": descricao,
+            "valor": valor,
+            "pago": pago,
+            "tipo": tipo,
+            "data_vencimento": formata_data(data_vencimento),
+            "categoria_id": categoria_id,
+            "categoria_nome": categoria_nome if categoria_nome is not None else nome(categoria_id),
+            "login": login
+        }
+
+    return formata
+
+def apresenta_linhas(linhas):
+    """ Mesma representação de apresenta_lancamentos, a partir das tuplas de
+        consulta_leitura em vez de objetos do ORM.
+    """
+    # o nome vem do join com a cópia local; só categorias ainda não sincronizadas vão ao serviço
+    nomes = NomesCategorias((linha[6] for linha in linhas if linha[7] is None), local=False)
+    return {"despesas": list(map(formatador_linhas(nomes), linhas))}
+
 class LancamentoRetornoSchema(BaseModel):
     """ Define como deve ser a estrutura do dado retornado após uma requisição
         de remoção.
@@ -149,6 +406,85 @@ class LancamentoRetornoCompletoSchema(BaseModel):
     Lancamento :  LancamentoViewSchema
     mensage: str = "Lançamento atualizado com sucesso"
 
+class ListagemBuscaSchema(BaseModel):
+    """ Define como os resultados da busca por texto serão retornados, do mais
+        relevante para o menos. proximo_deslocamento é nulo na última página.
+    """
+    despesas:List[LancamentoViewSchema]
+    proximo_deslocamento: Optional[int] = None
+
+class ResultadoLoteItemSchema(BaseModel):
+    """ Define como o resultado de cada item da inserção em lote será retornado.
+        O status pode ser: criado, duplicado ou tipo_divergente.
+    """
+    indice: int = 0
+    status: str = "criado"
+    id: Optional[int] = 1
+    mesage: Optional[str] = None
+
+class ResultadoLoteSchema(BaseModel):
+    """ Define como o resultado da inserção em lote será retornado.
+    """
+    criados: int = 1
+    duplicados: int = 0
+    rejeitados: int = 0
+    resultados: List[ResultadoLoteItemSchema]
+
+class ImportacaoSchema(BaseModel):
+    """ Define como um extrato bancário (CSV ou OFX) deve ser enviado para importação.
+        Descrições sem regra em IMPORTACAO_REGRAS usam a categoria padrão do tipo.
+    """
+    arquivo: FileStorage
+    login: str = "login"
+    formato: Optional[str] = None
+    categoria_despesa: Optional[int] = None
+    categoria_receita: Optional[int] = None
+    tamanho_bloco: int = Field(1000, ge=1, le=10000)
+
+class LinhaRejeitadaSchema(BaseModel):
+    """ Define como uma linha rejeitada na importação será retornada.
+    """
+    linha: int = 1
+    motivo: str = "valor inválido"
+
+class ResultadoImportacaoSchema(BaseModel):
+    """ Define como o relatório da importação será retornado.
+    """
+    importacao_id: str
+    linhas: int = 0
+    criados: int = 0
+    duplicados: int = 0
+    rejeitados: int = 0
+    retomada_em: int = 0
+    segundos: float = 0
+    linhas_por_segundo: float = 0
+    erros: List[LinhaRejeitadaSchema]
+
+class RecorrenciaSchema(BaseModel):
+    """ Define como a regra de repetição de um lançamento deve ser representada.
+        Informe a quantidade de ocorrências (incluindo o próprio lançamento) ou a data final.
+    """
+    id: int = 1
+    intervalo_meses: int = Field(1, ge=1, le=12)
+    quantidade: Optional[int] = Field(None, ge=1, le=600)
+    data_fim: Optional[date] = None
+    parcelado: bool = False
+    sob_demanda: bool = False
+
+class RecorrenciaViewSchema(BaseModel):
+    """ Define como uma recorrência será retornada.
+    """
+    id: int = 1
+    lancamento_id: int = 1
+    intervalo_meses: int = 1
+    quantidade: Optional[int] = 12
+    data_fim: Optional[str] = None
+    parcelado: bool = False
+    sob_demanda: bool = False
+    gerado_ate: str = datetime.now().strftime('%d/%m/%Y')
+    criados: int = 11
+    duplicados: int = 0
+
 class ControleViewSchema(BaseModel):
     saldo_mes: float = 5000.00
     saldo_pago: float = 1180.00
@@ -158,6 +494,16 @@ class ControleViewSchema(BaseModel):
     total_receitas: float = 240.00
     total_valor: float = 240.00
 
+def apresenta_alteracoes(alteracoes, tem_mais: bool, cursor):
+    """ Retorna as alterações seguindo o schema definido em AlteracoesViewSchema. """
+    alterados = [linha for _, linha in alteracoes if linha is not None]
+    return {
+            "despesas": apresenta_linhas(alterados)["despesas"],
+            "removidos": [id for (_, id), linha in alteracoes if linha is None],
+            "proximo_cursor": codifica_cursor_alteracoes(*cursor),
+            "tem_mais": tem_mais
+    }
+
 def apresenta_lancamento(lancamento: Lancamento):
     """ Retorna uma representação da despesa seguindo o schema definido em
         ProdutoViewSchema.
@@ -173,3 +519,77 @@ def apresenta_lancamento(lancamento: Lancamento):
             "categoria_nome": NomeCategoria(lancamento.categoria_id),
             "login" : lancamento.login
     }
+
+def apresenta_recorrencia(recorrencia, criados: int = 0, duplicados: int = 0):
+    """ Retorna uma representação da recorrência seguindo o schema definido em
+        RecorrenciaViewSchema.
+    """
+    return {
+            "id": recorrencia.id,
+            "lancamento_id": recorrencia.lancamento_id,
+            "intervalo_meses": recorrencia.intervalo_meses,
+            "quantidade": recorrencia.quantidade,
+            "data_fim": recorrencia.data_fim.strftime('%d/%m/%Y') if recorrencia.data_fim else None,
+            "parcelado": recorrencia.parcelado,
+            "sob_demanda": recorrencia.sob_demanda,
+            "gerado_ate": recorrencia.gerado_ate.strftime('%d/%m/%Y'),
+            "criados": criados,
+            "duplicados": duplicados
+    }
+
+class RelatorioBuscaSchema(BaseModel):
+    """ Define como deve ser a estrutura que representa a busca do relatório por período.
+        Sem data_referencia, as despesas atrasadas são calculadas em relação a hoje.
+    """
+    login: str = "login"
+    data_inicio: date = date(datetime.now().year, 1, 1)
+    data_fim: date = date(datetime.now().year, 12, 31)
+    data_referencia: Optional[date] = None
+
+class RelatorioCategoriasSchema(BaseModel):
+    id: List[int] = [1]
+    nome: List[str] = ["Educação"]
+
+class RelatorioViewSchema(BaseModel):
+    """ Define como o relatório será retornado: em colunas, a posição i de cada lista
+        é uma linha (mês, categoria). Os nomes das categorias vêm uma vez em categorias.
+    """
+    login: str = "login"
+    data_inicio: str = "01/01/2024"
+    data_fim: str = "31/12/2024"
+    data_referencia: str = "15/06/2024"
+    mes: List[str] = ["2024-01"]
+    categoria_id: List[int] = [1]
+    quantidade: List[int] = [3]
+    receitas: List[float] = [0]
+    despesas: List[float] = [1381.5]
+    pagas: List[float] = [921.0]
+    nao_pagas: List[float] = [460.5]
+    atrasadas: List[float] = [460.5]
+    categorias: RelatorioCategoriasSchema
+
+def apresenta_relatorio(login: str, inicio: date, fim: date, referencia: date, linhas):
+    """ Retorna o relatório em colunas seguindo o schema definido em
+        RelatorioViewSchema, resolvendo uma vez cada categoria distinta.
+    """
+    colunas = list(zip(*linhas)) or [()] * 8
+    ids = sorted(set(colunas[1]))
+    nomes = NomesCategorias(ids)
+    return {
+            "login": login,
+            "data_inicio": inicio.strftime('%d/%m/%Y'),
+            "data_fim": fim.strftime('%d/%m/%Y'),
+            "data_referencia": referencia.strftime('%d/%m/%Y'),
+            "mes": list(colunas[0]),
+            "categoria_id": list(colunas[1]),
+            "quantidade": list(colunas[2]),
+            # totais acumulados podem carregar resíduos de ponto flutuante
+            "receitas": [round(valor, 2) for valor in colunas[3]],
+            "despesas": [round(valor, 2) for valor in colunas[4]],
+            "pagas": [round(valor, 2) for valor in colunas[5]],
+            "nao_pagas": [round(valor, 2) for valor in colunas[6]],
+            "atrasadas": [round(valor, 2) for valor in colunas[7]],
+            "categorias": {
+                "id": ids,
+                "nome": [nomes[id] for id in ids]}
+    }
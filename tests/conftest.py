@@ -0,0 +1,59 @@
+import os
+import sys
+import tempfile
+import uuid
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+# banco, log e serviço de categorias próprios dos testes, definidos antes de importar o app
+_diretorio = tempfile.mkdtemp(prefix="lancamentos-testes-")
+os.chdir(_diretorio)
+os.environ["DATABASE_URL"] = "sqlite:///%s/db.sqlite3" % _diretorio
+os.environ["CATEGORIA_SINCRONIZACAO"] = "0"
+
+from benchmark.categoria_stub import CategoriaStub  # noqa: E402
+
+stub = CategoriaStub().inicia()
+os.environ["CATEGORIA_URL"] = stub.url
+
+from app import app  # noqa: E402
+from model import Session  # noqa: E402
+from categorias import sincroniza_categorias  # noqa: E402
+
+# categorias do stub: múltiplos de 5 são receitas, as demais despesas
+CATEGORIA_DESPESA = 1
+CATEGORIA_RECEITA = 5
+
+_sessao = Session()
+sincroniza_categorias(_sessao)
+_sessao.commit()
+Session.remove()
+
+
+@pytest.fixture
+def cliente():
+    return app.test_client()
+
+
+@pytest.fixture
+def session():
+    sessao = Session()
+    yield sessao
+    Session.remove()
+
+
+@pytest.fixture
+def login():
+    """ Um usuário novo por teste: os testes não dependem dos dados uns dos outros. """
+    return uuid.uuid4().hex[:10]
+
+
+def lancamento(login: str, descricao: str, data_vencimento: str, valor: float = 10.0,
+               pago: bool = False, tipo: str = "Despesa"):
+    """ Formulário de POST /lancamento. """
+    categoria = CATEGORIA_DESPESA if tipo == "Despesa" else CATEGORIA_RECEITA
+    return {"descricao": descricao, "valor": valor, "pago": pago, "tipo": tipo,
+            "categoria_id": categoria, "data_vencimento": data_vencimento, "login": login}
@@ -0,0 +1,48 @@
+from datetime import datetime
+
+from schemas.lancamento import codifica_cursor_alteracoes
+
+from conftest import lancamento
+
+
+def _alteracoes(cliente, login, since=None, limite=500):
+    resposta = cliente.get("/lancamentos/changes", query_string={"login": login, "since": since or "",
+                                                                 "limite": limite})
+    assert resposta.status_code == 200
+    return resposta.get_json()
+
+
+def test_recarga_completa_em_paginas(cliente, login):
+    for numero in range(3):
+        cliente.post("/lancamento", data=lancamento(login, f"Conta {numero}", "2024-01-10"))
+
+    primeira = _alteracoes(cliente, login, limite=2)
+    assert primeira["tem_mais"] and len(primeira["despesas"]) == 2
+    segunda = _alteracoes(cliente, login, primeira["proximo_cursor"], limite=2)
+    assert not segunda["tem_mais"]
+    descricoes = [item["descricao"] for item in primeira["despesas"] + segunda["despesas"]]
+    assert descricoes == ["Conta 0", "Conta 1", "Conta 2"]
+
+
+def test_alteracoes_e_remocoes_desde_o_cursor(cliente, login, monkeypatch):
+    """ Depois do cursor vêm só o lançamento alterado e o id removido. """
+    monkeypatch.setattr("model.alteracoes.ALTERACOES_MARGEM", 0)
+    ids = [cliente.post("/lancamento", data=lancamento(login, f"Conta {numero}", "2024-01-10")).get_json()["id"]
+           for numero in range(3)]
+    cursor = _alteracoes(cliente, login)["proximo_cursor"]
+
+    assert cliente.put("/paga", query_string={"id": ids[0]}).status_code == 200
+    assert cliente.delete("/lancamento", query_string={"id": ids[1]}).status_code == 200
+
+    alteracoes = _alteracoes(cliente, login, cursor)
+    assert [(item["id"], item["pago"]) for item in alteracoes["despesas"]] == [(ids[0], True)]
+    assert alteracoes["removidos"] == [ids[1]]
+    assert _alteracoes(cliente, login, alteracoes["proximo_cursor"])["despesas"] == []
+
+
+def test_cursor_invalido_ou_expirado(cliente, login):
+    resposta = cliente.get("/lancamentos/changes", query_string={"login": login, "since": "invalido"})
+    assert resposta.status_code == 400
+    expirado = codifica_cursor_alteracoes(datetime(2000, 1, 1), 0)
+    resposta = cliente.get("/lancamentos/changes", query_string={"login": login, "since": expirado})
+    assert resposta.status_code == 410
@@ -0,0 +1,77 @@
+from datetime import date
+
+from model.lancamento import Lancamento
+from model.arquivo import LancamentoArquivado, arquiva
+
+from conftest import lancamento
+
+
+def test_id_arquivado_nao_e_reutilizado(cliente, session, login):
+    """ Arquivar, remover o último lançamento e inserir outro não repete um id arquivado. """
+    ids = [cliente.post("/lancamento", data=lancamento(login, f"Conta {numero}", f"2020-0{numero}-10",
+                                                       pago=True)).get_json()["id"]
+           for numero in (1, 2, 3)]
+
+    assert arquiva(session, date(2021, 1, 1)) >= 3
+    assert session.query(LancamentoArquivado).filter(LancamentoArquivado.id.in_(ids)).count() == 3
+
+    # o maior id também foi arquivado: antes ele era o único obstáculo à reutilização
+    novo = cliente.post("/lancamento", data=lancamento(login, "Conta nova", "2020-04-10")).get_json()["id"]
+    assert novo > max(ids)
+    assert cliente.delete("/lancamento", query_string={"id": novo}).status_code == 200
+    outro = cliente.post("/lancamento", data=lancamento(login, "Conta outra", "2020-05-10")).get_json()["id"]
+    assert outro > novo
+
+    listados = [item["id"] for item in cliente.get("/lancamentos", query_string={"login": login}).get_json()["despesas"]]
+    assert sorted(listados) == sorted(ids + [outro])
+    assert session.query(Lancamento).filter(Lancamento.id.in_(ids)).count() == 0
+
+
+def _arquiva_um(cliente, session, login, descricao="Conta antiga"):
+    id = cliente.post("/lancamento", data=lancamento(login, descricao, "2020-06-10", valor=30.0,
+                                                     pago=True)).get_json()["id"]
+    arquiva(session, date(2021, 1, 1))
+    assert session.get(LancamentoArquivado, id) is not None
+    return id
+
+
+def test_lancamento_arquivado_pode_ser_alterado_e_removido(cliente, session, login):
+    """ Escritas sobre um lançamento arquivado o devolvem a lancamentos e são aplicadas. """
+    id = _arquiva_um(cliente, session, login)
+    saldo = {"login": login, "data_vencimento": "2020-06-28"}
+    assert cliente.get("/saldo", query_string=saldo).get_json()["saldo_pago"] == 30.0
+
+    assert cliente.put("/paga", query_string={"id": id}).status_code == 200
+    session.expire_all()
+    assert session.get(LancamentoArquivado, id) is None
+    assert session.get(Lancamento, id).pago is False
+    assert cliente.get("/saldo", query_string=saldo).get_json()["saldo_pago"] == 0
+
+    # de volta ao arquivo: edição e remoção
+    cliente.put("/paga", query_string={"id": id})
+    arquiva(session, date(2021, 1, 1))
+    resposta = cliente.put("/lancamento", query_string={
+        "id": id, "descricao": "Conta corrigida", "valor": 40, "tipo": "Despesa",
+        "data_vencimento": "2020-06-10", "categoria_id": 1})
+    assert resposta.status_code == 200
+    assert cliente.get("/lancamento", query_string={"login": login, "descricao": "Conta corrigida"}) \
+        .get_json()["valor"] == 40
+
+    arquiva(session, date(2021, 1, 1))
+    assert cliente.delete("/lancamento", query_string={"id": id}).status_code == 200
+    session.expire_all()
+    assert session.get(LancamentoArquivado, id) is None and session.get(Lancamento, id) is None
+    assert id in cliente.get("/lancamentos/changes", query_string={"login": login}).get_json()["removidos"]
+
+
+def test_pagamento_em_lote_de_arquivados(cliente, session, login):
+    id = _arquiva_um(cliente, session, login)
+
+    # já pago: nada muda, mas o id existe
+    resposta = cliente.put("/lancamentos/paga", json={"pago": True, "ids": [id]}).get_json()
+    assert resposta["alterados"] == 0 and resposta["nao_encontrados"] == []
+
+    resposta = cliente.put("/lancamentos/paga", json={"pago": False, "login": login, "mes": "2020-06-01"}).get_json()
+    assert resposta["ids"] == [id]
+    session.expire_all()
+    assert session.get(LancamentoArquivado, id) is None
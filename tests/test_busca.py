@@ -0,0 +1,46 @@
+from datetime import date
+
+from model import engine
+from model.arquivo import arquiva
+from model.busca import busca_lancamentos, reconstroi_busca
+
+from conftest import lancamento
+
+
+def _busca(cliente, login, texto):
+    resposta = cliente.get("/lancamentos/busca", query_string={"login": login, "texto": texto})
+    assert resposta.status_code == 200
+    return [item["descricao"] for item in resposta.get_json()["despesas"]]
+
+
+def test_busca_por_prefixo_sem_acentos(cliente, login):
+    """ "ingl" encontra "Curso de Inglês", e só os lançamentos do próprio usuário. """
+    cliente.post("/lancamento", data=lancamento(login, "Curso de Inglês", "2024-01-10"))
+    cliente.post("/lancamento", data=lancamento(login, "Mercado", "2024-01-11"))
+    cliente.post("/lancamento", data=lancamento(login[::-1], "Curso de Inglês", "2024-01-10"))
+
+    assert _busca(cliente, login, "ingl") == ["Curso de Inglês"]
+    assert _busca(cliente, login, "curso INGLES") == ["Curso de Inglês"]
+    assert _busca(cliente, login, "viagem") == []
+
+
+def test_busca_encontra_lancamentos_arquivados(cliente, session, login):
+    """ Arquivar um lançamento não o tira da busca, nem o repete ao voltar para lancamentos. """
+    id = cliente.post("/lancamento", data=lancamento(login, "Seguro do carro", "2020-03-10",
+                                                     pago=True)).get_json()["id"]
+    cliente.post("/lancamento", data=lancamento(login, "Seguro residencial", "2024-03-10"))
+    arquiva(session, date(2021, 1, 1))
+
+    assert sorted(_busca(cliente, login, "seguro")) == ["Seguro do carro", "Seguro residencial"]
+    assert sorted(l.descricao for l in busca_lancamentos(session, login, "seguro", 10, fts=False)) == \
+        ["Seguro do carro", "Seguro residencial"]
+
+    with engine.begin() as conexao:
+        reconstroi_busca(conexao)
+    assert sorted(_busca(cliente, login, "seguro")) == ["Seguro do carro", "Seguro residencial"]
+
+    # a alteração devolve o lançamento a lancamentos: continua aparecendo uma única vez
+    assert cliente.put("/paga", query_string={"id": id}).status_code == 200
+    assert sorted(_busca(cliente, login, "seguro")) == ["Seguro do carro", "Seguro residencial"]
+    assert cliente.delete("/lancamento", query_string={"id": id}).status_code == 200
+    assert _busca(cliente, login, "seguro") == ["Seguro residencial"]
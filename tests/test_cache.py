@@ -0,0 +1,60 @@
+from cache import CacheTTL, AUSENTE
+from schemas.lancamento import BuscaCategoria, categorias_cache, SEM_CATEGORIA
+
+from conftest import stub
+
+
+class Relogio:
+    """ Relógio controlado pelo teste. """
+
+    def __init__(self):
+        self.agora = 0.0
+
+    def __call__(self):
+        return self.agora
+
+
+def test_entrada_expira_apos_o_ttl():
+    relogio = Relogio()
+    cache = CacheTTL(ttl=10, relogio=relogio)
+    cache.set("a", 1)
+    cache.set("b", 2, ttl=2)
+
+    relogio.agora = 5
+    assert cache.get("a") == 1
+    assert cache.busca("b") is AUSENTE
+    relogio.agora = 10
+    assert cache.get("a", "expirada") == "expirada"
+    assert len(cache) == 0
+
+
+def test_descarta_a_entrada_menos_usada():
+    cache = CacheTTL(tamanho_maximo=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.busca("b") is AUSENTE
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert cache.estatisticas() == {"hits": 3, "misses": 1, "evictions": 1, "tamanho": 2}
+
+
+def test_valor_none_e_diferente_de_ausente():
+    cache = CacheTTL()
+    cache.set("a", None)
+    assert cache.busca("a") is None
+    cache.invalida("a")
+    assert cache.busca("a") is AUSENTE
+
+
+def test_categoria_buscada_no_servico_fica_em_cache():
+    """ Uma chamada por categoria, inclusive para as inexistentes (TTL negativo). """
+    categorias_cache.invalida()
+    chamadas = stub.chamadas
+
+    assert BuscaCategoria(12) == {"nome": "Categoria 12", "tipo": "Despesa"}
+    assert BuscaCategoria(12)["nome"] == "Categoria 12"
+    assert BuscaCategoria(999) == SEM_CATEGORIA
+    assert BuscaCategoria(999) == SEM_CATEGORIA
+    assert stub.chamadas - chamadas == 2
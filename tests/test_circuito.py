@@ -0,0 +1,58 @@
+import pytest
+
+from cliente_categoria import CircuitBreaker, ClienteCategoria, ServicoIndisponivel
+
+from conftest import stub
+
+
+class Relogio:
+    """ Relógio controlado pelo teste. """
+
+    def __init__(self):
+        self.agora = 0.0
+
+    def __call__(self):
+        return self.agora
+
+
+def test_circuito_abre_e_libera_uma_chamada_de_teste():
+    relogio = Relogio()
+    circuito = CircuitBreaker(limite_falhas=2, tempo_espera=30, relogio=relogio)
+    circuito.registra_falha()
+    assert circuito.permite()
+    circuito.registra_falha()
+    assert circuito.estado == CircuitBreaker.ABERTO
+    assert not circuito.permite()
+
+    relogio.agora = 30
+    assert circuito.estado == CircuitBreaker.SEMIABERTO
+    assert circuito.permite()
+    assert not circuito.permite()
+    # a chamada de teste falhou: volta a abrir por mais um tempo de espera
+    circuito.registra_falha()
+    assert not circuito.permite()
+
+    relogio.agora = 60
+    assert circuito.permite()
+    circuito.registra_sucesso()
+    assert circuito.estado == CircuitBreaker.FECHADO
+    assert circuito.permite() and circuito.permite()
+
+
+def test_cliente_com_circuito_aberto_nao_chama_o_servico():
+    relogio = Relogio()
+    cliente = ClienteCategoria(stub.url, tentativas=0,
+                               circuit_breaker=CircuitBreaker(limite_falhas=1, tempo_espera=30, relogio=relogio))
+    cliente.url_base = "http://127.0.0.1:9"
+    with pytest.raises(ServicoIndisponivel):
+        cliente.get("/categoriaID", params={"id": 1})
+
+    cliente.url_base = stub.url
+    chamadas = stub.chamadas
+    with pytest.raises(ServicoIndisponivel, match="circuito aberto"):
+        cliente.get("/categoriaID", params={"id": 1})
+    assert stub.chamadas == chamadas
+
+    relogio.agora = 30
+    assert cliente.get("/categoriaID", params={"id": 1}).status_code == 200
+    assert cliente.circuit_breaker.estado == CircuitBreaker.FECHADO
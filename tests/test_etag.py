@@ -0,0 +1,78 @@
+from cliente_categoria import cliente_categoria, CircuitBreaker
+from model.categoria import remove_categoria
+from schemas.lancamento import categorias_cache, SERVICO_INDISPONIVEL
+
+from conftest import lancamento, stub
+
+
+def test_invalidacao_de_categoria_muda_o_etag(cliente, login):
+    """ Depois do webhook, o ETag antigo não responde 304 e o novo nome da categoria aparece. """
+    dados = dict(lancamento(login, "Farmácia", "2024-05-10"), categoria_id=7)
+    assert cliente.post("/lancamento", data=dados).status_code == 200
+    consulta = {"login": login, "data_vencimento": "2024-05-01"}
+
+    resposta = cliente.get("/mensal", query_string=consulta)
+    etag = resposta.headers["ETag"]
+    assert resposta.get_json()["despesas"][0]["categoria_nome"] == "Categoria 7"
+
+    original = dict(stub.categorias[7])
+    stub.categorias[7] = dict(original, nome="Saúde")
+    try:
+        assert cliente.post("/categorias/invalidacao", json={"id": 7}).get_json()["gravadas"] == 1
+
+        resposta = cliente.get("/mensal", query_string=consulta, headers={"If-None-Match": etag})
+        assert resposta.status_code == 200
+        assert resposta.headers["ETag"] != etag
+        assert resposta.get_json()["despesas"][0]["categoria_nome"] == "Saúde"
+    finally:
+        stub.categorias[7] = original
+        cliente.post("/categorias/invalidacao", json={"id": 7})
+
+
+def test_mensal_responde_304_ate_uma_escrita_no_mes(cliente, login):
+    """ O ETag muda com escritas no mês consultado, e só com elas. """
+    id = cliente.post("/lancamento", data=lancamento(login, "Luz", "2024-06-10")).get_json()["id"]
+    consulta = {"login": login, "data_vencimento": "2024-06-01"}
+    etag = cliente.get("/mensal", query_string=consulta).headers["ETag"]
+
+    resposta = cliente.get("/mensal", query_string=consulta, headers={"If-None-Match": etag})
+    assert resposta.status_code == 304
+    assert resposta.headers["ETag"] == etag
+
+    cliente.post("/lancamento", data=lancamento(login, "Água", "2024-07-10"))
+    assert cliente.get("/mensal", query_string=consulta, headers={"If-None-Match": etag}).status_code == 304
+
+    assert cliente.put("/paga", query_string={"id": id}).status_code == 200
+    resposta = cliente.get("/mensal", query_string=consulta, headers={"If-None-Match": etag})
+    assert resposta.status_code == 200
+    assert resposta.headers["ETag"] != etag
+    assert resposta.get_json()["despesas"][0]["pago"] is True
+
+
+def test_saldo_e_lancamento_respondem_304(cliente, login):
+    cliente.post("/lancamento", data=lancamento(login, "Internet", "2024-08-10", valor=99.9))
+    for rota, consulta in (("/saldo", {"login": login, "data_vencimento": "2024-08-20"}),
+                           ("/lancamento", {"login": login, "descricao": "Internet"})):
+        resposta = cliente.get(rota, query_string=consulta)
+        assert resposta.status_code == 200
+        etag = resposta.headers["ETag"]
+        assert cliente.get(rota, query_string=consulta, headers={"If-None-Match": etag}).status_code == 304
+
+
+def test_resposta_sem_nome_de_categoria_nao_recebe_etag(cliente, session, login, monkeypatch):
+    """ Com o serviço fora do ar, a resposta sem o nome da categoria não é guardada nem recebe ETag. """
+    dados = dict(lancamento(login, "Presente", "2024-09-10"), categoria_id=14)
+    assert cliente.post("/lancamento", data=dados).status_code == 200
+    remove_categoria(session, 14)
+    session.commit()
+    categorias_cache.invalida()
+    monkeypatch.setattr(cliente_categoria, "url_base", "http://127.0.0.1:9")
+    monkeypatch.setattr(cliente_categoria, "circuit_breaker", CircuitBreaker())
+    try:
+        resposta = cliente.get("/mensal", query_string={"login": login, "data_vencimento": "2024-09-01"})
+        assert resposta.status_code == 200
+        assert resposta.get_json()["despesas"][0]["categoria_nome"] == SERVICO_INDISPONIVEL
+        assert "ETag" not in resposta.headers
+    finally:
+        monkeypatch.undo()
+        cliente.post("/categorias/invalidacao", json={"id": 14})
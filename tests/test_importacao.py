@@ -0,0 +1,66 @@
+from io import BytesIO, StringIO
+
+import pytest
+
+import importacao
+from app import app
+from importacao import importa, identificador_importacao, le_csv, RegrasCategoria
+from model.importacao import Importacao
+from model.lancamento import Lancamento
+
+from conftest import CATEGORIA_DESPESA, CATEGORIA_RECEITA
+
+
+def _extrato(linhas: int):
+    corpo = "".join(f"2024-02-{numero + 1:02d};Compra {numero};-{numero + 1},50\n" for numero in range(linhas))
+    return "data;descricao;valor\n" + corpo
+
+
+def _regras():
+    return RegrasCategoria(categoria_despesa=CATEGORIA_DESPESA, categoria_receita=CATEGORIA_RECEITA)
+
+
+def test_importacao_interrompida_e_retomada(cliente, session, login, monkeypatch):
+    """ Uma falha no meio de um bloco não grava o bloco nem o progresso; reenviar retoma dali. """
+    conteudo = _extrato(7)
+    importacao_id = identificador_importacao(BytesIO(conteudo.encode()), login)
+
+    insere = importacao.insere_lancamentos
+    chamadas = []
+
+    def falha_no_segundo_bloco(sessao, itens):
+        chamadas.append(len(itens))
+        ids = insere(sessao, itens)
+        if len(chamadas) == 2:
+            raise RuntimeError("queda do processo")
+        return ids
+
+    monkeypatch.setattr(importacao, "insere_lancamentos", falha_no_segundo_bloco)
+    with pytest.raises(RuntimeError):
+        importa(session, le_csv(StringIO(conteudo)), login, _regras(), importacao_id, tamanho_bloco=3)
+    session.rollback()
+    monkeypatch.undo()
+
+    # só o primeiro bloco foi confirmado, junto com o seu progresso
+    assert session.get(Importacao, importacao_id).linhas_processadas == 3
+    assert session.query(Lancamento).filter(Lancamento.login == login).count() == 3
+
+    resposta = cliente.post("/lancamentos/importacao", data={
+        "arquivo": (BytesIO(conteudo.encode()), "extrato.csv"), "login": login, "tamanho_bloco": 3,
+        "categoria_despesa": CATEGORIA_DESPESA, "categoria_receita": CATEGORIA_RECEITA})
+    relatorio = resposta.get_json()
+    assert resposta.status_code == 200
+    assert (relatorio["retomada_em"], relatorio["linhas"]) == (3, 7)
+    assert (relatorio["criados"], relatorio["duplicados"]) == (7, 0)
+    assert session.query(Lancamento).filter(Lancamento.login == login).count() == 7
+
+
+def test_importa_pela_linha_de_comando_com_extrato_invalido(tmp_path, login):
+    caminho = tmp_path / "extrato.csv"
+    caminho.write_text("quando;o que\n2024-02-01;Compra\n", encoding="utf-8")
+
+    resultado = app.test_cli_runner().invoke(args=["importa", str(caminho), "--login", login,
+                                                   "--categoria-despesa", str(CATEGORIA_DESPESA)])
+    assert resultado.exit_code == 1
+    assert "Extrato inválido" in resultado.output
+    assert "Traceback" not in resultado.output
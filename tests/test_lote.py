@@ -0,0 +1,37 @@
+from model.lancamento import Lancamento
+from schemas.lancamento import categorias_cache
+
+from conftest import lancamento
+
+
+def test_lote_com_servico_de_categorias_indisponivel(cliente, session, login, monkeypatch):
+    """ Categoria não sincronizada e serviço fora do ar: 503, e não tipo_divergente. """
+    monkeypatch.setattr("cliente_categoria.cliente_categoria.url_base", "http://127.0.0.1:9")
+    categorias_cache.invalida()
+    item = dict(lancamento(login, "Conta", "2024-03-10"), categoria_id=99)
+
+    resposta = cliente.post("/lancamentos/batch", json=[item])
+    assert resposta.status_code == 503
+    assert session.query(Lancamento).filter(Lancamento.login == login).count() == 0
+
+
+def test_lote_retorna_os_ids_criados_na_ordem(cliente, session, login):
+    """ Os ids vêm da sequência do insert: cada item recebe o id da própria linha. """
+    existente = cliente.post("/lancamento", data=lancamento(login, "Conta 0", "2024-03-10")).get_json()["id"]
+    itens = [lancamento(login, f"Conta {numero}", "2024-03-10") for numero in range(4)]
+    itens.append(lancamento(login, "Conta 1", "2024-03-10"))
+
+    resposta = cliente.post("/lancamentos/batch", json=itens).get_json()
+    assert (resposta["criados"], resposta["duplicados"]) == (3, 2)
+    status = [item["status"] for item in resposta["resultados"]]
+    assert status == ["duplicado", "criado", "criado", "criado", "duplicado"]
+    for item, resultado in zip(itens, resposta["resultados"]):
+        if resultado["status"] == "criado":
+            assert session.get(Lancamento, resultado["id"]).descricao == item["descricao"]
+    assert existente not in [item["id"] for item in resposta["resultados"]]
+
+
+def test_lote_acima_do_limite_e_recusado(cliente, session, login):
+    itens = [lancamento(login, f"Conta {numero}", "2024-03-10") for numero in range(5001)]
+    assert cliente.post("/lancamentos/batch", json=itens).status_code == 422
+    assert session.query(Lancamento).filter(Lancamento.login == login).count() == 0
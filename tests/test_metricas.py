@@ -0,0 +1,32 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+import metricas
+from model import engine
+
+from conftest import lancamento
+
+
+def _contagem(endpoint: str):
+    return sum(serie[-1] for rotulos, serie in metricas.requisicao_segundos._series.items()
+               if rotulos[0] == endpoint)
+
+
+def test_requisicao_em_stream_e_medida_ao_fechar_a_resposta(cliente, login):
+    """ A exportação é lida do banco enquanto o corpo é enviado: a medição espera o fim. """
+    cliente.post("/lancamento", data=lancamento(login, "Conta", "2024-03-10"))
+    antes = _contagem("/lancamentos/exportacao")
+
+    resposta = cliente.get("/lancamentos/exportacao", query_string={"login": login}, buffered=False)
+    assert _contagem("/lancamentos/exportacao") == antes
+    assert b"Conta" in b"".join(resposta.response)
+    resposta.close()
+    assert _contagem("/lancamentos/exportacao") == antes + 1
+
+
+def test_comando_com_erro_nao_deixa_inicio_pendente():
+    with engine.connect() as conexao:
+        with pytest.raises(OperationalError):
+            conexao.execute(text("SELECT * FROM tabela_inexistente"))
+        assert conexao.info.get("metricas_inicio") == []
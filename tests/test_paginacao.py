@@ -0,0 +1,43 @@
+from datetime import date
+
+from model.arquivo import arquiva
+
+from conftest import lancamento
+
+
+def _pagina(cliente, login, limite, cursor=None):
+    resposta = cliente.get("/lancamentos", query_string={"login": login, "limite": limite, "cursor": cursor or ""})
+    assert resposta.status_code == 200
+    return resposta.get_json()
+
+
+def test_cursor_percorre_todas_as_paginas(cliente, session, login):
+    """ As páginas seguem (vencimento, id), sem repetir nem pular, inclusive lançamentos arquivados. """
+    vencimentos = ["2020-05-10", "2024-01-10", "2024-01-10", "2024-02-01", "2024-02-01"]
+    for numero, data in enumerate(vencimentos):
+        cliente.post("/lancamento", data=lancamento(login, f"Conta {numero}", data, pago=True))
+    arquiva(session, date(2021, 1, 1))
+
+    descricoes = []
+    cursor = None
+    for _ in range(len(vencimentos)):
+        pagina = _pagina(cliente, login, 2, cursor)
+        descricoes += [item["descricao"] for item in pagina["despesas"]]
+        cursor = pagina["proximo_cursor"]
+        if cursor is None:
+            break
+    assert descricoes == [f"Conta {numero}" for numero in range(len(vencimentos))]
+
+
+def test_pagina_vazia_tem_o_mesmo_formato(cliente, login):
+    assert _pagina(cliente, login, 10) == {"despesas": [], "proximo_cursor": None}
+
+    cliente.post("/lancamento", data=lancamento(login, "Conta", "2024-01-10"))
+    pagina = _pagina(cliente, login, 1)
+    assert pagina["proximo_cursor"] is None
+    assert [item["descricao"] for item in pagina["despesas"]] == ["Conta"]
+
+
+def test_cursor_invalido(cliente, login):
+    resposta = cliente.get("/lancamentos", query_string={"login": login, "cursor": "nao-e-um-cursor"})
+    assert resposta.status_code == 400
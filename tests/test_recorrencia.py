@@ -0,0 +1,47 @@
+from datetime import date
+
+from conftest import lancamento
+
+
+def test_parcelamento_muda_etag_do_mes(cliente, login):
+    """ Renomear o lançamento modelo para a parcela 1 invalida o /mensal do seu mês. """
+    id = cliente.post("/lancamento", data=lancamento(login, "Curso", "2024-03-10")).get_json()["id"]
+    consulta = {"login": login, "data_vencimento": "2024-03-15"}
+    etag = cliente.get("/mensal", query_string=consulta).headers["ETag"]
+
+    resposta = cliente.post("/lancamento/recorrencia", data={"id": id, "quantidade": 3, "parcelado": True})
+    assert resposta.status_code == 200
+
+    resposta = cliente.get("/mensal", query_string=consulta, headers={"If-None-Match": etag})
+    assert resposta.status_code == 200
+    assert resposta.headers["ETag"] != etag
+    assert [item["descricao"] for item in resposta.get_json()["despesas"]] == ["Curso (1/3)"]
+
+
+def test_segunda_recorrencia_do_mesmo_lancamento(cliente, login):
+    """ Uma segunda regra para o mesmo lançamento é recusada, sem duplicar a série. """
+    id = cliente.post("/lancamento", data=lancamento(login, "Luz", "2024-03-10")).get_json()["id"]
+    regra = {"id": id, "quantidade": 3, "parcelado": True}
+    assert cliente.post("/lancamento/recorrencia", data=regra).status_code == 200
+
+    resposta = cliente.post("/lancamento/recorrencia", data=regra)
+    assert resposta.status_code == 409
+    descricoes = sorted(item["descricao"] for item in
+                        cliente.get("/lancamentos", query_string={"login": login}).get_json()["despesas"])
+    assert descricoes == ["Luz (1/3)", "Luz (2/3)", "Luz (3/3)"]
+
+
+def test_recorrencia_sem_fim_respeita_o_horizonte(cliente, session, login):
+    """ Consultar um mês distante não grava as ocorrências até ele. """
+    from model.lancamento import Lancamento
+    from model.recorrencia import RECORRENCIA_HORIZONTE_MESES
+
+    id = cliente.post("/lancamento", data=lancamento(login, "Aluguel", "2024-03-10")).get_json()["id"]
+    assert cliente.post("/lancamento/recorrencia", data={"id": id, "sob_demanda": True}).status_code == 200
+
+    resposta = cliente.get("/mensal", query_string={"login": login, "data_vencimento": "2300-01-01"})
+    assert resposta.status_code == 404
+    vencimentos = [data for (data,) in session.query(Lancamento.data_vencimento).filter(Lancamento.login == login)]
+    hoje = date.today()
+    assert max(vencimentos) <= date(hoje.year + RECORRENCIA_HORIZONTE_MESES // 12 + 1, hoje.month, 28)
+    assert len(vencimentos) < 12 * (hoje.year - 2024 + 3)
@@ -0,0 +1,20 @@
+import model.replica
+from model import engine
+from model.replica import escreveu_recentemente, escritas_recentes
+
+from conftest import lancamento
+
+
+def test_escrita_vale_para_os_outros_workers(cliente, login, monkeypatch):
+    """ A marca de escrita recente fica no primário, não só na memória do worker que escreveu. """
+    assert not escreveu_recentemente(engine, login)
+    assert cliente.post("/lancamento", data=lancamento(login, "Conta", "2024-03-10")).status_code == 200
+
+    # outro worker: a memória local não sabe da escrita
+    escritas_recentes.invalida()
+    assert escreveu_recentemente(engine, login)
+    assert not escreveu_recentemente(engine, login + "x")
+
+    # passada a janela, as leituras voltam para a réplica
+    monkeypatch.setattr(model.replica, "JANELA_ESCRITA", 0)
+    assert not escreveu_recentemente(engine, login)
@@ -0,0 +1,67 @@
+import random
+from datetime import date
+
+import pytest
+
+from model.lancamento import intervalo_mes
+from model.lote import insere_lancamentos
+
+from conftest import CATEGORIA_DESPESA, CATEGORIA_RECEITA
+
+
+def saldo_referencia(lancamentos, login: str, mes_corrente: date):
+    """ Implementação original de /saldo: filtra e soma os lançamentos em Python. """
+    inicio, fim = intervalo_mes(mes_corrente)
+    lancamentos = [lancamento for lancamento in lancamentos if lancamento["login"] == login
+                   and inicio <= lancamento["data_vencimento"] < fim]
+    if not lancamentos:
+        return None
+
+    despesas = [lancamento for lancamento in lancamentos if lancamento["tipo"] == "Despesa"]
+    receitas = [lancamento for lancamento in lancamentos if lancamento["tipo"] == "Receita"]
+    despesas_pagas = [lancamento for lancamento in despesas if lancamento["pago"] == True]
+    despesas_nao_pagas = [lancamento for lancamento in despesas if lancamento["pago"] == False]
+    atrasadas = [lancamento for lancamento in despesas_nao_pagas if lancamento["data_vencimento"] < mes_corrente]
+
+    total_receitas = sum(lancamento["valor"] for lancamento in receitas)
+    saldo_pago = sum(lancamento["valor"] for lancamento in despesas_pagas)
+    total_atrasadas = sum(lancamento["valor"] for lancamento in atrasadas)
+    return {
+        "saldo_mes": total_receitas - saldo_pago,
+        "saldo_pago": saldo_pago,
+        "total_a_vencer": sum(lancamento["valor"] for lancamento in despesas_nao_pagas) - total_atrasadas,
+        "total_atrasadas": total_atrasadas,
+        "total_despesas": sum(lancamento["valor"] for lancamento in despesas),
+        "total_receitas": total_receitas,
+        "total_valor": sum(lancamento["valor"] for lancamento in lancamentos)}
+
+
+def test_saldo_confere_com_a_soma_em_python(cliente, session, login):
+    """ /saldo (resumo mensal + consulta das atrasadas) contra a soma em Python, com dados aleatórios. """
+    aleatorio = random.Random(5)
+    logins = [login + sufixo for sufixo in ("a", "b", "c")]
+    lancamentos = []
+    for numero in range(600):
+        tipo = aleatorio.choice(("Despesa", "Despesa", "Receita"))
+        lancamentos.append({
+            "descricao": f"Lançamento {numero}",
+            "valor": round(aleatorio.uniform(1, 2000), 2),
+            "pago": aleatorio.random() < 0.5,
+            "tipo": tipo,
+            "categoria_id": CATEGORIA_DESPESA if tipo == "Despesa" else CATEGORIA_RECEITA,
+            "data_vencimento": date(2024, aleatorio.randint(1, 6), aleatorio.randint(1, 28)),
+            "login": aleatorio.choice(logins)})
+    insere_lancamentos(session, lancamentos)
+    session.commit()
+
+    for _ in range(60):
+        usuario = aleatorio.choice(logins + [login + "z"])
+        consulta = date(2024, aleatorio.randint(1, 7), aleatorio.randint(1, 28))
+        esperado = saldo_referencia(lancamentos, usuario, consulta)
+
+        resposta = cliente.get("/saldo", query_string={"login": usuario, "data_vencimento": consulta.isoformat()})
+        if esperado is None:
+            assert resposta.status_code == 404
+            continue
+        assert resposta.status_code == 200
+        assert resposta.get_json() == {chave: pytest.approx(valor, abs=0.01) for chave, valor in esperado.items()}